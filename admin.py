@@ -1,5 +1,14 @@
-from django.contrib import admin
-from app.models import TimetableUpload, TimetableEntry, Department, Semester, TimetablePDF
+import logging
+
+from django.contrib import admin, messages
+from app.models import (
+    TimetableUpload, TimetableEntry, TimetableChangeLog, Department, Semester, TimetablePDF, ChunkedUpload,
+    QueryRollup, HotQuery, LLMUsage, MasterGrid, TeacherWorkload,
+)
+from app import timetable_files, pdf_search
+from app.timetable_parser import ParseMemoryExceeded, ingest_department_pdf
+
+logger = logging.getLogger(__name__)
 
 # Customize Admin Site
 admin.site.site_header = "Chatbot Admin Panel"
@@ -10,6 +19,57 @@ admin.site.register(TimetableUpload)
 admin.site.register(TimetableEntry)
 
 
+@admin.register(TimetableChangeLog)
+class TimetableChangeLogAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'upload', 'timetable_pdf', 'inserted', 'updated', 'deleted', 'unchanged', 'pages', 'peak_memory_kb']
+    list_filter = ['created_at']
+    readonly_fields = ['upload', 'timetable_pdf', 'inserted', 'updated', 'deleted', 'unchanged', 'changes',
+                       'pages', 'peak_memory_kb', 'created_at']
+
+
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'user', 'kind', 'offset', 'total_size', 'status', 'updated_at']
+    list_filter = ['kind', 'status']
+    readonly_fields = ['id', 'file_hash', 'offset', 'result', 'created_at', 'updated_at']
+
+
+@admin.register(MasterGrid)
+class MasterGridAdmin(admin.ModelAdmin):
+    list_display = ['timetable_pdf', 'department', 'semester', 'clashes', 'updated_at']
+    list_filter = ['department']
+    readonly_fields = ['timetable_pdf', 'department', 'semester', 'teachers', 'periods', 'subjects', 'clashes', 'updated_at']
+
+
+@admin.register(TeacherWorkload)
+class TeacherWorkloadAdmin(admin.ModelAdmin):
+    list_display = ['teacher_name', 'department', 'periods', 'weekly_minutes', 'lab_minutes',
+                    'longest_block_minutes', 'free_gaps', 'updated_at']
+    list_filter = ['department']
+    search_fields = ['teacher_name']
+
+
+@admin.register(QueryRollup)
+class QueryRollupAdmin(admin.ModelAdmin):
+    list_display = ['granularity', 'bucket_start', 'view', 'answered_by', 'queries', 'teachers', 'latency_max_ms']
+    list_filter = ['granularity', 'view', 'answered_by']
+    date_hierarchy = 'bucket_start'
+
+
+@admin.register(HotQuery)
+class HotQueryAdmin(admin.ModelAdmin):
+    list_display = ['day', 'query', 'count']
+    date_hierarchy = 'day'
+
+
+@admin.register(LLMUsage)
+class LLMUsageAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'total_tokens', 'requests', 'rate_limited', 'over_quota']
+    list_filter = ['day']
+    search_fields = ['user__username']
+    date_hierarchy = 'day'
+
+
 # ========================================
 # NEW MODULE: Department Timetable PDFs Admin
 # ========================================
@@ -36,10 +96,21 @@ class TimetablePDFAdmin(admin.ModelAdmin):
     search_fields = ['title', 'semester__department__name']
     list_filter = ['semester__department', 'uploaded_at']
     ordering = ['-uploaded_at']
-    readonly_fields = ['uploaded_at', 'updated_at']
+    readonly_fields = ['file_hash', 'preview_image', 'preview_failed', 'uploaded_at', 'updated_at']
     
     def save_model(self, request, obj, form, change):
         if not change:  # Only set uploaded_by when creating new object
             obj.uploaded_by = request.user
         super().save_model(request, obj, form, change)
+        if not change or 'pdf_file' in form.changed_data:
+            timetable_files.process_uploaded_pdf(obj)
+            pdf_search.index_uploaded_pdf(obj)
+            try:
+                ingest_department_pdf(obj)
+            except ParseMemoryExceeded as exc:
+                self.message_user(request, f"PDF saved, but not parsed into schedules: {exc}.", level=messages.WARNING)
+            except Exception:
+                logger.exception("Could not parse timetable PDF %s into schedules", obj.pk)
+                self.message_user(request, "PDF saved, but its timetable table could not be parsed into schedules.",
+                                  level=messages.WARNING)
 
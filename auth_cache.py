@@ -0,0 +1,102 @@
+"""
+Low-query authentication path.
+
+With the cached_db (or signed_cookies) session engine the session read is
+served from cache; this module does the same for the User row and the
+TeacherProfile, so a steady-state authenticated request needs no auth
+queries at all. Cached objects are dropped by signals whenever the User or
+TeacherProfile is saved or deleted.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import TeacherProfile
+
+USER_CACHE_KEY = "auth_user:{}"
+PROFILE_CACHE_KEY = "teacher_profile:{}"
+
+
+def _timeout():
+    return getattr(settings, "AUTH_USER_CACHE_TIMEOUT", 300)
+
+
+def _session_hash_valid(request, user):
+    session_hash = request.session.get(HASH_SESSION_KEY)
+    if not session_hash:
+        return False
+    return constant_time_compare(session_hash, user.get_session_auth_hash())
+
+
+def _load_user(request):
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        return AnonymousUser()
+    if backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    key = USER_CACHE_KEY.format(user_id)
+    user = cache.get(key)
+    if user is None:
+        # Regular path: one query, session hash verified by Django
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            cache.set(key, user, _timeout())
+        return user
+
+    if not user.is_active or not _session_hash_valid(request, user):
+        request.session.flush()
+        cache.delete(key)
+        return AnonymousUser()
+    user.backend = backend_path
+    return user
+
+
+def get_cached_user(request):
+    if not hasattr(request, "_cached_user"):
+        request._cached_user = _load_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """Drop-in AuthenticationMiddleware that reads request.user from the cache"""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_cached_user(request))
+
+
+def get_teacher_profile(user):
+    """
+    TeacherProfile for a non-admin user (created if missing), cached on the
+    user object for the request and in the shared cache across requests.
+    Returns None for staff / superusers.
+    """
+    if user.is_staff or user.is_superuser:
+        return None
+    profile = getattr(user, "_teacher_profile_cache", None)
+    if profile is not None:
+        return profile
+
+    key = PROFILE_CACHE_KEY.format(user.pk)
+    profile = cache.get(key)
+    if profile is None:
+        profile, created = TeacherProfile.objects.get_or_create(user=user)
+        cache.set(key, profile, _timeout())
+    user._teacher_profile_cache = profile
+    return profile
+
+
+def forget_user(user_id):
+    cache.delete_many([USER_CACHE_KEY.format(user_id), PROFILE_CACHE_KEY.format(user_id)])
+
+
+def forget_profile(user_id):
+    cache.delete(PROFILE_CACHE_KEY.format(user_id))
@@ -0,0 +1,293 @@
+"""
+Batch ingestion of a directory or archive of timetable PDFs
+(``manage.py ingest_timetables``).
+
+Every PDF is fingerprinted by SHA-256. Files whose fingerprint is already on
+a TimetableUpload or marked done in the checkpoint are skipped, and so are
+duplicates within the batch. Uploads stored before hashes were recorded are
+hashed first (backfill_hashes; in memory only on a dry run), so they are
+recognised too. Parsing, the slow part, runs in a pool of worker processes.
+The parent turns each parsed file into a TimetableUpload and diffs its rows
+in with apply_rows' bulk writes, the same as an admin upload through the web
+form.
+
+The checkpoint (JSON) is rewritten after every file with what is done, what
+failed and the hashes of directory files. If a run is interrupted, running
+it again with the same checkpoint picks up where it stopped, and unchanged
+files are not rehashed.
+"""
+import hashlib
+import json
+import logging
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+from .models import TimetableUpload
+from .timetable_files import compute_file_hash
+from .timetable_parser import apply_upload_rows, parse_pdf_rows
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+CHECKPOINT_VERSION = 1
+# Parsed files waiting for the parent, per worker; bounds memory and staged archive members
+QUEUE_PER_WORKER = 2
+
+
+class BatchError(Exception):
+    pass
+
+
+def _init_worker(settings_module):
+    # Needed when workers are spawned rather than forked (macOS / Windows)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+# ========================================
+# Scanning and fingerprints
+# ========================================
+
+def _is_pdf(name):
+    return name.lower().endswith(".pdf")
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _extract(member, target):
+    """Copy an archive member to target, hashing it on the way"""
+    digest = hashlib.sha256()
+    with open(target, "wb") as out:
+        for chunk in iter(lambda: member.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+def scan(source, staging_dir, fingerprints):
+    """
+    Yield (key, path, sha256) for every PDF in a directory, .zip or .tar(.gz/.bz2/.xz).
+    Archive members are extracted into staging_dir one at a time. Directory
+    files are hashed in place, reusing `fingerprints` (path -> [size, mtime_ns, sha256])
+    for files that haven't changed.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if not _is_pdf(name):
+                    continue
+                path = os.path.abspath(os.path.join(root, name))
+                stat = os.stat(path)
+                known = fingerprints.get(path)
+                if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+                    sha = known[2]
+                else:
+                    sha = _hash_file(path)
+                    fingerprints[path] = [stat.st_size, stat.st_mtime_ns, sha]
+                yield path, path, sha
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            members = sorted((info for info in archive.infolist() if not info.is_dir() and _is_pdf(info.filename)),
+                             key=lambda info: info.filename)
+            for number, info in enumerate(members):
+                target = os.path.join(staging_dir, f"{number:06d}-{os.path.basename(info.filename)}")
+                with archive.open(info) as member:
+                    sha = _extract(member, target)
+                yield f"{source}::{info.filename}", target, sha
+    elif tarfile.is_tarfile(source):
+        # Archive order: compressed tars can only be read front to back
+        with tarfile.open(source) as archive:
+            for number, info in enumerate(archive):
+                if not info.isfile() or not _is_pdf(info.name):
+                    continue
+                target = os.path.join(staging_dir, f"{number:06d}-{os.path.basename(info.name)}")
+                with archive.extractfile(info) as member:
+                    sha = _extract(member, target)
+                yield f"{source}::{info.name}", target, sha
+    else:
+        raise BatchError(f"{source} is not a directory, zip or tar archive")
+
+
+class Checkpoint:
+    """JSON record of a batch: done / failed files by fingerprint, plus cached directory hashes"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {"version": CHECKPOINT_VERSION, "done": {}, "failed": {}, "fingerprints": {}}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as fh:
+                    saved = json.load(fh)
+            except (OSError, ValueError) as exc:
+                raise BatchError(f"Cannot read checkpoint {path}: {exc}")
+            if saved.get("version") == CHECKPOINT_VERSION:
+                self.data.update(saved)
+
+    @property
+    def done(self):
+        return self.data["done"]
+
+    @property
+    def failed(self):
+        return self.data["failed"]
+
+    def save(self):
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as fh:
+            json.dump(self.data, fh)
+        os.replace(temporary, self.path)  # never leaves a half-written checkpoint behind
+
+
+# ========================================
+# Ingestion
+# ========================================
+
+def _discard(path, staging_dir):
+    """Remove an extracted archive member; files of a scanned directory stay put"""
+    if os.path.dirname(path) == staging_dir and os.path.exists(path):
+        os.remove(path)
+
+
+def _save_upload(key, path, sha, uploader, rows, log_fields):
+    """Store the PDF as a TimetableUpload and diff its rows in; nothing is kept if either fails"""
+    upload = TimetableUpload(uploader=uploader, file_hash=sha)
+    with open(path, "rb") as fh:
+        upload.uploaded_file.save(os.path.basename(key.split("::")[-1]), File(fh), save=False)
+    try:
+        with transaction.atomic():
+            upload.save()
+            change_log = apply_upload_rows(rows, upload, log_fields)
+    except Exception:
+        upload.uploaded_file.delete(save=False)
+        raise
+    return upload, change_log
+
+
+def backfill_hashes(save=True):
+    """
+    Hash every stored TimetableUpload that has no file_hash yet and return the
+    hashes. With save=False (dry runs) nothing is written to the database.
+    """
+    hashed = []
+    for upload in TimetableUpload.objects.filter(file_hash="").only("pk", "uploaded_file").iterator():
+        try:
+            upload.file_hash = compute_file_hash(upload.uploaded_file)
+        except (OSError, ValueError):
+            logger.warning("Cannot hash upload %s (%s); it won't be recognised as ingested",
+                           upload.pk, upload.uploaded_file.name)
+            continue
+        if save:
+            upload.save(update_fields=["file_hash"])
+        hashed.append(upload.file_hash)
+    return hashed
+
+
+def ingest(source, uploader, workers=None, checkpoint_path=None, dry_run=False, progress=None):
+    """
+    Ingest every PDF under `source` (directory or archive) that hasn't been
+    ingested yet, as TimetableUploads by `uploader`. `progress` is called with
+    a dict after every file. Returns the run's totals.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    workers = workers or getattr(settings, "TIMETABLE_INGEST_WORKERS", None) or os.cpu_count() or 1
+    backfilled = backfill_hashes(save=not dry_run)
+    known = set(TimetableUpload.objects.exclude(file_hash="").values_list("file_hash", flat=True))
+    known.update(backfilled)
+    totals = {"seen": 0, "ingested": 0, "skipped": 0, "failed": 0, "entries": 0, "new": 0,
+              "backfilled": len(backfilled)}
+    started = time.perf_counter()
+
+    def report(key, status, **extra):
+        if progress is None:
+            return
+        elapsed = time.perf_counter() - started
+        processed = totals["ingested"] + totals["failed"]
+        progress(dict(
+            extra, file=key, status=status, elapsed_s=round(elapsed, 2),
+            files_per_s=round(processed / elapsed, 2) if elapsed else None,
+            entries_per_s=round(totals["entries"] / elapsed, 1) if elapsed else None,
+            **totals,
+        ))
+
+    def finish(key, path, sha, parse):
+        try:
+            rows, log_fields = parse()
+            _, change_log = _save_upload(key, path, sha, uploader, rows, log_fields)
+        except Exception as exc:
+            checkpoint.failed[sha] = {"file": key, "error": str(exc) or exc.__class__.__name__}
+            totals["failed"] += 1
+            status, extra = "failed", {"error": checkpoint.failed[sha]["error"]}
+        else:
+            checkpoint.failed.pop(sha, None)
+            checkpoint.done[sha] = {"file": key, "entries": len(rows)}
+            totals["ingested"] += 1
+            totals["entries"] += len(rows)
+            status = "ingested"
+            extra = {"inserted": change_log.inserted, "updated": change_log.updated, "deleted": change_log.deleted}
+        finally:
+            _discard(path, staging)
+        checkpoint.save()
+        report(key, status, **extra)
+
+    def drain(pending, return_when):
+        finished, _ = wait(pending, return_when=return_when)
+        for future in finished:
+            key, path, sha = pending.pop(future)
+            finish(key, path, sha, future.result)
+
+    with tempfile.TemporaryDirectory(prefix="timetable-ingest-") as staging:
+        pool = None
+        if workers > 1 and not dry_run:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "chatbot.settings"),),
+            )
+        pending = {}
+        batch = set()
+        try:
+            for key, path, sha in scan(source, staging, checkpoint.data["fingerprints"]):
+                totals["seen"] += 1
+                if sha in known or sha in checkpoint.done or sha in batch:
+                    totals["skipped"] += 1
+                    _discard(path, staging)
+                    report(key, "skipped")
+                    continue
+                batch.add(sha)
+                if dry_run:
+                    totals["new"] += 1
+                    _discard(path, staging)
+                    report(key, "new")
+                elif pool is None:
+                    finish(key, path, sha, lambda path=path: parse_pdf_rows(path))
+                else:
+                    pending[pool.submit(parse_pdf_rows, path)] = (key, path, sha)
+                    if len(pending) >= workers * QUEUE_PER_WORKER:
+                        drain(pending, FIRST_COMPLETED)
+            if pending:
+                drain(pending, ALL_COMPLETED)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            checkpoint.save()
+
+    totals["elapsed_s"] = round(time.perf_counter() - started, 2)
+    return totals
@@ -0,0 +1,47 @@
+"""
+Small helpers shared by the modules that keep counters and versions in the
+default cache (schedule_cache, department_tree, llm, query_cache, ...).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def cache_is_shared():
+    """False for cache backends that only live inside one process"""
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def increment(key):
+    """Add one to a counter that never expires, creating it on first use"""
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:  # evicted between add() and incr()
+            cache.set(key, 1, None)
+
+
+def new_generation():
+    return format(time.time_ns(), "x")
+
+
+def generation(key, timeout=None):
+    """Current generation stored under key, starting a new one on a cold cache"""
+    value = cache.get(key)
+    if value is None:
+        value = new_generation()
+        # add() so two workers racing on a cold cache agree on one value
+        if not cache.add(key, value, timeout):
+            value = cache.get(key, value)
+    return value
+
+
+def bump_generation(key, timeout=None):
+    """Start a new generation under key; everything keyed on the old one goes stale"""
+    cache.set(key, new_generation(), timeout)
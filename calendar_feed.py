@@ -0,0 +1,149 @@
+"""
+Per-teacher iCalendar (.ics) subscription feeds.
+
+Every TimetableEntry becomes one weekly recurring VEVENT, so the feed size
+depends only on the number of slots, not on how many weeks it covers. The
+rendered feed is cached per timetable version and its ETag is derived from
+the version alone, so a conditional poll is answered without rendering or
+touching the entries table.
+"""
+import datetime
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import TeacherProfile, TimetableEntry
+from .schedule_cache import timetable_version
+from .timetable_parser import to_time
+
+ICS_DAYS = {"Mo": "MO", "Tu": "TU", "We": "WE", "Th": "TH", "Fr": "FR", "Sa": "SA", "Su": "SU"}
+DAY_OFFSETS = {"Mo": 0, "Tu": 1, "We": 2, "Th": 3, "Fr": 4, "Sa": 5, "Su": 6}
+FEED_CACHE_KEY = "ics_feed:{}:{}"
+TOKEN_CACHE_KEY = "ics_token:{}"
+PRODID = "-//Teacher Timetable Hub//Timetable Feed//EN"
+
+
+def get_or_create_token(profile):
+    """Return the teacher's feed token, generating one on first use"""
+    if not profile.calendar_token:
+        profile.calendar_token = secrets.token_urlsafe(24)
+        profile.save(update_fields=["calendar_token"])
+    return profile.calendar_token
+
+
+def rotate_token(profile):
+    """Issue a new token; the old subscription URL stops working immediately"""
+    if profile.calendar_token:
+        cache.delete(TOKEN_CACHE_KEY.format(profile.calendar_token))
+    profile.calendar_token = secrets.token_urlsafe(24)
+    profile.save(update_fields=["calendar_token"])
+    return profile.calendar_token
+
+
+def resolve_token(token):
+    """(user_id, username) for a feed token, cached so polls skip the DB"""
+    key = TOKEN_CACHE_KEY.format(token)
+    owner = cache.get(key)
+    if owner is None:
+        profile = (
+            TeacherProfile.objects.select_related("user")
+            .filter(calendar_token=token, is_active=True)
+            .first()
+        )
+        if profile is None:
+            return None
+        owner = (profile.user_id, profile.user.username)
+        cache.set(key, owner)
+    return owner
+
+
+def feed_etag(user_id, version):
+    return f'"ics-{user_id}-{version}"'
+
+
+def _escape(text):
+    return (
+        (text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line):
+    """Fold content lines at 75 octets as RFC 5545 requires"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        # don't split inside a multi-byte character
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode("utf-8"))
+    return "\r\n ".join(parts)
+
+
+def render_feed(username, entries, anchor=None):
+    """Render entries as a VCALENDAR with weekly RRULEs"""
+    tz_name = settings.TIME_ZONE
+    today = timezone.localdate()
+    anchor = anchor or today - datetime.timedelta(days=today.weekday())  # Monday of this week
+    stamp = timezone.now().strftime("%Y%m%dT%H%M%SZ")
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(username)} - Timetable",
+        f"X-WR-TIMEZONE:{tz_name}",
+    ]
+    for entry in entries:
+        if entry.day not in ICS_DAYS:
+            continue
+        start = to_time(entry.start_time)
+        if start is None:
+            continue
+        end = to_time(entry.end_time)
+        if end is None or end <= start:
+            end = (datetime.datetime.combine(anchor, start) + datetime.timedelta(hours=1)).time()
+        first_day = anchor + datetime.timedelta(days=DAY_OFFSETS[entry.day])
+        location = entry.room or ""
+        lines.extend([
+            "BEGIN:VEVENT",
+            f"UID:timetable-entry-{entry.pk}@timetable-hub",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;TZID={tz_name}:{first_day:%Y%m%d}T{start:%H%M%S}",
+            f"DTEND;TZID={tz_name}:{first_day:%Y%m%d}T{end:%H%M%S}",
+            f"RRULE:FREQ=WEEKLY;BYDAY={ICS_DAYS[entry.day]}",
+            f"SUMMARY:{_escape(entry.subject or 'Class')}",
+        ])
+        if location:
+            lines.append(f"LOCATION:{_escape(location)}")
+        lines.append("END:VEVENT")
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_fold(line) for line in lines) + "\r\n"
+
+
+def get_feed(user_id, username):
+    """(etag, body) for a teacher's feed, rendered at most once per timetable version"""
+    version = timetable_version(username)
+    key = FEED_CACHE_KEY.format(user_id, version)
+    body = cache.get(key)
+    if body is None:
+        entries = (
+            TimetableEntry.objects.filter(teacher_name__icontains=username)
+            .only("id", "day", "start_time", "end_time", "subject", "room")
+            .order_by("day", "start_time")
+        )
+        body = render_feed(username, entries)
+        cache.set(key, body)
+    return feed_etag(user_id, version), body
@@ -0,0 +1,364 @@
+"""
+Resumable, chunked timetable PDF uploads.
+
+A client announces the upload (name, size, optional SHA-256), then POSTs the
+file in chunks, each with an ``Upload-Offset`` header. ChunkAppendHandler
+writes every chunk straight into a partial file in MEDIA_ROOT and feeds the
+SHA-256 while the bytes stream in, so nothing is buffered in memory or in a
+temp file and the PDF is never re-read for hashing. The view settles CSRF
+(header token), the offset, Content-Length and the per-upload lock from the
+headers; only then is the handler installed and the body read.
+
+An interrupted upload is resumed by asking for the stored offset and sending
+the rest. The running hash state is kept per process; a worker that didn't
+see the earlier chunks rehashes the partial file once.
+
+When the last byte arrives, the partial file is moved to its final place and
+goes through the same processing as a form upload (parse, preview, search
+index, ingest).
+"""
+import datetime
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import ChunkedUpload, Semester, TimetablePDF, TimetableUpload
+
+PARTIAL_DIR = "uploads/partial"
+CHUNK_FIELD = "chunk"
+MULTIPART_OVERHEAD = 16 * 1024    # boundaries and part headers around one chunk
+PDF_MAGIC = b"%PDF-"
+HASHER_CACHE_SIZE = 64
+LOCK_KEY = "chunked-upload:lock:{}"
+LOCK_TIMEOUT = 5 * 60
+
+_hashers = OrderedDict()          # upload id -> (offset, sha256 state at that offset)
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_upload_bytes():
+    return getattr(settings, "TIMETABLE_UPLOAD_MAX_BYTES", 50 * 1024 * 1024)
+
+
+def chunk_bytes():
+    return getattr(settings, "TIMETABLE_UPLOAD_CHUNK_BYTES", 2 * 1024 * 1024)
+
+
+def partial_path(upload):
+    return os.path.join(settings.MEDIA_ROOT, PARTIAL_DIR, f"{upload.pk}.part")
+
+
+# ========================================
+# Hash state
+# ========================================
+
+def _remember_hasher(upload_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[upload_id] = (offset, hasher)
+        _hashers.move_to_end(upload_id)
+        while len(_hashers) > HASHER_CACHE_SIZE:
+            _hashers.popitem(last=False)
+
+
+def _forget_hasher(upload_id):
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+
+
+def _hasher_at(upload):
+    """SHA-256 state after the first upload.offset bytes"""
+    with _hashers_lock:
+        cached = _hashers.get(upload.pk)
+    if cached and cached[0] == upload.offset:
+        return cached[1].copy()
+    # Another worker received the earlier chunks: rehash what is on disk once
+    hasher = hashlib.sha256()
+    remaining = upload.offset
+    if remaining:
+        with open(partial_path(upload), "rb") as fh:
+            while remaining > 0:
+                data = fh.read(min(1024 * 1024, remaining))
+                if not data:
+                    raise UploadError("Partial upload is missing data; restart the upload.", status=409)
+                hasher.update(data)
+                remaining -= len(data)
+    return hasher
+
+
+# ========================================
+# Upload handler
+# ========================================
+
+class ChunkAppendHandler(FileUploadHandler):
+    """
+    Writes the "chunk" file part of one request directly into the partial
+    file at the upload's offset, hashing as it goes. Errors are recorded on
+    the handler (the view turns them into responses) and stop the upload.
+    """
+
+    def __init__(self, upload, request=None):
+        super().__init__(request)
+        self.upload = upload
+        self.remaining = upload.total_size - upload.offset
+        self.written = 0
+        self.received = False
+        self.error = None
+        self.hasher = None
+        self._file = None
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        if field_name != CHUNK_FIELD or self._file is not None or self.received:
+            return
+        path = partial_path(self.upload)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.hasher = _hasher_at(self.upload)
+        self._file = open(path, "r+b" if os.path.exists(path) else "wb")
+        self._file.seek(self.upload.offset)
+        self._file.truncate()  # drop bytes of a chunk that was cut off earlier
+
+    def _fail(self, message, status):
+        self.error = UploadError(message, status)
+        raise StopUpload(connection_reset=True)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self._file is None or self.field_name != CHUNK_FIELD:
+            return None
+        if self.written + len(raw_data) > self.remaining:
+            self._fail("Chunk goes past the announced file size.", 413)
+        if self.upload.offset == 0 and self.written == 0 and not raw_data.startswith(PDF_MAGIC):
+            self._fail("Only PDF files are allowed.", 415)
+        self._file.write(raw_data)
+        self.hasher.update(raw_data)
+        self.written += len(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self._file is not None and self.field_name == CHUNK_FIELD:
+            self.close()
+            self.received = True
+        return None
+
+    def upload_interrupted(self):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def rollback(self):
+        """Discard a rejected chunk: the file goes back to the stored offset"""
+        self.close()
+        path = partial_path(self.upload)
+        if os.path.exists(path):
+            with open(path, "r+b") as fh:
+                fh.truncate(self.upload.offset)
+
+
+# ========================================
+# Upload lifecycle
+# ========================================
+
+def purge_expired():
+    """Delete unfinished uploads (and their partial files) past TIMETABLE_UPLOAD_EXPIRY_HOURS"""
+    hours = getattr(settings, "TIMETABLE_UPLOAD_EXPIRY_HOURS", 24)
+    cutoff = timezone.now() - datetime.timedelta(hours=hours)
+    stale = list(ChunkedUpload.objects.filter(status="uploading", updated_at__lt=cutoff))
+    for upload in stale:
+        discard(upload)
+    return len(stale)
+
+
+def discard(upload):
+    _forget_hasher(upload.pk)
+    try:
+        os.remove(partial_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def start_upload(user, data):
+    """Validate an announced upload and create its ChunkedUpload"""
+    purge_expired()
+
+    kind = data.get("kind") or "personal"
+    if kind not in dict(ChunkedUpload.KIND_CHOICES):
+        raise UploadError("Unknown upload kind.")
+    if kind != "personal" and not user.is_staff:
+        raise UploadError("Only staff can upload this kind of timetable.", status=403)
+
+    filename = os.path.basename(str(data.get("filename") or ""))
+    if not filename.lower().endswith(".pdf"):
+        raise UploadError("Only PDF files are allowed.", status=415)
+    filename = get_valid_filename(filename)
+    try:
+        size = int(data.get("size"))
+    except (TypeError, ValueError):
+        raise UploadError("size must be the file size in bytes.")
+    if size <= 0:
+        raise UploadError("size must be the file size in bytes.")
+    if size > max_upload_bytes():
+        raise UploadError(f"File is larger than {max_upload_bytes() // (1024 * 1024)} MB.", status=413)
+
+    sha256 = str(data.get("sha256") or "").lower()
+    if sha256 and (len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256)):
+        raise UploadError("sha256 must be a hex digest.")
+
+    semester, title = None, ""
+    if kind == "department":
+        try:
+            semester = Semester.objects.select_related("department").get(
+                pk=data.get("semester"), department_id=data.get("department")
+            )
+        except (Semester.DoesNotExist, ValueError, TypeError):
+            raise UploadError("Invalid department or semester selection!")
+        title = str(data.get("title") or "").strip()
+        if not title:
+            raise UploadError("title is required.")
+
+    return ChunkedUpload.objects.create(
+        user=user, kind=kind, filename=filename, total_size=size,
+        expected_sha256=sha256, semester=semester, title=title[:300],
+    )
+
+
+def check_content_length(upload, content_length):
+    """Refuse a chunk request from its headers, before any of the body is read"""
+    try:
+        length = int(content_length or 0)
+    except ValueError:
+        length = 0
+    if length <= 0:
+        raise UploadError("Content-Length is required.", status=411)
+    limit = min(chunk_bytes(), upload.total_size - upload.offset) + MULTIPART_OVERHEAD
+    if length > limit:
+        raise UploadError(f"Chunk too large: send at most {chunk_bytes()} bytes per request.", status=413)
+
+
+def check_offset(upload, offset_header):
+    if upload.status != "uploading":
+        raise UploadError(f"Upload is {upload.status}.", status=409)
+    try:
+        offset = int(offset_header)
+    except (TypeError, ValueError):
+        raise UploadError("Upload-Offset header is required.")
+    if offset != upload.offset:
+        raise UploadError(f"Expected Upload-Offset {upload.offset}.", status=409)
+
+
+@contextmanager
+def chunk_lock(upload):
+    """One chunk at a time per upload (a retried request may overlap a slow one)"""
+    key = LOCK_KEY.format(upload.pk)
+    if not cache.add(key, 1, LOCK_TIMEOUT):
+        raise UploadError("Another chunk of this upload is still being received.", status=409)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def commit_chunk(upload, handler):
+    """Record a fully received chunk; finishes the upload on the last one"""
+    if handler.error is not None:
+        handler.rollback()
+        raise handler.error
+    if not handler.received:
+        handler.rollback()
+        raise UploadError(f"No '{CHUNK_FIELD}' file in the request.")
+
+    upload.offset += handler.written
+    if upload.offset < upload.total_size:
+        upload.save(update_fields=["offset", "updated_at"])
+        _remember_hasher(upload.pk, upload.offset, handler.hasher)
+        return upload
+
+    _forget_hasher(upload.pk)
+    upload.file_hash = handler.hasher.hexdigest()
+    if upload.expected_sha256 and upload.expected_sha256 != upload.file_hash:
+        upload.status = "failed"
+        upload.result = {"error": "Checksum mismatch"}
+        upload.save(update_fields=["offset", "file_hash", "status", "result", "updated_at"])
+        os.remove(partial_path(upload))
+        raise UploadError("Checksum mismatch: the received file differs from the announced one.", status=422)
+    return finish(upload)
+
+
+def _move_into_storage(upload, upload_to):
+    """Move the partial file into a FileField's upload_to without copying it"""
+    name = default_storage.get_available_name(os.path.join(upload_to, upload.filename))
+    final_path = default_storage.path(name)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(partial_path(upload), final_path)
+    return name
+
+
+def finish(upload):
+    """Turn a complete upload into a TimetableUpload / TimetablePDF and process it"""
+    from . import pdf_search, timetable_files
+    from .timetable_parser import ParseMemoryExceeded, ingest_department_pdf, parse_and_save_timetable
+
+    result = {}
+    try:
+        if upload.kind == "department":
+            name = _move_into_storage(upload, "department_timetables")
+            pdf = TimetablePDF.objects.create(
+                semester=upload.semester, title=upload.title, pdf_file=name, uploaded_by=upload.user
+            )
+            result["timetable_pdf_id"] = pdf.pk
+            timetable_files.process_uploaded_pdf(pdf, file_hash=upload.file_hash)
+            pdf_search.index_uploaded_pdf(pdf)
+            change_log = ingest_department_pdf(pdf)
+        else:
+            name = _move_into_storage(upload, "timetables")
+            timetable_upload = TimetableUpload.objects.create(
+                uploader=upload.user, uploaded_file=name, file_hash=upload.file_hash
+            )
+            result["timetable_upload_id"] = timetable_upload.pk
+            teacher_username = upload.user.username if upload.kind == "personal" else None
+            change_log = parse_and_save_timetable(
+                timetable_upload.uploaded_file.path, timetable_upload, teacher_username=teacher_username
+            )
+        result.update(inserted=change_log.inserted, updated=change_log.updated, deleted=change_log.deleted)
+    except ParseMemoryExceeded as exc:
+        result.pop("timetable_upload_id", None)  # deleted again by parse_and_save_timetable
+        result["error"] = str(exc)
+    except Exception:
+        # The file itself is stored; only its conversion into schedules failed
+        result["error"] = "The timetable table could not be parsed into schedules."
+
+    upload.status = "complete"
+    upload.result = result
+    upload.save(update_fields=["offset", "file_hash", "status", "result", "updated_at"])
+    return upload
+
+
+def status_payload(upload):
+    return {
+        "id": str(upload.pk),
+        "kind": upload.kind,
+        "filename": upload.filename,
+        "size": upload.total_size,
+        "offset": upload.offset,
+        "status": upload.status,
+        "chunk_size": chunk_bytes(),
+        "sha256": upload.file_hash or None,
+        "result": upload.result,
+    }
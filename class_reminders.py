@@ -0,0 +1,297 @@
+"""
+Upcoming-class reminders.
+
+A long-running scheduler (``manage.py run_reminder_scheduler``) keeps a
+min-heap of the next start event of every linked TimetableEntry. It sleeps
+until the earliest reminder is due, hands it to the configured sinks and
+pushes the same slot one week later, so the database is read once at start
+and afterwards only for teachers whose timetable changed.
+
+Ingestion queues changed teachers as ReminderReload rows (one per teacher)
+in the same transaction as the entries (``mark_teachers_dirty``). The
+scheduler does not poll that table: with a shared cache every mark also
+bumps a cache generation once it commits, and the scheduler only reads the
+queue when the generation moved (ReloadWatch). Without a shared cache it
+reads it every REMINDER_RELOAD_POLL_SECONDS. A teacher marked again while
+the scheduler reloads keeps their row and is reloaded on the next read.
+
+Sinks are pluggable (REMINDER_SINKS). CacheInboxSink feeds the per-teacher
+SSE stream served by ``reminder_stream_view``; it needs a cache shared by
+the scheduler and the web workers, so by default it is only used with a
+shared cache backend (LogSink alone otherwise), and the scheduler refuses to
+start if it is configured on a per-process cache.
+"""
+import datetime
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .cache_utils import bump_generation, cache_is_shared
+from .models import ReminderReload, TimetableEntry
+from .timetable_parser import DAY_MAP, to_time
+
+logger = logging.getLogger(__name__)
+
+DIRTY_ALL = "*"
+ALL_TEACHERS = 0               # ReminderReload.teacher_id meaning everyone
+CHANGED_KEY = "reminders:changed"
+DELETE_BATCH_SIZE = 500
+INBOX_KEY = "reminders:inbox:{}"
+INBOX_SEQ_KEY = "reminders:seq:{}"
+INBOX_SIZE = 20
+WEEKDAYS = {abbr: index for index, abbr in enumerate(DAY_MAP.values())}  # Mo=0 .. Sa=5
+
+
+def lead_minutes():
+    return getattr(settings, "REMINDER_LEAD_MINUTES", 10)
+
+
+# ========================================
+# Change notification (web process -> scheduler)
+# ========================================
+
+def mark_teachers_dirty(teacher_ids=None):
+    """Tell the scheduler to reload these teachers, or everyone if None"""
+    ids = {ALL_TEACHERS} if teacher_ids is None else {tid for tid in teacher_ids if tid}
+    if not ids:
+        return
+    now = timezone.now()
+    retention = datetime.timedelta(hours=getattr(settings, "REMINDER_RELOAD_RETENTION_HOURS", 24))
+    ReminderReload.objects.filter(marked_at__lt=now - retention).delete()
+    ReminderReload.objects.bulk_create(
+        [ReminderReload(teacher_id=tid, marked_at=now) for tid in ids],
+        update_conflicts=True, unique_fields=["teacher_id"], update_fields=["marked_at"],
+    )
+    if cache_is_shared():
+        transaction.on_commit(lambda: bump_generation(CHANGED_KEY))
+
+
+def take_dirty():
+    """Teacher ids queued since the last call ({DIRTY_ALL} means everyone)"""
+    queued = list(ReminderReload.objects.values_list("teacher_id", "marked_at"))
+    if not queued:
+        return set()
+    # Rows marked again after this read have a later marked_at and stay queued
+    newest = max(marked_at for _, marked_at in queued)
+    ids = [teacher_id for teacher_id, _ in queued]
+    for start in range(0, len(ids), DELETE_BATCH_SIZE):
+        ReminderReload.objects.filter(
+            teacher_id__in=ids[start:start + DELETE_BATCH_SIZE], marked_at__lte=newest
+        ).delete()
+    return {DIRTY_ALL if teacher_id == ALL_TEACHERS else teacher_id for teacher_id in ids}
+
+
+class ReloadWatch:
+    """
+    When the scheduler should read the reload queue: whenever CHANGED_KEY
+    moved on a shared cache, and at least every poll_seconds (the only
+    trigger without a shared cache).
+    """
+
+    def __init__(self, poll_seconds=None):
+        self.shared = cache_is_shared()
+        self.poll_seconds = poll_seconds if poll_seconds is not None else getattr(
+            settings, "REMINDER_RELOAD_POLL_SECONDS", 300
+        )
+        self.seen = self._generation()
+        self.next_poll = time.monotonic() + self.poll_seconds
+
+    def _generation(self):
+        return cache.get(CHANGED_KEY) if self.shared else None
+
+    def due(self):
+        now = time.monotonic()
+        generation = self._generation()
+        if generation != self.seen or now >= self.next_poll:
+            self.seen = generation
+            self.next_poll = now + self.poll_seconds
+            return True
+        return False
+
+
+# ========================================
+# Sinks
+# ========================================
+
+class LogSink:
+    """Writes reminders to the app logger (useful for local runs)"""
+
+    def send(self, reminder):
+        logger.info("Reminder for teacher %s: %s", reminder["teacher_id"], reminder["message"])
+
+
+class CacheInboxSink:
+    """Appends reminders to a short per-teacher inbox read by the SSE stream"""
+
+    def send(self, reminder):
+        teacher_id = reminder["teacher_id"]
+        seq_key = INBOX_SEQ_KEY.format(teacher_id)
+        cache.add(seq_key, 0, None)
+        message = dict(reminder, id=cache.incr(seq_key))
+        inbox_key = INBOX_KEY.format(teacher_id)
+        inbox = cache.get(inbox_key) or []
+        inbox.append(message)
+        cache.set(inbox_key, inbox[-INBOX_SIZE:], 60 * 60 * 24)
+
+
+def load_sinks():
+    default = ["app.class_reminders.LogSink"]
+    if cache_is_shared():
+        default.insert(0, "app.class_reminders.CacheInboxSink")
+    paths = getattr(settings, "REMINDER_SINKS", default)
+    return [import_string(path)() for path in paths]
+
+
+def inbox_since(teacher_id, last_id=0):
+    """Unexpired reminders newer than last_id, oldest first"""
+    now = timezone.now().timestamp()
+    return [
+        message for message in cache.get(INBOX_KEY.format(teacher_id)) or []
+        if message["id"] > last_id and message["starts_at"] >= now
+    ]
+
+
+# ========================================
+# Scheduler
+# ========================================
+
+@dataclass(order=True)
+class _Event:
+    fire_at: datetime.datetime
+    seq: int
+    teacher_id: int = field(compare=False)
+    generation: int = field(compare=False)
+    starts_at: datetime.datetime = field(compare=False)
+    slot: dict = field(compare=False)
+
+
+def next_occurrence(day_abbr, start, after):
+    """First datetime on weekday day_abbr at time start that is later than after"""
+    weekday = WEEKDAYS[day_abbr]
+    local_after = timezone.localtime(after)
+    days_ahead = (weekday - local_after.weekday()) % 7
+    candidate = datetime.datetime.combine(local_after.date() + datetime.timedelta(days=days_ahead), start)
+    candidate = timezone.make_aware(candidate, timezone.get_current_timezone())
+    if candidate <= after:
+        candidate += datetime.timedelta(days=7)
+    return candidate
+
+
+class ReminderScheduler:
+    """
+    Min-heap of upcoming reminders. Replacing a teacher bumps their generation;
+    old heap items are then dropped lazily when they surface.
+    """
+
+    def __init__(self, sinks=None, lead=None):
+        self.sinks = sinks if sinks is not None else load_sinks()
+        self.lead = datetime.timedelta(minutes=lead if lead is not None else lead_minutes())
+        self.heap = []
+        self.generations = {}
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def _push(self, teacher_id, generation, starts_at, slot):
+        heapq.heappush(self.heap, _Event(starts_at - self.lead, next(self._seq), teacher_id, generation, starts_at, slot))
+
+    def _load(self, teacher_id, entries, now):
+        generation = self.generations.get(teacher_id, 0) + 1
+        self.generations[teacher_id] = generation
+        for day, start_time, end_time, subject, room in entries:
+            start = to_time(start_time)
+            if day not in WEEKDAYS or start is None:
+                continue
+            slot = {"day": day, "start": start_time, "end": end_time or "", "subject": subject or "Class", "room": room or ""}
+            starts_at = next_occurrence(day, start, now + self.lead)
+            self._push(teacher_id, generation, starts_at, slot)
+
+    def _entries(self, teacher_ids=None):
+        rows = TimetableEntry.objects.filter(teacher__isnull=False)
+        if teacher_ids is not None:
+            rows = rows.filter(teacher_id__in=teacher_ids)
+        rows = rows.order_by("teacher_id").values_list("teacher_id", "day", "start_time", "end_time", "subject", "room")
+        grouped = {}
+        for teacher_id, *slot in rows.iterator(chunk_size=2000):
+            grouped.setdefault(teacher_id, []).append(slot)
+        return grouped
+
+    def rebuild(self, now=None):
+        """Full load: one query for all teachers"""
+        now = now or timezone.now()
+        self.heap = []
+        self.generations = {}
+        for teacher_id, entries in self._entries().items():
+            self._load(teacher_id, entries, now)
+
+    def reload_teachers(self, teacher_ids, now=None):
+        """Incremental update after an upload: only these teachers are re-read"""
+        now = now or timezone.now()
+        grouped = self._entries(teacher_ids)
+        for teacher_id in teacher_ids:
+            # teachers with no entries left still get a new generation, dropping old events
+            self._load(teacher_id, grouped.get(teacher_id, []), now)
+        if len(self.heap) > 2 * sum(1 for _ in self._live()) + 1000:
+            self._compact()
+
+    def _live(self):
+        return (e for e in self.heap if self.generations.get(e.teacher_id) == e.generation)
+
+    def _compact(self):
+        self.heap = list(self._live())
+        heapq.heapify(self.heap)
+
+    def apply_dirty(self, now=None):
+        dirty = take_dirty()
+        if DIRTY_ALL in dirty:
+            self.rebuild(now)
+        elif dirty:
+            self.reload_teachers(sorted(dirty), now)
+        return dirty
+
+    def seconds_until_next(self, now=None):
+        if not self.heap:
+            return None
+        now = now or timezone.now()
+        return max((self.heap[0].fire_at - now).total_seconds(), 0)
+
+    def fire_due(self, now=None):
+        """Send every reminder that is due; returns how many were sent"""
+        now = now or timezone.now()
+        sent = 0
+        while self.heap and self.heap[0].fire_at <= now:
+            event = heapq.heappop(self.heap)
+            if self.generations.get(event.teacher_id) != event.generation:
+                continue  # superseded by a newer upload
+            if event.starts_at > now:  # skip reminders for classes that already started (e.g. after downtime)
+                self._dispatch(event, now)
+                sent += 1
+            self._push(event.teacher_id, event.generation, event.starts_at + datetime.timedelta(days=7), event.slot)
+        return sent
+
+    def _dispatch(self, event, now):
+        minutes = max(int((event.starts_at - now).total_seconds() // 60), 0)
+        slot = event.slot
+        reminder = {
+            "teacher_id": event.teacher_id,
+            "subject": slot["subject"],
+            "room": slot["room"],
+            "time": f"{slot['start']} - {slot['end']}".strip(" -"),
+            "starts_at": event.starts_at.timestamp(),
+            "starts_in": minutes,
+            "message": f"{slot['subject']} in {minutes} minutes" + (f" ({slot['room']})" if slot["room"] else ""),
+        }
+        for sink in self.sinks:
+            try:
+                sink.send(reminder)
+            except Exception:
+                logger.exception("Reminder sink %s failed", type(sink).__name__)
@@ -0,0 +1,84 @@
+"""
+Cached Department -> Semester -> TimetablePDF tree.
+
+Built with prefetch_related in three queries, cached under a generation
+number that signals bump on any Department / Semester / TimetablePDF
+change. The generation doubles as the ETag of the JSON endpoint.
+"""
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.urls import reverse
+
+from .cache_utils import bump_generation, generation
+from .models import Department, Semester, TimetablePDF
+
+VERSION_KEY = "department_tree:version"
+TREE_KEY = "department_tree:{}"
+
+
+def tree_version():
+    return generation(VERSION_KEY)
+
+
+def bump_tree_version():
+    bump_generation(VERSION_KEY)
+
+
+def tree_etag():
+    return f'"dept-tree-{tree_version()}"'
+
+
+def build_tree():
+    pdfs = TimetablePDF.objects.only(
+        "id", "semester_id", "title", "uploaded_at", "preview_image", "preview_failed", "file_hash"
+    ).order_by("-uploaded_at")
+    semesters = Semester.objects.only("id", "department_id", "number").order_by("number").prefetch_related(
+        Prefetch("timetable_pdfs", queryset=pdfs)
+    )
+    departments = Department.objects.only("id", "name").order_by("name").prefetch_related(
+        Prefetch("semesters", queryset=semesters)
+    )
+    return [
+        {
+            "id": department.id,
+            "name": department.name,
+            "semesters": [
+                {
+                    "id": semester.id,
+                    "number": semester.number,
+                    "pdfs": [
+                        {
+                            "id": pdf.id,
+                            "title": pdf.title,
+                            "uploaded_at": pdf.uploaded_at.isoformat(),
+                            "file_url": reverse("timetable_pdf_file", args=[pdf.id]),
+                            "preview_url": None if pdf.preview_failed else reverse("timetable_pdf_preview", args=[pdf.id]),
+                        }
+                        for pdf in semester.timetable_pdfs.all()
+                    ],
+                }
+                for semester in department.semesters.all()
+            ],
+        }
+        for department in departments
+    ]
+
+
+def get_tree():
+    """(version, tree) - rebuilt at most once per version"""
+    version = tree_version()
+    key = TREE_KEY.format(version)
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_tree()
+        cache.set(key, tree)
+    return version, tree
+
+
+def semesters_for(department_id):
+    """Semester list for one department, served from the cached tree"""
+    version, tree = get_tree()
+    for department in tree:
+        if str(department["id"]) == str(department_id):
+            return [{"id": s["id"], "number": s["number"]} for s in department["semesters"]]
+    return []
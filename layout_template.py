@@ -0,0 +1,227 @@
+"""
+Layout-template fast path for timetable table extraction.
+
+All department timetables share one grid, so the expensive part of
+``page.extract_tables()`` (edge merging, intersections, cell building) is
+done once: the column and row boundaries are learned from the first page,
+or loaded from the template saved on the Department. Every later page is
+read by extracting the words of the whole page once, with no cropping: each
+word is placed against the table bbox, words inside it are dropped into
+their grid cell by coordinates and words clear of it are ignored. Merged
+cells (labs spanning two periods) are detected per page from the vertical
+ruling lines.
+
+A page is only read this way when it still has the template's table: every
+ruling line touching the table lies on a template grid line, the outer
+frame is drawn, and no word straddles the table or sits beside it (text
+wholly above or below, like a heading, is fine). Any page that fails these
+checks or validation falls back to full table detection.
+"""
+from bisect import bisect_right
+from dataclasses import asdict, dataclass, field
+
+from .timetable_parser import DAY_MAP, PERIOD_RE
+
+EDGE_TOLERANCE = 2.0      # pt: how close a ruling line must be to a grid edge
+LINE_TOLERANCE = 3.0      # pt: words whose tops differ less than this are on one line
+SIZE_TOLERANCE = 1.0      # pt: allowed page size difference from the template
+DAY_NAMES = set(DAY_MAP) | set(DAY_MAP.values())
+
+
+@dataclass
+class LayoutTemplate:
+    col_edges: list
+    row_edges: list
+    page_size: tuple
+
+    @property
+    def bbox(self):
+        return (self.col_edges[0], self.row_edges[0], self.col_edges[-1], self.row_edges[-1])
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data:
+            return None
+        return cls(list(data["col_edges"]), list(data["row_edges"]), tuple(data["page_size"]))
+
+    def fits(self, page):
+        width, height = self.page_size
+        return abs(page.width - width) <= SIZE_TOLERANCE and abs(page.height - height) <= SIZE_TOLERANCE
+
+
+@dataclass
+class ExtractionStats:
+    template_pages: int = 0
+    fallback_pages: int = 0
+    template: LayoutTemplate = None
+    learned: bool = False
+    learn_attempted: bool = False
+    failures: list = field(default_factory=list)
+    pages: int = 0
+    peak_memory_kb: int = 0
+
+
+def _dedupe(values):
+    edges = []
+    for value in sorted(values):
+        if not edges or value - edges[-1] > EDGE_TOLERANCE:
+            edges.append(value)
+    return edges
+
+
+def learn_template(page):
+    """Learn the grid from a page with exactly one table (full detection, done once)"""
+    tables = page.find_tables()
+    if len(tables) != 1:
+        return None
+    cells = tables[0].cells
+    col_edges = _dedupe([c[0] for c in cells] + [c[2] for c in cells])
+    row_edges = _dedupe([c[1] for c in cells] + [c[3] for c in cells])
+    if len(col_edges) < 3 or len(row_edges) < 3:
+        return None
+    return LayoutTemplate(
+        [round(x, 2) for x in col_edges],
+        [round(y, 2) for y in row_edges],
+        (round(page.width, 2), round(page.height, 2)),
+    )
+
+
+def _vertical_rules(page):
+    """Vertical ruling segments as (x, top, bottom), from lines and rect sides"""
+    rules = []
+    for edge in page.edges:
+        if edge.get("orientation") == "v":
+            rules.append((edge["x0"], edge["top"], edge["bottom"]))
+    return rules
+
+
+def _has_rule(rules, x, y):
+    return any(abs(rx - x) <= EDGE_TOLERANCE and top - EDGE_TOLERANCE <= y <= bottom + EDGE_TOLERANCE
+               for rx, top, bottom in rules)
+
+
+def _near(value, edges):
+    return any(abs(value - edge) <= EDGE_TOLERANCE for edge in edges)
+
+
+def _placement(obj, bbox):
+    """'inside' the table bbox, 'clear' of it (wholly above or below) or 'outside' (beside or straddling)"""
+    x0, top, x1, bottom = bbox
+    if (obj["x0"] >= x0 - EDGE_TOLERANCE and obj["x1"] <= x1 + EDGE_TOLERANCE
+            and obj["top"] >= top - EDGE_TOLERANCE and obj["bottom"] <= bottom + EDGE_TOLERANCE):
+        return "inside"
+    if obj["bottom"] < top - EDGE_TOLERANCE or obj["top"] > bottom + EDGE_TOLERANCE:
+        return "clear"
+    return "outside"
+
+
+def rules_match(page, template):
+    """The page's ruling lines are the template grid: all on grid lines, outer frame drawn"""
+    x0, top, x1, bottom = template.bbox
+    frame = set()
+    for edge in page.edges:
+        orientation = edge.get("orientation")
+        placement = _placement(edge, template.bbox)
+        if placement == "clear":
+            continue
+        if placement == "outside":
+            return False   # the table grew, or a rule runs past it
+        if orientation == "h":
+            if not _near(edge["top"], template.row_edges):
+                return False
+            frame.update(name for name, y in (("top", top), ("bottom", bottom)) if abs(edge["top"] - y) <= EDGE_TOLERANCE)
+        elif orientation == "v":
+            if not _near(edge["x0"], template.col_edges):
+                return False
+            frame.update(name for name, x in (("left", x0), ("right", x1)) if abs(edge["x0"] - x) <= EDGE_TOLERANCE)
+    return frame == {"top", "bottom", "left", "right"}
+
+
+def _cell_text(words):
+    if not words:
+        return ""
+    words.sort(key=lambda w: (round(w["top"]), w["x0"]))
+    lines, current, current_top = [], [], None
+    for word in words:
+        if current_top is not None and abs(word["top"] - current_top) > LINE_TOLERANCE:
+            lines.append(" ".join(current))
+            current = []
+        if not current:
+            current_top = word["top"]
+        current.append(word["text"])
+    lines.append(" ".join(current))
+    return "\n".join(lines)
+
+
+def extract_with_template(page, template):
+    """
+    Return the page's table in extract_tables() shape (list of rows of str/None),
+    or None if the page doesn't fit the template.
+    """
+    if not template.fits(page) or not rules_match(page, template):
+        return None
+    col_edges, row_edges = template.col_edges, template.row_edges
+    n_cols, n_rows = len(col_edges) - 1, len(row_edges) - 1
+
+    grid = [[[] for _ in range(n_cols)] for _ in range(n_rows)]
+    for word in page.extract_words():
+        placement = _placement(word, template.bbox)
+        if placement == "clear":
+            continue
+        if placement == "outside":
+            return None   # the template would drop it
+        col = bisect_right(col_edges, (word["x0"] + word["x1"]) / 2) - 1
+        row = bisect_right(row_edges, (word["top"] + word["bottom"]) / 2) - 1
+        if 0 <= col < n_cols and 0 <= row < n_rows:
+            grid[row][col].append(word)
+
+    # Merge horizontally adjacent cells with no ruling line between them;
+    # extract_tables() reports merged continuation cells as None
+    rules = _vertical_rules(page)
+    table = []
+    for r in range(n_rows):
+        mid_y = (row_edges[r] + row_edges[r + 1]) / 2
+        owners, owner = [], 0
+        for c in range(n_cols):
+            if c and not _has_rule(rules, col_edges[c], mid_y):
+                grid[r][owner].extend(grid[r][c])
+                owners.append(None)
+            else:
+                owner = c
+                owners.append(c)
+        table.append([_cell_text(grid[r][c]) if c is not None else None for c in owners])
+    return table
+
+
+def validate_table(table):
+    """Cheap sanity checks that the grid really landed on a timetable"""
+    if not table or len(table) < 2:
+        return False
+    header = [cell or "" for cell in table[0][1:]]
+    if not any(PERIOD_RE.search(cell.replace("\n", " ")) for cell in header):
+        return False
+    day_rows = sum(1 for row in table[1:] if row and (row[0] or "").strip() in DAY_NAMES)
+    return day_rows >= 1
+
+
+def extract_tables(page, stats, template_enabled=True):
+    """
+    Tables of one page: template fast path when possible, full detection otherwise.
+    The first page without a known template is used to learn it.
+    """
+    if template_enabled:
+        if stats.template is None and not stats.learn_attempted:
+            stats.learn_attempted = True
+            stats.template = learn_template(page)
+            stats.learned = stats.template is not None
+        if stats.template is not None:
+            table = extract_with_template(page, stats.template)
+            if table is not None and validate_table(table):
+                stats.template_pages += 1
+                return [table]
+            stats.failures.append(page.page_number)
+    stats.fallback_pages += 1
+    return page.extract_tables()
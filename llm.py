@@ -0,0 +1,180 @@
+"""
+Groq LLM client used by the assistant views.
+
+The groq SDK (httpx, pydantic, ...) is only imported and the client only
+built the first time an assistant path actually needs it, so worker boot
+and ``manage.py`` commands don't pay for it.
+
+Identical prompts are single-flighted: while one call for a prompt is in
+flight, every other request with the same prompt fingerprint waits for it
+and gets the same answer instead of sending its own completion. This works
+across threads of one process; with LLM_SINGLE_FLIGHT_CROSS_PROCESS the
+leader also takes a lock in the shared cache and hands its answer to
+waiters in other workers through it.
+"""
+import hashlib
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_utils import increment
+
+MODEL_NAME = "llama-3.1-8b-instant"   # ✅ fast model
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared Groq client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from dotenv import load_dotenv
+                from groq import Groq
+
+                load_dotenv()
+                _client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    return _client
+
+
+def set_client(client):
+    """Swap in a different client (e.g. a local stub for benchmarks)"""
+    global _client
+    _client = client
+
+
+def _complete(prompt):
+    """(answer text, usage) of one completion; usage is None if the client reports none"""
+    response = get_client().chat.completions.create(
+        model=MODEL_NAME,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    return response.choices[0].message.content, getattr(response, "usage", None)
+
+
+# ========================================
+# Single-flight
+# ========================================
+
+FLIGHT_LOCK_KEY = "llm:flight:lock:{}"
+FLIGHT_RESULT_KEY = "llm:flight:result:{}"
+FLIGHT_STATS_KEY = "llm:flight:{}"
+FLIGHT_POLL_SECONDS = 0.1
+SHARED = object()   # usage marker: the answer came from another worker's call
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.answer = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _wait_timeout():
+    return getattr(settings, "LLM_SINGLE_FLIGHT_TIMEOUT", 30)
+
+
+def prompt_fingerprint(prompt):
+    return hashlib.sha256(f"{MODEL_NAME}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def _count(outcome):
+    increment(FLIGHT_STATS_KEY.format(outcome))
+
+
+def flight_stats():
+    """How many assistant answers needed their own LLM call vs. shared an in-flight one"""
+    calls = cache.get(FLIGHT_STATS_KEY.format("call"), 0)
+    coalesced = cache.get(FLIGHT_STATS_KEY.format("coalesced"), 0)
+    total = calls + coalesced
+    return {"calls": calls, "coalesced": coalesced, "coalesced_rate": round(coalesced / total, 4) if total else None}
+
+
+def _complete_shared(prompt, fingerprint):
+    """
+    Cross-process leg: the first worker to take the cache lock calls the LLM and
+    leaves the answer for the others; the rest poll for it. Returns the
+    answer and its usage, or SHARED if it was another worker's answer.
+    """
+    timeout = _wait_timeout()
+    lock_key = FLIGHT_LOCK_KEY.format(fingerprint)
+    result_key = FLIGHT_RESULT_KEY.format(fingerprint)
+    if cache.add(lock_key, 1, timeout):
+        try:
+            answer, usage = _complete(prompt)
+            # Only kept long enough for the waiting workers to pick it up
+            cache.set(result_key, answer, max(int(timeout), 1))
+            return answer, usage
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        answer = cache.get(result_key)
+        if answer is not None:
+            return answer, SHARED
+        if cache.get(lock_key) is None:
+            break  # the leader failed; don't wait for nothing
+        time.sleep(FLIGHT_POLL_SECONDS)
+    answer = cache.get(result_key)
+    if answer is not None:
+        return answer, SHARED
+    return _complete(prompt)
+
+
+def ask(prompt, on_usage=None):
+    """
+    Send a single-turn prompt and return the answer text.
+    on_usage(usage) is called when this request paid for its own completion
+    (not when it shared an in-flight one), e.g. to meter token quotas.
+    """
+    fingerprint = prompt_fingerprint(prompt)
+    with _flights_lock:
+        flight = _flights.get(fingerprint)
+        leader = flight is None
+        if leader:
+            flight = _flights[fingerprint] = _Flight()
+
+    if not leader:
+        if flight.done.wait(_wait_timeout()):
+            if flight.error is not None:
+                raise flight.error
+            _count("coalesced")
+            return flight.answer
+        # The leader is stuck; don't hold this request hostage to it
+        answer, usage = _complete(prompt)
+        _count("call")
+        _report_usage(on_usage, usage)
+        return answer
+
+    try:
+        if getattr(settings, "LLM_SINGLE_FLIGHT_CROSS_PROCESS", False):
+            flight.answer, usage = _complete_shared(prompt, fingerprint)
+        else:
+            flight.answer, usage = _complete(prompt)
+        shared = usage is SHARED
+        _count("coalesced" if shared else "call")
+        if not shared:
+            _report_usage(on_usage, usage)
+        return flight.answer
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(fingerprint, None)
+        flight.done.set()
+
+
+def _report_usage(on_usage, usage):
+    if on_usage is not None and usage is not None:
+        on_usage(usage)
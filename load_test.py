@@ -0,0 +1,311 @@
+"""
+End-to-end load-test harness (``manage.py load_test``).
+
+Seeds N teachers with synthetic timetables, replaces the Groq client with a
+local stub of configurable latency (llm.set_client), then drives concurrent
+logged-in sessions through the real middleware and URLconf with Django's
+test Client, one thread per session. Reports throughput and p50/p95/p99
+latency per endpoint as a JSON document that can be diffed against an
+earlier run (compare_reports), together with how the assistant queries
+were answered (LLM, query cache, locally because of limits).
+
+Every session comes from 127.0.0.1, so the per-IP rate limit and the daily
+token quotas would turn most assistant queries into local answers and the
+run would silently measure those. They are switched off for the run unless
+rate_limits=True (``--rate-limits``). The limits live in CACHES, so with the
+default per-process LocMemCache each worker enforces them separately.
+
+Seeded rows are created with bulk inserts (no signals) under a username
+prefix and removed again by cleanup().
+"""
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from . import llm, query_cache, query_log
+from .models import QueryLog, TeacherProfile, TimetableEntry, TimetableUpload
+from .timetable_parser import BULK_BATCH_SIZE, DAY_MAP
+
+USERNAME_PREFIX = "loadtest-"
+PASSWORD = "loadtest-password"
+SUBJECTS = ["Data Structures", "Operating Systems", "DBMS", "Computer Networks", "DBMS_LAB", "Compilers", "AI", "OS_LAB"]
+PERIODS = [("09:00", "09:50"), ("09:50", "10:40"), ("11:00", "11:50"), ("11:50", "12:40"),
+           ("13:30", "14:20"), ("14:20", "15:10"), ("15:10", "16:00")]
+QUERIES = [
+    "Show me today's full timetable.", "What is my timetable for tomorrow?", "Find my free slots today.",
+    "Tomorrow meri kitni classes hain?", "Friday ke all labs ki summary de do", "kal ki classes",
+    "How many classes do I have this week?", "Which room is my lab in on Monday?",
+]
+DEFAULT_MIX = {"dashboard": 5, "notifications": 2, "chatbot": 3}
+# Settings overridden for a run without rate limits (a burst of 0 disables a bucket)
+UNLIMITED = {"RATE_LIMIT_USER_BURST": 0, "RATE_LIMIT_IP_BURST": 0, "LLM_DAILY_TOKEN_QUOTA": None}
+
+
+# ========================================
+# Stub LLM
+# ========================================
+
+class StubLLMClient:
+    """
+    Stands in for groq.Groq: same chat.completions.create() call shape, answers
+    locally after a sleep drawn from the configured latency distribution.
+    """
+
+    def __init__(self, median_ms=800, distribution="lognormal", sigma=0.35, seed=None):
+        self.median_ms = median_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def latency_ms(self):
+        with self._lock:
+            if self.distribution == "fixed":
+                return self.median_ms
+            if self.distribution == "uniform":
+                return self._random.uniform(0, 2 * self.median_ms)
+            return self._random.lognormvariate(math.log(max(self.median_ms, 1)), self.sigma)
+
+    def _create(self, model, messages, **kwargs):
+        delay = self.latency_ms()
+        with self._lock:
+            self.calls += 1
+        time.sleep(delay / 1000)
+        prompt = messages[-1]["content"]
+        answer = f"[stub {model}] {len(prompt)} prompt characters answered in {delay:.0f} ms."
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(answer) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=answer))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+            ),
+        )
+
+
+# ========================================
+# Seeding
+# ========================================
+
+def seed_teachers(count, seed=0):
+    """Create `count` teachers with profiles and 4-6 classes per day; returns their Users"""
+    rng = random.Random(seed)
+    password = make_password(PASSWORD)  # hashed once, shared by every seeded account
+    User.objects.bulk_create(
+        [User(username=f"{USERNAME_PREFIX}{i:05d}", password=password) for i in range(count)],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by("username"))
+    TeacherProfile.objects.bulk_create(
+        [TeacherProfile(user=user, department="Load test") for user in users],
+        batch_size=BULK_BATCH_SIZE, ignore_conflicts=True,
+    )
+    entries = []
+    for user in users:
+        for day in DAY_MAP.values():
+            for start, end in sorted(rng.sample(PERIODS, rng.randint(4, 6))):
+                entries.append(TimetableEntry(
+                    teacher_name=user.username, teacher=user, day=day, start_time=start, end_time=end,
+                    subject=rng.choice(SUBJECTS), room=f"R{rng.randint(101, 420)}",
+                ))
+    TimetableEntry.objects.bulk_create(entries, batch_size=BULK_BATCH_SIZE)
+    return users
+
+
+def cleanup():
+    """Remove everything seed_teachers() and the run created"""
+    TimetableEntry.objects.filter(teacher_name__startswith=USERNAME_PREFIX).delete()
+    QueryLog.objects.filter(user__username__startswith=USERNAME_PREFIX).delete()
+    for upload in TimetableUpload.objects.filter(uploader__username__startswith=USERNAME_PREFIX):
+        upload.uploaded_file.delete(save=False)
+    deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    return deleted
+
+
+# ========================================
+# Driving sessions
+# ========================================
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def _requests(upload_pdf):
+    """endpoint name -> callable(client, rng) returning the response"""
+    def upload(client, rng):
+        with open(upload_pdf, "rb") as fh:
+            return client.post(reverse("upload"), {"timetable": fh})
+
+    actions = {
+        "dashboard": lambda client, rng: client.get(reverse("dashboard")),
+        "notifications": lambda client, rng: client.get(reverse("notifications")),
+        "chatbot": lambda client, rng: client.post(reverse("chatbot"), {"query": rng.choice(QUERIES)}),
+        "schedule_grid": lambda client, rng: client.get(reverse("schedule_lookup")),
+    }
+    if upload_pdf:
+        actions["upload"] = upload
+    return actions
+
+
+def run_load(users, mix=None, concurrency=10, duration=30, upload_pdf=None, host="127.0.0.1", seed=0):
+    """
+    Run `concurrency` sessions for `duration` seconds; each picks endpoints by
+    the weights in `mix`. Returns {endpoint: [(latency_ms, status), ...]} and the wall time.
+    """
+    actions = _requests(upload_pdf)
+    mix = {name: weight for name, weight in (mix or DEFAULT_MIX).items() if name in actions and weight > 0}
+    names, weights = list(mix), list(mix.values())
+    samples = defaultdict(list)
+    samples_lock = threading.Lock()
+    started, deadline = [None], [None]
+
+    def start_clock():
+        # Runs once every session is logged in, so logins don't eat into the duration
+        started[0] = time.perf_counter()
+        deadline[0] = started[0] + duration
+
+    start_barrier = threading.Barrier(concurrency + 1, action=start_clock)
+
+    def session(index):
+        rng = random.Random(seed * 7919 + index)
+        local = defaultdict(list)
+        try:
+            client = Client(HTTP_HOST=host)
+            client.force_login(users[index % len(users)])
+        except Exception:
+            start_barrier.abort()
+            connection.close()
+            raise
+        try:
+            start_barrier.wait()
+            while time.perf_counter() < deadline[0]:
+                name = rng.choices(names, weights)[0]
+                began = time.perf_counter()
+                try:
+                    status = actions[name](client, rng).status_code
+                except Exception:
+                    status = 599  # raised inside the view stack
+                local[name].append(((time.perf_counter() - began) * 1000, status))
+        except threading.BrokenBarrierError:
+            pass
+        finally:
+            connection.close()
+            with samples_lock:
+                for name, values in local.items():
+                    samples[name].extend(values)
+
+    threads = [threading.Thread(target=session, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        start_barrier.wait()
+    except threading.BrokenBarrierError:
+        raise RuntimeError("A load-test session could not log in")
+    finally:
+        for thread in threads:
+            thread.join()
+    return dict(samples), time.perf_counter() - started[0]
+
+
+def _summary(values, elapsed):
+    latencies = sorted(ms for ms, _ in values)
+    errors = sum(1 for _, status in values if status >= 400)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+        "p50_ms": round(percentile(latencies, 50), 2) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95), 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99), 2) if latencies else None,
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+    }
+
+
+def build_report(samples, elapsed, meta):
+    everything = [value for values in samples.values() for value in values]
+    return {
+        "meta": dict(meta, elapsed_s=round(elapsed, 2)),
+        "endpoints": {name: _summary(values, elapsed) for name, values in sorted(samples.items())},
+        "total": _summary(everything, elapsed),
+    }
+
+
+def answered_by_counts():
+    """{answered_by: queries} of the seeded teachers' assistant queries so far"""
+    query_log.flush()
+    rows = (QueryLog.objects.filter(user__username__startswith=USERNAME_PREFIX)
+            .values("answered_by").annotate(queries=Count("id")).order_by("answered_by"))
+    return {row["answered_by"]: row["queries"] for row in rows}
+
+
+def _counter_delta(before, after):
+    return {key: after[key] - before[key] for key in after if isinstance(after[key], int)}
+
+
+def compare_reports(baseline, current):
+    """Per endpoint: (metric, baseline, current, change %) for throughput and percentiles"""
+    rows = []
+    for name in sorted(set(baseline["endpoints"]) | set(current["endpoints"])):
+        before, after = baseline["endpoints"].get(name, {}), current["endpoints"].get(name, {})
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            old, new = before.get(metric), after.get(metric)
+            change = round((new - old) / old * 100, 1) if old and new is not None else None
+            rows.append((name, metric, old, new, change))
+    return rows
+
+
+def load_test(teachers=50, concurrency=10, duration=30, mix=None, upload_pdf=None,
+              llm_median_ms=800, llm_distribution="lognormal", llm_sigma=0.35, seed=0, keep=False,
+              rate_limits=False):
+    """Seed, run and tear down; returns the report dict"""
+    cleanup()
+    users = seed_teachers(teachers, seed=seed)
+    stub = StubLLMClient(llm_median_ms, llm_distribution, llm_sigma, seed=seed)
+    previous_client = llm._client
+    llm.set_client(stub)
+    flights_before, queries_before = llm.flight_stats(), query_cache.query_cache_stats()
+    try:
+        with override_settings(**({} if rate_limits else UNLIMITED)):
+            samples, elapsed = run_load(users, mix, concurrency, duration, upload_pdf, seed=seed)
+        answered_by = answered_by_counts()
+    finally:
+        llm.set_client(previous_client)
+        if not keep:
+            cleanup()
+    meta = {
+        "teachers": teachers,
+        "concurrency": concurrency,
+        "duration_s": duration,
+        "mix": mix or DEFAULT_MIX,
+        "upload_pdf": upload_pdf,
+        "llm_stub": {"median_ms": llm_median_ms, "distribution": llm_distribution, "sigma": llm_sigma,
+                     "calls": stub.calls},
+        "seed": seed,
+        "rate_limits": rate_limits,
+        "database": connection.vendor,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    report = build_report(samples, elapsed, meta)
+    # Counters are cumulative in the cache; report what this run added
+    report["llm"] = _counter_delta(flights_before, llm.flight_stats())
+    report["query_cache"] = _counter_delta(queries_before, query_cache.query_cache_stats())
+    report["answered_by"] = answered_by
+    return report
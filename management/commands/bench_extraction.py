@@ -0,0 +1,57 @@
+"""
+Compare full pdfplumber table detection with the layout-template fast path.
+
+    python manage.py bench_extraction media/department_timetables/cse_sem3.pdf --runs 3
+
+Reports wall time per path and whether both produce the same parsed rows.
+"""
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from app.layout_template import ExtractionStats
+from app.timetable_parser import parse_timetable_rows
+
+
+def _row_key(row):
+    return tuple(row[f] for f in ("teacher_name", "day", "start_time", "end_time", "subject"))
+
+
+class Command(BaseCommand):
+    help = "Benchmark layout-template table extraction against full detection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("pdf_paths", nargs="+")
+        parser.add_argument("--runs", type=int, default=3)
+
+    def _time(self, path, runs, **kwargs):
+        best, rows, stats = None, None, None
+        for _ in range(runs):
+            stats = ExtractionStats()
+            start = time.perf_counter()
+            rows = list(parse_timetable_rows(path, stats=stats, **kwargs))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, rows, stats
+
+    def handle(self, *args, **options):
+        for path in options["pdf_paths"]:
+            full_time, full_rows, _ = self._time(path, options["runs"], use_template=False)
+            fast_time, fast_rows, stats = self._time(path, options["runs"])
+
+            full_set, fast_set = Counter(map(_row_key, full_rows)), Counter(map(_row_key, fast_rows))
+            missing = sum((full_set - fast_set).values())
+            extra = sum((fast_set - full_set).values())
+
+            self.stdout.write(path)
+            self.stdout.write(f"  full detection   {full_time * 1000:9.1f} ms  {len(full_rows)} rows")
+            self.stdout.write(
+                f"  layout template  {fast_time * 1000:9.1f} ms  {len(fast_rows)} rows  "
+                f"({stats.template_pages} template pages, {stats.fallback_pages} fallback)"
+            )
+            self.stdout.write(f"  speed-up         {full_time / fast_time if fast_time else float('inf'):9.2f}x")
+            if missing or extra:
+                self.stdout.write(self.style.WARNING(f"  output differs: {missing} rows missing, {extra} extra"))
+            else:
+                self.stdout.write(self.style.SUCCESS("  identical parsed rows"))
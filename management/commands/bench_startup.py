@@ -0,0 +1,87 @@
+"""
+Measure how long a cold process takes to run django.setup(), to import the
+URLconf after that, and to become a ready WSGI worker.
+
+Each sample runs in a fresh interpreter so nothing is already cached in
+sys.modules. Usage:
+
+    python manage.py bench_startup --runs 10
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs inside the child interpreter. Prints one JSON line with timings (ms)
+# and which heavy modules ended up imported. setup_ms and urlconf_ms are
+# separate phases; ready_ms is the total from interpreter start.
+PROBE = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t_setup = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+t_urls = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import RequestFactory
+handler = WSGIHandler()
+environ = RequestFactory().get("/", HTTP_HOST="127.0.0.1").environ
+handler(environ, lambda status, headers, exc_info=None: None)
+t_ready = time.perf_counter()
+print(json.dumps({
+    "setup_ms": (t_setup - t0) * 1000,
+    "urlconf_ms": (t_urls - t_setup) * 1000,
+    "ready_ms": (t_ready - t0) * 1000,
+    "heavy_loaded": sorted(m for m in ("pdfplumber", "groq", "numpy", "pyarrow") if m in sys.modules),
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Benchmark cold URLconf import and worker ready time"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters to sample")
+        parser.add_argument("--json", action="store_true", help="Print raw samples as JSON")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault("DJANGO_SETTINGS_MODULE", "chatbot.settings")
+        samples = []
+        for _ in range(options["runs"]):
+            proc = subprocess.run(
+                [sys.executable, "-c", PROBE],
+                cwd=str(settings.BASE_DIR),
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            if proc.returncode != 0:
+                self.stderr.write(proc.stderr)
+                return
+            samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(samples, indent=2))
+            return
+
+        for key, label in (("setup_ms", "django.setup()"),
+                           ("urlconf_ms", "URLconf import"),
+                           ("ready_ms", "worker ready")):
+            values = [s[key] for s in samples]
+            self.stdout.write(
+                f"{label:<16} median {statistics.median(values):8.1f} ms   "
+                f"min {min(values):8.1f} ms   max {max(values):8.1f} ms"
+            )
+        heavy = sorted({m for s in samples for m in s["heavy_loaded"]})
+        if heavy:
+            self.stdout.write(self.style.WARNING(f"Heavy modules imported at startup: {', '.join(heavy)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("pdfplumber / groq / numpy / pyarrow not imported at startup"))
@@ -0,0 +1,37 @@
+"""
+Pack master grids (and the teacher workloads computed from them) for
+department timetable PDFs ingested before grids existed.
+
+    python manage.py build_master_grids          # PDFs without a grid
+    python manage.py build_master_grids --all    # repack every PDF from its entries
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from app import master_grid, workload
+from app.models import TimetablePDF
+
+
+class Command(BaseCommand):
+    help = "Build the packed teacher x day x period grids behind the department master grid"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebuild every grid, not just missing ones")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        pdfs = TimetablePDF.objects.select_related("semester")
+        if not options["all"]:
+            pdfs = pdfs.filter(master_grid__isnull=True)
+
+        built, departments = 0, set()
+        for pdf in pdfs:
+            grid = master_grid.rebuild_grid(pdf)
+            built += 1
+            departments.add(grid.department_id)
+            self.stdout.write(f"{pdf}: {len(grid.teachers)} teachers x {len(grid.periods)} periods, {grid.clashes} clashes")
+        workloads = sum(workload.refresh_workloads(department_id) for department_id in departments)
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {built} grids and {workloads} teacher workloads in {time.perf_counter() - start:.2f}s"
+        ))
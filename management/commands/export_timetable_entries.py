@@ -0,0 +1,54 @@
+"""
+Export parsed timetable entries without going through the admin.
+
+    python manage.py export_timetable_entries --format csv --output entries.csv
+    python manage.py export_timetable_entries --format jsonl --department 3 --from 2025-07-01
+    python manage.py export_timetable_entries --format parquet --output entries.parquet   # needs pyarrow
+
+Rows are streamed in chunks, so memory use does not grow with the export.
+"""
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.timetable_export import DEFAULT_CHUNK_SIZE, FORMATS, ExportError, export
+
+
+class Command(BaseCommand):
+    help = "Stream TimetableEntry rows to CSV, JSON Lines or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(FORMATS), default="csv")
+        parser.add_argument("--output", help="File to write (default: stdout)")
+        parser.add_argument("--upload", type=int, help="Only entries of this TimetableUpload")
+        parser.add_argument("--timetable-pdf", type=int, help="Only entries of this department TimetablePDF")
+        parser.add_argument("--department", type=int, help="Department id")
+        parser.add_argument("--semester", type=int, help="Semester id")
+        parser.add_argument("--from", dest="date_from", help="Source uploaded on or after YYYY-MM-DD")
+        parser.add_argument("--to", dest="date_to", help="Source uploaded on or before YYYY-MM-DD")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        params = {
+            "upload": options["upload"],
+            "timetable_pdf": options["timetable_pdf"],
+            "department": options["department"],
+            "semester": options["semester"],
+            "from": options["date_from"],
+            "to": options["date_to"],
+        }
+        try:
+            chunks = export(params, options["format"], chunk_size=options["chunk_size"])
+            if options["output"]:
+                written = 0
+                with open(options["output"], "wb") as fh:
+                    for chunk in chunks:
+                        fh.write(chunk)
+                        written += len(chunk)
+                self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+            else:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+        except ExportError as exc:
+            raise CommandError(str(exc))
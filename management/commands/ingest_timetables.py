@@ -0,0 +1,70 @@
+"""
+Ingest a directory or archive of timetable PDFs, as if each had been uploaded by an admin.
+
+    python manage.py ingest_timetables /srv/term-2026/                 # every new PDF, CPU-count workers
+    python manage.py ingest_timetables term.zip --workers 8 --checkpoint term.ckpt.json
+    python manage.py ingest_timetables term.tar.gz --dry-run           # only list what is new
+
+Run again with the same --checkpoint after an interruption to resume. Uploads
+stored without a hash are hashed first, so their files are skipped as well.
+"""
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from app.batch_ingest import BatchError, ingest
+
+
+class Command(BaseCommand):
+    help = "Parse every not-yet-ingested timetable PDF in a directory or archive, in parallel"
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Directory, .zip or .tar(.gz) of PDFs")
+        parser.add_argument("--uploader", help="Username the uploads are recorded under (default: first superuser)")
+        parser.add_argument("--workers", type=int, default=None, help="Parsing processes (default: CPU count)")
+        parser.add_argument("--checkpoint", help="JSON file recording progress; reuse it to resume")
+        parser.add_argument("--dry-run", action="store_true", help="Fingerprint and list new files, ingest nothing")
+        parser.add_argument("--report", help="Write the run's totals to this JSON file")
+
+    def handle(self, *args, **options):
+        if options["uploader"]:
+            uploader = User.objects.filter(username=options["uploader"]).first()
+            if uploader is None:
+                raise CommandError(f"No user named {options['uploader']}")
+        else:
+            uploader = User.objects.filter(is_superuser=True).order_by("pk").first()
+            if uploader is None:
+                raise CommandError("No superuser to record the uploads under; pass --uploader")
+
+        def progress(event):
+            handled = event["ingested"] + event["skipped"] + event["failed"] + event["new"]
+            line = f"[{handled}/{event['seen']} scanned] {event['status']:<8} {event['file']}"
+            if event["status"] == "ingested":
+                line += f" (+{event['inserted']} ~{event['updated']} -{event['deleted']})"
+            elif event["status"] == "failed":
+                line += f": {event['error']}"
+            if event["files_per_s"] is not None and event["status"] in ("ingested", "failed"):
+                line += f"  {event['files_per_s']} files/s, {event['entries_per_s']} entries/s"
+            (self.stderr if event["status"] == "failed" else self.stdout).write(line)
+
+        try:
+            totals = ingest(
+                options["source"], uploader, workers=options["workers"],
+                checkpoint_path=options["checkpoint"], dry_run=options["dry_run"], progress=progress,
+            )
+        except (BatchError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        if options["report"]:
+            with open(options["report"], "w") as fh:
+                json.dump(totals, fh, indent=2)
+
+        if options["dry_run"]:
+            summary = f"{totals['new']} new, {totals['skipped']} already ingested"
+        else:
+            summary = (f"Ingested {totals['ingested']} files ({totals['entries']} entries), "
+                       f"skipped {totals['skipped']}, {totals['failed']} failed")
+        if totals["backfilled"]:
+            summary += f"; hashed {totals['backfilled']} earlier uploads"
+        self.stdout.write(self.style.SUCCESS(f"{summary} in {totals['elapsed_s']:.2f}s"))
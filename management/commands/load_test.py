@@ -0,0 +1,112 @@
+"""
+Load-test one node end to end with a stubbed LLM.
+
+    python manage.py load_test --teachers 200 --concurrency 40 --duration 60 --report run.json
+    python manage.py load_test --mix dashboard=5,chatbot=3,upload=1 --upload-pdf sample.pdf
+    python manage.py load_test --llm-latency 1200 --llm-distribution uniform --compare run.json
+
+Seeds teachers under the "loadtest-" username prefix and removes them again
+afterwards (unless --keep). Run it against a scratch database. Rate limits
+and token quotas are off for the run (every session shares one IP) unless
+--rate-limits is given.
+"""
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.load_test import DEFAULT_MIX, compare_reports, load_test
+
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        try:
+            mix[name.strip()] = int(weight or 1)
+        except ValueError:
+            raise CommandError(f"Bad --mix entry {part!r}, expected name=weight")
+    return mix
+
+
+class Command(BaseCommand):
+    help = "Drive concurrent teacher sessions through the URLconf and report latency percentiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--teachers", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--duration", type=float, default=30, help="Seconds of load after all sessions logged in")
+        parser.add_argument("--mix", type=_parse_mix, default=None,
+                            help="Endpoint weights, e.g. dashboard=5,notifications=2,chatbot=3,schedule_grid=1,upload=1")
+        parser.add_argument("--upload-pdf", help="Timetable PDF posted by the 'upload' endpoint")
+        parser.add_argument("--llm-latency", type=float, default=800, help="Median stub LLM latency (ms)")
+        parser.add_argument("--llm-distribution", choices=["lognormal", "uniform", "fixed"], default="lognormal")
+        parser.add_argument("--llm-sigma", type=float, default=0.35, help="Spread of the lognormal distribution")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--keep", action="store_true", help="Leave the seeded teachers in the database")
+        parser.add_argument("--rate-limits", action="store_true",
+                            help="Keep the configured rate limits and token quotas (all sessions share 127.0.0.1)")
+        parser.add_argument("--report", help="Write the JSON report to this file")
+        parser.add_argument("--compare", help="Earlier JSON report to compare against")
+
+    def handle(self, *args, **options):
+        mix = options["mix"] or DEFAULT_MIX
+        if "upload" in mix and not options["upload_pdf"]:
+            raise CommandError("The 'upload' endpoint needs --upload-pdf")
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as fh:
+                    baseline = json.load(fh)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        self.stdout.write(
+            f"{options['teachers']} teachers, {options['concurrency']} sessions, {options['duration']:g}s, "
+            f"stub LLM {options['llm_distribution']} median {options['llm_latency']:g} ms"
+        )
+        report = load_test(
+            teachers=options["teachers"],
+            concurrency=options["concurrency"],
+            duration=options["duration"],
+            mix=mix,
+            upload_pdf=options["upload_pdf"],
+            llm_median_ms=options["llm_latency"],
+            llm_distribution=options["llm_distribution"],
+            llm_sigma=options["llm_sigma"],
+            seed=options["seed"],
+            keep=options["keep"],
+            rate_limits=options["rate_limits"],
+        )
+
+        self.stdout.write(f"\n{'endpoint':<15}{'reqs':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        rows = list(report["endpoints"].items()) + [("TOTAL", report["total"])]
+        for name, stats in rows:
+            self.stdout.write(
+                f"{name:<15}{stats['requests']:>7}{stats['errors']:>8}{stats['throughput_rps'] or 0:>9.1f}"
+                f"{stats['p50_ms'] or 0:>10.1f}{stats['p95_ms'] or 0:>10.1f}{stats['p99_ms'] or 0:>10.1f}"
+            )
+        self.stdout.write(
+            f"\nLLM stub calls {report['meta']['llm_stub']['calls']}, "
+            f"coalesced {report['llm'].get('coalesced', 0)}, query-cache hits {report['query_cache'].get('hits', 0)}"
+        )
+        if report["answered_by"]:
+            self.stdout.write("Assistant answers: " + ", ".join(
+                f"{name} {count}" for name, count in report["answered_by"].items()
+            ))
+        limited = sum(report["answered_by"].get(name, 0) for name in ("rate_limited", "over_quota"))
+        if limited:
+            self.stdout.write(self.style.WARNING(f"{limited} assistant queries were answered locally because of limits"))
+        if report["total"]["errors"]:
+            self.stdout.write(self.style.WARNING(f"{report['total']['errors']} requests failed (status >= 400)"))
+
+        if baseline is not None:
+            self.stdout.write(f"\nCompared with {options['compare']}:")
+            for name, metric, old, new, change in compare_reports(baseline, report):
+                delta = f"{change:+.1f}%" if change is not None else "n/a"
+                self.stdout.write(f"  {name:<15}{metric:<16}{old if old is not None else '-':>10} -> "
+                                  f"{new if new is not None else '-':<10} {delta}")
+
+        if options["report"]:
+            with open(options["report"], "w") as fh:
+                json.dump(report, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['report']}"))
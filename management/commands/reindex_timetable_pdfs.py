@@ -0,0 +1,42 @@
+"""
+Build or rebuild the full-text index for department timetable PDFs.
+
+    python manage.py reindex_timetable_pdfs            # index PDFs not indexed yet
+    python manage.py reindex_timetable_pdfs --all      # re-extract every PDF
+    python manage.py reindex_timetable_pdfs --rebuild  # refill FTS from stored page text
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from app import pdf_search
+from app.models import TimetablePDF
+
+
+class Command(BaseCommand):
+    help = "Index department timetable PDFs for full-text search"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Re-extract every PDF, not just unindexed ones")
+        parser.add_argument("--rebuild", action="store_true", help="Only rebuild the FTS table from stored page text")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options["rebuild"]:
+            count = pdf_search.rebuild_index()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt index with {count} pages in {time.perf_counter() - start:.2f}s"))
+            return
+
+        pdfs = TimetablePDF.objects.all()
+        if not options["all"]:
+            pdfs = pdfs.filter(pages__isnull=True)
+
+        total_pages = 0
+        for pdf in pdfs.distinct():
+            try:
+                total_pages += pdf_search.index_pdf(pdf)
+            except Exception as exc:
+                self.stderr.write(f"Failed to index {pdf}: {exc}")
+                continue
+            self.stdout.write(f"Indexed {pdf}")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total_pages} pages in {time.perf_counter() - start:.2f}s"))
@@ -0,0 +1,21 @@
+"""
+Compact the assistant query log into hourly / daily rollups and apply retention.
+Meant to run from cron shortly after every hour:
+
+    5 * * * *  python manage.py rollup_query_log
+"""
+from django.core.management.base import BaseCommand
+
+from app.query_log import run_rollups
+
+
+class Command(BaseCommand):
+    help = "Roll up QueryLog into QueryRollup / HotQuery and purge old rows"
+
+    def handle(self, *args, **options):
+        result = run_rollups()
+        purged = ", ".join(f"{name} {count}" for name, count in result["purged"].items())
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['hourly']} hourly and {result['daily']} daily rollup rows, "
+            f"{result['hot_queries']} hot queries written; purged: {purged}"
+        ))
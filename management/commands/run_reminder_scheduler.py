@@ -0,0 +1,51 @@
+"""
+Run the upcoming-class reminder scheduler.
+
+    python manage.py run_reminder_scheduler
+    python manage.py run_reminder_scheduler --lead 15 --wake 20
+
+The process sleeps until the next reminder is due, waking every --wake
+seconds at most. A wake only reads the reload queue when a shared cache
+says something changed, or every REMINDER_RELOAD_POLL_SECONDS without one.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.cache_utils import cache_is_shared
+from app.class_reminders import CacheInboxSink, ReloadWatch, ReminderScheduler, take_dirty
+
+
+class Command(BaseCommand):
+    help = "Push 'class in N minutes' reminders to the configured sinks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lead", type=int, default=None, help="Minutes before class start (default: REMINDER_LEAD_MINUTES)")
+        parser.add_argument("--wake", type=float, default=30.0, help="Max seconds between wake-ups (checks of the shared cache for changes)")
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler(lead=options["lead"])
+        if any(isinstance(sink, CacheInboxSink) for sink in scheduler.sinks) and not cache_is_shared():
+            raise CommandError(
+                "CacheInboxSink writes to CACHES, which is per-process here, so the web workers would never "
+                "see its reminders. Configure a shared cache (e.g. RedisCache) or remove it from REMINDER_SINKS."
+            )
+        watch = ReloadWatch()
+        take_dirty()  # a full load supersedes anything queued before start
+        scheduler.rebuild()
+        self.stdout.write(f"Loaded {len(scheduler)} upcoming class events")
+
+        try:
+            while True:
+                dirty = scheduler.apply_dirty() if watch.due() else None
+                if dirty:
+                    self.stdout.write(f"Reloaded {'all teachers' if '*' in dirty else f'{len(dirty)} teachers'}")
+                now = timezone.now()
+                sent = scheduler.fire_due(now)
+                if sent:
+                    self.stdout.write(f"{now:%H:%M:%S} sent {sent} reminders")
+                wait = scheduler.seconds_until_next()
+                time.sleep(options["wake"] if wait is None else min(max(wait, 0.5), options["wake"]))
+        except KeyboardInterrupt:
+            self.stdout.write("Scheduler stopped")
@@ -0,0 +1,254 @@
+"""
+Department master grid: every teacher against every day and period.
+
+Each ingest of a department TimetablePDF packs its parsed rows into one
+MasterGrid row: the teacher, period and subject axes as JSON lists and the
+dense teacher x day x period matrix as zlib-compressed uint16 subject codes
+(0 = free). 200 teachers x 6 days x 8 periods is 19 KB before compression.
+
+grid_page() merges the grids of the selected department / semester,
+filters teachers by name or subject on the packed codes and builds cells
+only for the requested page. TimetableEntry is never queried; only
+build_master_grids backfills grids from it for PDFs ingested earlier.
+"""
+import math
+import sys
+import zlib
+from array import array
+
+from .models import MasterGrid, TimetableEntry
+from .timetable_parser import DAY_MAP, to_time
+
+DAYS = list(DAY_MAP.values())
+DAY_INDEX = {day: index for index, day in enumerate(DAYS)}
+UNKNOWN_TEACHER = "Unknown"   # parse_table's name for cells without a teacher line
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class GridError(ValueError):
+    pass
+
+
+def _minutes(value):
+    parsed = to_time(value)
+    return parsed.hour * 60 + parsed.minute if parsed else 24 * 60
+
+
+def _pack(codes):
+    values = array("H", codes)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return zlib.compress(values.tobytes())
+
+
+def _unpack(data):
+    values = array("H")
+    values.frombytes(zlib.decompress(bytes(data)))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+# ========================================
+# Packing (at ingest)
+# ========================================
+
+def build_grid(rows):
+    """
+    (teachers, periods, subjects, codes, clashes) of parsed timetable rows.
+    A row fills every period that starts before its end time, so a lab
+    running into the next period occupies both cells.
+    """
+    rows = [
+        row for row in rows
+        if row.get("day") in DAY_INDEX and row.get("start_time")
+        and row.get("teacher_name") not in (None, "", UNKNOWN_TEACHER)
+    ]
+    # A period ends at the earliest end seen for its start; longer rows are labs
+    ends = {}
+    for row in rows:
+        end = row.get("end_time") or ""
+        current = ends.get(row["start_time"])
+        if current is None or (end and (not current or _minutes(end) < _minutes(current))):
+            ends[row["start_time"]] = end
+    periods = sorted(([start, end] for start, end in ends.items()), key=lambda period: _minutes(period[0]))
+    for period, following in zip(periods, periods[1:]):
+        if not period[1] or _minutes(following[0]) < _minutes(period[1]):
+            period[1] = following[0]  # only labs started here: the period ends where the next begins
+    starts = [_minutes(start) for start, _ in periods]
+    teachers = sorted({row["teacher_name"] for row in rows})
+    teacher_index = {name: index for index, name in enumerate(teachers)}
+
+    subjects, subject_codes = [], {}
+    width = len(DAYS) * len(periods)
+    codes = [0] * (len(teachers) * width)
+    clashes = 0
+    for row in rows:
+        subject = row.get("subject") or ""
+        code = subject_codes.get(subject)
+        if code is None:
+            subjects.append(subject)
+            code = subject_codes[subject] = len(subjects)
+        start = _minutes(row["start_time"])
+        end = _minutes(row["end_time"]) if row.get("end_time") else start + 1
+        offset = teacher_index[row["teacher_name"]] * width + DAY_INDEX[row["day"]] * len(periods)
+        for column, period_start in enumerate(starts):
+            if start <= period_start < end:
+                cell = offset + column
+                if not codes[cell]:
+                    codes[cell] = code
+                elif codes[cell] != code:
+                    clashes += 1
+    return teachers, periods, subjects, codes, clashes
+
+
+def save_grid(timetable_pdf, rows):
+    """Store the packed grid of a TimetablePDF's parsed rows (replacing the previous one)"""
+    teachers, periods, subjects, codes, clashes = build_grid(rows)
+    semester = timetable_pdf.semester
+    grid, _ = MasterGrid.objects.update_or_create(
+        timetable_pdf=timetable_pdf,
+        defaults={
+            "department_id": semester.department_id,
+            "semester": semester,
+            "teachers": teachers,
+            "periods": periods,
+            "subjects": subjects,
+            "cells": _pack(codes),
+            "clashes": clashes,
+        },
+    )
+    return grid
+
+
+def rebuild_grid(timetable_pdf):
+    """Grid of a PDF ingested before grids existed, from its stored entries"""
+    rows = TimetableEntry.objects.filter(timetable_pdf=timetable_pdf).values(
+        "teacher_name", "day", "start_time", "end_time", "subject"
+    )
+    return save_grid(timetable_pdf, list(rows))
+
+
+def iter_cells(grid):
+    """(teacher, day index, [start, end], subject) of every occupied cell of a MasterGrid"""
+    codes = _unpack(grid.cells)
+    count = len(grid.periods)
+    width = len(DAYS) * count
+    for offset, code in enumerate(codes):
+        if code:
+            teacher, rest = divmod(offset, width)
+            day, period = divmod(rest, count)
+            yield grid.teachers[teacher], day, grid.periods[period], grid.subjects[code - 1]
+
+
+# ========================================
+# Merged, paginated view
+# ========================================
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise GridError(f"{name} must be an integer")
+
+
+class _Decoded:
+    """One MasterGrid with its codes unpacked and its periods mapped onto the merged columns"""
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.codes = _unpack(grid.cells)
+        self.width = len(DAYS) * len(grid.periods)
+        self.rows = {name: index * self.width for index, name in enumerate(grid.teachers)}
+        self.columns = None
+
+    def row(self, teacher):
+        offset = self.rows[teacher]
+        return self.codes[offset:offset + self.width]
+
+
+def grid_page(params):
+    """
+    One page of the master grid of every teacher in the selected grids.
+    params: department, semester (ids), subject, teacher (case-insensitive
+    substrings), page, page_size.
+    """
+    department, semester = _int_param(params, "department"), _int_param(params, "semester")
+    page = _int_param(params, "page") or 1
+    page_size = min(_int_param(params, "page_size") or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    if page < 1 or page_size < 1:
+        raise GridError("page and page_size must be positive")
+    subject = (params.get("subject") or "").strip().lower()
+    teacher = (params.get("teacher") or "").strip().lower()
+
+    grids = MasterGrid.objects.select_related("semester").order_by("semester__number", "timetable_pdf_id")
+    if department is not None:
+        grids = grids.filter(department_id=department)
+    if semester is not None:
+        grids = grids.filter(semester_id=semester)
+    decoded = [_Decoded(grid) for grid in grids]
+
+    periods = sorted(
+        {tuple(period) for item in decoded for period in item.grid.periods},
+        key=lambda period: (_minutes(period[0]), _minutes(period[1]), period),
+    )
+    column = {period: index for index, period in enumerate(periods)}
+    for item in decoded:
+        item.columns = [column[tuple(period)] for period in item.grid.periods]
+
+    # Filter on the packed codes; cells are only built for the page below
+    names, matched = set(), set()
+    for item in decoded:
+        wanted = {code for code, name in enumerate(item.grid.subjects, 1) if subject in name.lower()} if subject else None
+        for name in item.rows:
+            if teacher and teacher not in name.lower():
+                continue
+            names.add(name)
+            if wanted and wanted.intersection(item.row(name)):
+                matched.add(name)
+    names = sorted(matched if subject else names, key=str.lower)
+
+    start = (page - 1) * page_size
+    teachers = []
+    for name in names[start:start + page_size]:
+        slots = [[[] for _ in periods] for _ in DAYS]
+        busy = 0
+        for item in decoded:
+            if name not in item.rows:
+                continue
+            codes, count = item.row(name), len(item.columns)
+            for day in range(len(DAYS)):
+                for position, merged in enumerate(item.columns):
+                    code = codes[day * count + position]
+                    if not code:
+                        continue
+                    cell = {"subject": item.grid.subjects[code - 1], "semester": item.grid.semester.number}
+                    if subject:
+                        cell["match"] = subject in cell["subject"].lower()
+                    slots[day][merged].append(cell)
+                    busy += 1
+        teachers.append({
+            "name": name,
+            "busy": busy,
+            "slots": [[cells or None for cells in day] for day in slots],
+        })
+
+    return {
+        "days": DAYS,
+        "periods": [{"start": start_time, "end": end_time} for start_time, end_time in periods],
+        "semesters": [
+            {"id": item.grid.semester_id, "number": item.grid.semester.number, "timetable_pdf_id": item.grid.timetable_pdf_id}
+            for item in decoded
+        ],
+        "subjects": sorted({name for item in decoded for name in item.grid.subjects if name}),
+        "clashes": sum(item.grid.clashes for item in decoded),
+        "page": page,
+        "page_size": page_size,
+        "pages": math.ceil(len(names) / page_size),
+        "total_teachers": len(names),
+        "teachers": teachers,
+    }
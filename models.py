@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User  # ✅ Default User model
 from django.utils import timezone
@@ -12,6 +14,7 @@ class TeacherProfile(models.Model):
     is_active = models.BooleanField(default=True)
     last_active = models.DateTimeField(null=True, blank=True)
     total_queries = models.IntegerField(default=0)
+    calendar_token = models.CharField(max_length=64, unique=True, null=True, blank=True)  # secret for the .ics feed URL
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -30,6 +33,8 @@ class TimetableUpload(models.Model):
     """
     uploader = models.ForeignKey(User, on_delete=models.CASCADE)  # ✅ Ab default User
     uploaded_file = models.FileField(upload_to='timetables/')
+    # SHA-256 of the PDF when known; batch ingestion skips files already uploaded
+    file_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -41,18 +46,68 @@ class TimetableEntry(models.Model):
     Structured, parsed rows extracted from the timetable PDF.
     Each entry corresponds to one teacher's slot (teacher can appear many times).
     """
-    upload = models.ForeignKey(TimetableUpload, on_delete=models.CASCADE, related_name='entries')
+    upload = models.ForeignKey(TimetableUpload, on_delete=models.CASCADE, related_name='entries', null=True, blank=True)
+    # Set when the row was ingested from a department TimetablePDF instead of a personal upload
+    timetable_pdf = models.ForeignKey('TimetablePDF', on_delete=models.CASCADE, related_name='entries', null=True, blank=True)
+    department = models.ForeignKey('Department', on_delete=models.SET_NULL, related_name='timetable_entries', null=True, blank=True)
+    semester = models.ForeignKey('Semester', on_delete=models.SET_NULL, related_name='timetable_entries', null=True, blank=True)
     teacher_name = models.CharField(max_length=200)  # name exactly as appears in timetable
+    # Teacher account resolved from teacher_name at ingest (indexed lookups for the batch API)
+    teacher = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='timetable_entries', null=True, blank=True)
     day = models.CharField(max_length=20)            # e.g., "Monday"
     start_time = models.CharField(max_length=20,blank=True, null=True)     # keep as text like "09:00 AM"
     end_time = models.CharField(max_length=20, blank=True, null=True)
     subject = models.CharField(max_length=200, blank=True, null=True)
     room = models.CharField(max_length=50, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['semester', 'day']),
+            models.Index(fields=['teacher', 'day', 'start_time']),
+        ]
+
     def __str__(self):
         return f"{self.teacher_name} - {self.day} {self.start_time} {self.subject or ''}"
 
 
+class TimetableChangeLog(models.Model):
+    """
+    What one ingest changed: counts plus the changed rows (capped), for either a
+    personal upload or a department PDF.
+    """
+    upload = models.ForeignKey(TimetableUpload, on_delete=models.CASCADE, related_name='change_logs', null=True, blank=True)
+    timetable_pdf = models.ForeignKey('TimetablePDF', on_delete=models.CASCADE, related_name='change_logs', null=True, blank=True)
+    inserted = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    unchanged = models.PositiveIntegerField(default=0)
+    changes = models.JSONField(default=list, blank=True)
+    pages = models.PositiveIntegerField(default=0)
+    # Growth of the worker's resident memory while parsing the PDF
+    peak_memory_kb = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"+{self.inserted} ~{self.updated} -{self.deleted} at {self.created_at}"
+
+
+class ReminderReload(models.Model):
+    """
+    A teacher whose class reminders the scheduler must reload after their
+    entries changed (teacher_id 0: everyone). One row per teacher: marking
+    again only moves marked_at. Written in the ingest transaction, deleted
+    once the scheduler has read it, pruned after REMINDER_RELOAD_RETENTION_HOURS.
+    """
+    teacher_id = models.PositiveIntegerField(unique=True)
+    marked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Reload reminders of {self.teacher_id or 'everyone'}"
+
+
 # ========================================
 # NEW MODULE: Department Timetable PDFs
 # ========================================
@@ -62,6 +117,8 @@ class Department(models.Model):
     Represents academic departments (e.g., Computer Science, Electronics)
     """
     name = models.CharField(max_length=200, unique=True)
+    # Grid of the department's timetable PDFs, learned on first ingest (see layout_template.py)
+    layout_template = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -96,6 +153,10 @@ class TimetablePDF(models.Model):
     semester = models.ForeignKey(Semester, on_delete=models.CASCADE, related_name='timetable_pdfs')
     title = models.CharField(max_length=300, help_text="Title/description of the timetable")
     pdf_file = models.FileField(upload_to='department_timetables/')
+    file_hash = models.CharField(max_length=64, blank=True, default='', help_text="SHA-256 of the PDF, used for ETags")
+    preview_image = models.FileField(upload_to='department_timetables/previews/', blank=True, null=True)
+    # Set when the preview could not be rendered, so it isn't retried on every request
+    preview_failed = models.BooleanField(default=False)
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -105,3 +166,192 @@ class TimetablePDF(models.Model):
 
     def __str__(self):
         return f"{self.title} - {self.semester}"
+
+
+class TimetablePDFPage(models.Model):
+    """
+    Text + table cells extracted once per page of a TimetablePDF (feeds full-text search)
+    """
+    pdf = models.ForeignKey(TimetablePDF, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()
+    content = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['pdf', 'page_number']
+        unique_together = ['pdf', 'page_number']
+
+    def __str__(self):
+        return f"{self.pdf.title} - page {self.page_number}"
+
+
+class MasterGrid(models.Model):
+    """
+    Teacher x day x period matrix of one TimetablePDF, packed at ingest (see
+    master_grid.py) so the department master grid never reads TimetableEntry
+    """
+    timetable_pdf = models.OneToOneField(TimetablePDF, on_delete=models.CASCADE, related_name='master_grid')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='master_grids')
+    semester = models.ForeignKey(Semester, on_delete=models.CASCADE, related_name='master_grids')
+    teachers = models.JSONField(default=list)   # row axis: teacher names, sorted
+    periods = models.JSONField(default=list)    # column axis: [start, end] pairs in time order
+    subjects = models.JSONField(default=list)   # cell code n refers to subjects[n - 1]; 0 is free
+    cells = models.BinaryField()                # zlib-compressed little-endian uint16 codes
+    clashes = models.PositiveIntegerField(default=0)  # cells claimed by more than one subject
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['department', 'semester']
+
+    def __str__(self):
+        return f"Grid of {self.timetable_pdf}: {len(self.teachers)} teachers x {len(self.periods)} periods"
+
+
+class TeacherWorkload(models.Model):
+    """
+    Weekly workload of one teacher within one department, recomputed from the
+    department's MasterGrids whenever one of them changes (see workload.py)
+    """
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='workloads')
+    teacher_name = models.CharField(max_length=200)
+    periods = models.PositiveIntegerField(default=0)            # occupied grid cells per week
+    teaching_days = models.PositiveSmallIntegerField(default=0)
+    weekly_minutes = models.PositiveIntegerField(default=0)      # union of all class intervals
+    lab_minutes = models.PositiveIntegerField(default=0)
+    busiest_day_minutes = models.PositiveIntegerField(default=0)
+    longest_block_minutes = models.PositiveIntegerField(default=0)  # back-to-back classes, short breaks included
+    free_gaps = models.PositiveIntegerField(default=0)          # breaks between classes on the same day
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['department', 'teacher_name']
+        unique_together = ['department', 'teacher_name']
+
+    def __str__(self):
+        return f"{self.teacher_name} ({self.department.name}): {self.weekly_minutes / 60:.1f} h/week"
+
+
+class ChunkedUpload(models.Model):
+    """
+    A resumable timetable PDF upload: the file arrives in chunks and is only
+    turned into a TimetableUpload / TimetablePDF once complete (see chunked_upload.py)
+    """
+    KIND_CHOICES = [
+        ('personal', 'Teacher timetable'),
+        ('admin', 'Admin timetable upload'),
+        ('department', 'Department timetable PDF'),
+    ]
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chunked_uploads')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)  # bytes received so far
+    expected_sha256 = models.CharField(max_length=64, blank=True, default='')
+    file_hash = models.CharField(max_length=64, blank=True, default='')
+    semester = models.ForeignKey('Semester', on_delete=models.SET_NULL, null=True, blank=True)
+    title = models.CharField(max_length=300, blank=True, default='')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    result = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.total_size} bytes, {self.status})"
+
+
+# ========================================
+# Assistant query analytics
+# ========================================
+
+ANSWERED_BY_CHOICES = [
+    ('llm', 'LLM'),
+    ('query_cache', 'Cached answer'),
+    ('local', 'Answered locally'),
+    ('no_data', 'No timetable'),
+    ('rate_limited', 'Rate limited'),
+    ('over_quota', 'Over daily LLM quota'),
+    ('error', 'Error'),
+]
+
+
+class QueryLog(models.Model):
+    """
+    Append-only log of assistant queries, written in batches off the request
+    path (see query_log.py) and compacted into QueryRollup / HotQuery.
+    """
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='query_logs')
+    view = models.CharField(max_length=30)              # "chatbot", "notifications"
+    answered_by = models.CharField(max_length=20, choices=ANSWERED_BY_CHOICES)
+    query = models.CharField(max_length=255, blank=True)  # normalised: lower case, single spaces
+    latency_ms = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.view}/{self.answered_by} at {self.created_at}"
+
+
+class QueryRollup(models.Model):
+    """
+    Query counts per hour or day, view and answering path. The admin charts
+    read only these rows, never the raw QueryLog.
+    """
+    GRANULARITY_CHOICES = [('hour', 'Hourly'), ('day', 'Daily')]
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    view = models.CharField(max_length=30)
+    answered_by = models.CharField(max_length=20, choices=ANSWERED_BY_CHOICES)
+    queries = models.PositiveIntegerField(default=0)
+    teachers = models.PositiveIntegerField(default=0)   # distinct users in the bucket
+    latency_total_ms = models.PositiveBigIntegerField(default=0)
+    latency_max_ms = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['granularity', 'bucket_start']
+        unique_together = ['granularity', 'bucket_start', 'view', 'answered_by']
+
+    def __str__(self):
+        return f"{self.granularity} {self.bucket_start}: {self.view}/{self.answered_by} x{self.queries}"
+
+
+class HotQuery(models.Model):
+    """Most frequent normalised queries of one day"""
+    day = models.DateField()
+    query = models.CharField(max_length=255)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day', '-count']
+        unique_together = ['day', 'query']
+
+    def __str__(self):
+        return f"{self.day}: {self.query} x{self.count}"
+
+
+class LLMUsage(models.Model):
+    """
+    LLM tokens one teacher used on one day (from the completions' usage data),
+    plus how many queries were answered locally because of limits
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='llm_usage')
+    day = models.DateField()
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    total_tokens = models.PositiveIntegerField(default=0)
+    requests = models.PositiveIntegerField(default=0)
+    rate_limited = models.PositiveIntegerField(default=0)
+    over_quota = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-day', '-total_tokens']
+        unique_together = ['user', 'day']
+
+    def __str__(self):
+        return f"{self.user.username} {self.day}: {self.total_tokens} tokens"
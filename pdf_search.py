@@ -0,0 +1,201 @@
+"""
+Full-text search over department timetable PDFs.
+
+Each PDF is read once at upload: page text and table cells are stored in
+TimetablePDFPage and mirrored into an SQLite FTS5 table for ranked search.
+On other databases (or SQLite builds without FTS5) search falls back to
+icontains over the stored page text.
+"""
+import heapq
+import logging
+import re
+import time
+
+from django.db import connection, transaction
+from django.db.utils import OperationalError
+
+from .models import TimetablePDF, TimetablePDFPage
+
+FTS_TABLE = "app_timetablepdf_fts"
+SNIPPET_TOKENS = 12
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+_fts_available = None
+
+
+def _fts_enabled():
+    """True if the default DB is SQLite with FTS5; creates the index table on first use"""
+    global _fts_available
+    if _fts_available is None:
+        if connection.vendor != "sqlite":
+            _fts_available = False
+        else:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                        "content, pdf_id UNINDEXED, page_number UNINDEXED, "
+                        "tokenize='unicode61 remove_diacritics 2')"
+                    )
+                _fts_available = True
+            except OperationalError:
+                _fts_available = False
+    return _fts_available
+
+
+def extract_pages(pdf_path):
+    """Yield (page_number, text) with page text plus one line per table row"""
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as doc:
+        for page in doc.pages:
+            parts = [page.extract_text() or ""]
+            for table in page.extract_tables():
+                for row in table:
+                    cells = [c.replace("\n", " ").strip() for c in row if c and c.strip()]
+                    if cells:
+                        parts.append(" | ".join(cells))
+            yield page.page_number, "\n".join(parts)
+            page.close()
+
+
+def _write_fts_rows(cursor, pdf_id, pages):
+    cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE pdf_id = %s", [pdf_id])
+    cursor.executemany(
+        f"INSERT INTO {FTS_TABLE} (content, pdf_id, page_number) VALUES (%s, %s, %s)",
+        [(text, pdf_id, number) for number, text in pages],
+    )
+
+
+def index_pdf(pdf):
+    """(Re)index one TimetablePDF. Safe to call again after the file changes."""
+    pages = list(extract_pages(pdf.pdf_file.path))
+    with transaction.atomic():
+        TimetablePDFPage.objects.filter(pdf=pdf).delete()
+        TimetablePDFPage.objects.bulk_create([
+            TimetablePDFPage(pdf=pdf, page_number=number, content=text)
+            for number, text in pages
+        ])
+        if _fts_enabled():
+            with connection.cursor() as cursor:
+                _write_fts_rows(cursor, pdf.pk, pages)
+    return len(pages)
+
+
+def index_uploaded_pdf(pdf):
+    """index_pdf() for upload paths: failures are logged, never raised, so the upload is still saved"""
+    try:
+        return index_pdf(pdf)
+    except Exception:
+        logger.exception("Could not index timetable PDF %s for search", pdf.pk)
+        return None
+
+
+def remove_pdf(pdf_id):
+    """Drop a deleted PDF from the FTS index (page rows go with the FK cascade)"""
+    if _fts_enabled():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE pdf_id = %s", [pdf_id])
+
+
+def rebuild_index():
+    """Repopulate the FTS table from stored page text without reopening any PDF"""
+    if not _fts_enabled():
+        return 0
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        rows = TimetablePDFPage.objects.values_list("content", "pdf_id", "page_number")
+        batch = []
+        for row in rows.iterator(chunk_size=1000):
+            batch.append(row)
+            if len(batch) >= 1000:
+                cursor.executemany(f"INSERT INTO {FTS_TABLE} (content, pdf_id, page_number) VALUES (%s, %s, %s)", batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(f"INSERT INTO {FTS_TABLE} (content, pdf_id, page_number) VALUES (%s, %s, %s)", batch)
+            count += len(batch)
+    return count
+
+
+def _fts_query(tokens):
+    # Quote every token so user input can't inject FTS syntax; prefix-match each one
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _python_snippet(text, tokens):
+    flat = " ".join(text.split())
+    lower = flat.lower()
+    pos = min((lower.find(t) for t in tokens if lower.find(t) >= 0), default=0)
+    start = max(pos - 60, 0)
+    snippet = flat[start:start + 160]
+    return ("… " if start else "") + snippet + (" …" if start + 160 < len(flat) else "")
+
+
+def _search_fts(tokens, limit):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT pdf_id, page_number, "
+            f"snippet({FTS_TABLE}, 0, '[', ']', ' … ', {SNIPPET_TOKENS}), bm25({FTS_TABLE}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY score LIMIT %s",
+            [_fts_query(tokens), limit],
+        )
+        return [(pdf_id, page, snippet, -score) for pdf_id, page, snippet, score in cursor.fetchall()]
+
+
+def _search_fallback(tokens, limit):
+    pages = TimetablePDFPage.objects.all()
+    for token in tokens:
+        pages = pages.filter(content__icontains=token)
+    # Score every candidate, keep the best `limit`; snippets only for those
+    scored = (
+        (sum(page.content.lower().count(t) for t in tokens), -page.pk, page)
+        for page in pages.only("pdf_id", "page_number", "content").iterator()
+    )
+    return [
+        (page.pdf_id, page.page_number, _python_snippet(page.content, tokens), float(score))
+        for score, _, page in heapq.nlargest(limit, scored, key=lambda item: item[:2])
+    ]
+
+
+def search(query, limit=20):
+    """
+    Ranked hits for a free-text query:
+    [{"department", "semester", "pdf_id", "title", "page", "snippet", "score"}, ...]
+    """
+    tokens = [t.lower() for t in TOKEN_RE.findall(query or "")]
+    if not tokens:
+        return []
+
+    if _fts_enabled():
+        raw_hits = _search_fts(tokens, limit)
+    else:
+        raw_hits = _search_fallback(tokens, limit)
+
+    pdfs = TimetablePDF.objects.select_related("semester__department").in_bulk({hit[0] for hit in raw_hits})
+    results = []
+    for pdf_id, page_number, snippet, score in raw_hits:
+        pdf = pdfs.get(pdf_id)
+        if pdf is None:
+            continue
+        results.append({
+            "department": pdf.semester.department.name,
+            "department_id": pdf.semester.department_id,
+            "semester": pdf.semester.number,
+            "semester_id": pdf.semester_id,
+            "pdf_id": pdf.pk,
+            "title": pdf.title,
+            "page": page_number,
+            "snippet": snippet,
+            "score": round(score, 4),
+        })
+    return results
+
+
+def timed_search(query, limit=20):
+    start = time.perf_counter()
+    results = search(query, limit)
+    return results, (time.perf_counter() - start) * 1000
@@ -0,0 +1,266 @@
+"""
+Paraphrase-aware cache of assistant answers.
+
+"kal ki classes", "tomorrow ka schedule" and "what do I have tomorrow" are
+the same question. Queries are normalised (Hinglish synonyms, filler words),
+turned into hashed character n-gram TF-IDF vectors and compared by cosine
+similarity with the queries already answered for the same teacher,
+timetable version and date. Everything runs locally; no network.
+
+A query only ever matches entries with the same scope (which day it asks
+about, weekdays and numbers it mentions), so "today" never reuses a
+"tomorrow" answer however similar the text is. Queries about the current
+moment ("next class", "abhi") are never cached.
+
+The cache holds sparse vectors; each worker keeps a dense matrix per bucket
+so that, with numpy, scoring a query against every entry is one
+matrix-vector product over the query's non-zero features. Without numpy a
+sparse dict dot product is used. numpy is imported on the first lookup, not
+at startup.
+"""
+import math
+import re
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache_utils import increment
+from .schedule_cache import timetable_version
+from .timetable_parser import DAY_MAP
+
+DIMENSIONS = 2048
+NGRAM_SIZES = (2, 3, 4)
+MAX_ENTRIES = 200
+MATRIX_MEMO_SIZE = 256
+BUCKET_KEY = "query_cache:{}:{}:{}:{}:{}"
+BUCKET_TIMEOUT = 60 * 60 * 24
+STATS_KEY = "query_cache_stats:{}"
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+NUMBER_RE = re.compile(r"\d+")
+
+# Hinglish / Hindi words mapped to the English word the rest of the query uses
+SYNONYMS = {
+    "aaj": "today", "आज": "today", "kal": "tomorrow", "कल": "tomorrow", "parson": "yesterday",
+    "परसों": "yesterday", "schedule": "classes", "timetable": "classes", "time": "classes",
+    "table": "classes", "lectures": "classes", "lecture": "classes", "class": "classes",
+    "periods": "classes", "period": "classes", "labs": "lab", "kitni": "how many",
+    "kitne": "how many", "kab": "when", "kaha": "where", "kahan": "where", "khali": "free",
+    "free": "free", "slots": "free", "slot": "free",
+}
+FILLER_WORDS = {
+    "a", "an", "the", "is", "are", "am", "do", "does", "i", "me", "my", "mine", "have", "has",
+    "what", "whats", "show", "tell", "give", "please", "pls", "for", "of", "on", "in", "to",
+    "all", "full", "ka", "ki", "ke", "ko", "meri", "mera", "mere", "hai", "hain", "h", "kya",
+    "batao", "bata", "de", "dikhao", "karo", "kar", "s", "about", "list", "can", "you", "get",
+}
+# Answers to these depend on the current time, not just the date
+MOMENT_WORDS = {"next", "now", "current", "currently", "abhi", "remaining", "left", "baki", "baaki", "upcoming", "agla", "agli"}
+DAY_WORDS = {"today", "tomorrow", "yesterday"}
+WEEKDAY_WORDS = {day.lower(): abbr for day, abbr in DAY_MAP.items()}
+
+# Typical assistant queries; gives common words a low IDF so the distinctive ones decide
+_IDF_CORPUS = [
+    "show me today's full timetable", "find my free slots today", "summarize my next upcoming class",
+    "generate a weekly teaching plan for me", "what is my timetable for tomorrow",
+    "tomorrow meri kitni classes hain", "friday ke all labs ki summary de do",
+    "is week free slots kab hain", "kya koi clash hai", "ai class summary for my next lecture",
+    "how many classes do i have today", "what classes do i have on monday", "which room is my lab in",
+    "kal ki classes", "aaj ka schedule", "weekly summary of my classes", "total classes this week",
+]
+
+
+def _threshold():
+    return getattr(settings, "QUERY_CACHE_SIMILARITY", 0.85)
+
+
+PAST_WORDS = {"was", "were", "thi", "थी", "tha"}
+
+
+def _tokens(query):
+    raw = WORD_RE.findall((query or "").lower())
+    # Same reading of "kal" as the assistant views: yesterday with a past-tense word, else tomorrow
+    past = bool(PAST_WORDS.intersection(raw))
+    words = []
+    for word in raw:
+        word = "yesterday" if past and word in ("kal", "कल") else SYNONYMS.get(word, word)
+        words.extend(part for part in word.split() if part not in FILLER_WORDS)
+    return words
+
+
+def query_scope(query):
+    """
+    What a query is about besides its wording: day words, weekdays, numbers.
+    None if its answer depends on the current moment (never cached).
+    """
+    raw_words = set(WORD_RE.findall((query or "").lower()))
+    if raw_words & MOMENT_WORDS:
+        return None
+    tokens = set(_tokens(query))
+    days = sorted(tokens & DAY_WORDS)
+    weekdays = sorted(WEEKDAY_WORDS[t] for t in tokens if t in WEEKDAY_WORDS)
+    numbers = sorted(NUMBER_RE.findall(query or ""))
+    return "|".join([",".join(days), ",".join(weekdays), ",".join(numbers)])
+
+
+def _ngrams(text):
+    for word in text.split():
+        padded = f" {word} "
+        for size in NGRAM_SIZES:
+            for start in range(max(len(padded) - size + 1, 1)):
+                yield padded[start:start + size]
+
+
+def _feature(gram):
+    return zlib.crc32(gram.encode("utf-8")) % DIMENSIONS
+
+
+def _build_idf():
+    documents = len(_IDF_CORPUS)
+    counts = {}
+    for query in _IDF_CORPUS:
+        for index in {_feature(g) for g in _ngrams(" ".join(_tokens(query)))}:
+            counts[index] = counts.get(index, 0) + 1
+    default = math.log((1 + documents) / 1) + 1
+    idf = [default] * DIMENSIONS
+    for index, count in counts.items():
+        idf[index] = math.log((1 + documents) / (1 + count)) + 1
+    return idf
+
+
+_IDF = _build_idf()
+
+
+def vectorize(query):
+    """L2-normalised sparse TF-IDF vector {feature: weight} of a query"""
+    counts = {}
+    for gram in _ngrams(" ".join(_tokens(query))):
+        index = _feature(gram)
+        counts[index] = counts.get(index, 0) + 1
+    weights = {index: (1 + math.log(count)) * _IDF[index] for index, count in counts.items()}
+    norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+    return {index: w / norm for index, w in weights.items()}
+
+
+_numpy_module = None   # numpy once imported, False when it isn't installed
+
+
+def _numpy():
+    """numpy, imported on first use (optional speed-up), or None"""
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy_module = numpy
+    return _numpy_module or None
+
+
+def _matrix(vectors):
+    """Dense (entries x DIMENSIONS) float32 matrix of sparse vectors"""
+    numpy = _numpy()
+    matrix = numpy.zeros((len(vectors), DIMENSIONS), dtype=numpy.float32)
+    for row, vector in enumerate(vectors):
+        matrix[row, list(vector)] = list(vector.values())
+    return matrix
+
+
+def best_match(vector, vectors, matrix=None):
+    """(index, similarity) of the most similar stored vector, or (None, 0.0)"""
+    if not vectors:
+        return None, 0.0
+    numpy = _numpy()
+    if numpy is not None:
+        if matrix is None:
+            matrix = _matrix(vectors)
+        # Only the query's non-zero features contribute to the dot products
+        columns = list(vector)
+        scores = matrix[:, columns] @ numpy.asarray(list(vector.values()), dtype=numpy.float32)
+        best = int(scores.argmax())
+        return best, float(scores[best])
+    best, best_score = None, 0.0
+    for position, stored in enumerate(vectors):
+        score = sum(weight * stored.get(index, 0.0) for index, weight in vector.items())
+        if score > best_score:
+            best, best_score = position, score
+    return best, best_score
+
+
+_matrices = {}     # bucket key -> (bucket revision, dense matrix), rebuilt when the bucket changes
+_matrices_lock = threading.Lock()
+
+
+def _bucket_matrix(key, bucket):
+    if _numpy() is None:
+        return None
+    with _matrices_lock:
+        cached = _matrices.get(key)
+        if cached is None or cached[0] != bucket["revision"]:
+            if len(_matrices) >= MATRIX_MEMO_SIZE:
+                _matrices.clear()
+            cached = _matrices[key] = (bucket["revision"], _matrix(bucket["vectors"]))
+        return cached[1]
+
+
+# ========================================
+# Per-teacher buckets
+# ========================================
+
+def _bucket_key(namespace, user, scope):
+    scope_hash = format(zlib.crc32(scope.encode("utf-8")), "x")
+    return BUCKET_KEY.format(
+        namespace, user.pk, timetable_version(user.username), timezone.localdate().isoformat(), scope_hash
+    )
+
+
+def _count(outcome):
+    increment(STATS_KEY.format(outcome))
+
+
+def query_cache_stats():
+    hits = cache.get(STATS_KEY.format("hit"), 0)
+    misses = cache.get(STATS_KEY.format("miss"), 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 4) if total else None}
+
+
+def lookup(namespace, user, query):
+    """
+    A cached answer to this query or a paraphrase of it, or None.
+    namespace keeps answers of views that build different prompts apart.
+    """
+    scope = query_scope(query)
+    if scope is None:
+        return None
+    key = _bucket_key(namespace, user, scope)
+    bucket = cache.get(key)
+    if not bucket:
+        _count("miss")
+        return None
+    position, score = best_match(vectorize(query), bucket["vectors"], _bucket_matrix(key, bucket))
+    if position is None or score < _threshold():
+        _count("miss")
+        return None
+    _count("hit")
+    return bucket["answers"][position]
+
+
+def store(namespace, user, query, answer):
+    """Remember an LLM answer as the canonical answer for this query"""
+    scope = query_scope(query)
+    if scope is None or not answer:
+        return
+    key = _bucket_key(namespace, user, scope)
+    bucket = cache.get(key) or {"queries": [], "answers": [], "vectors": []}
+    bucket["revision"] = format(time.time_ns(), "x")
+    bucket["queries"].append(query)
+    bucket["answers"].append(answer)
+    bucket["vectors"].append(vectorize(query))
+    for name in ("queries", "answers", "vectors"):
+        bucket[name] = bucket[name][-MAX_ENTRIES:]
+    cache.set(key, bucket, BUCKET_TIMEOUT)
@@ -0,0 +1,261 @@
+"""
+Assistant query log and its time-series rollups.
+
+record() only appends to an in-process buffer; a background thread writes
+the buffer with one bulk insert every QUERY_LOG_FLUSH_SECONDS (or as soon as
+QUERY_LOG_BATCH_SIZE rows are waiting), so logging never adds a database
+write to the request.
+
+``manage.py rollup_query_log`` (run hourly from cron) compacts the raw log
+into QueryRollup rows per hour and per day plus the day's HotQuery list, and
+applies the retention settings. Charts read only the rollups.
+"""
+import atexit
+import datetime
+import logging
+import re
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import HotQuery, QueryLog, QueryRollup
+
+logger = logging.getLogger(__name__)
+
+HOT_QUERIES_PER_DAY = 20
+DELETE_BATCH_SIZE = 5000
+SPACE_RE = re.compile(r"\s+")
+
+_buffer = deque()
+_buffer_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def normalize_query(query):
+    return SPACE_RE.sub(" ", (query or "").strip().lower())[:255]
+
+
+# ========================================
+# Write path
+# ========================================
+
+def record(user, view, answered_by, query, latency_ms):
+    """Queue one query for the log; never touches the database"""
+    entry = QueryLog(
+        user_id=user.pk if user is not None and user.is_authenticated else None,
+        view=view,
+        answered_by=answered_by,
+        query=normalize_query(query),
+        latency_ms=max(int(latency_ms), 0),
+        created_at=timezone.now(),
+    )
+    with _buffer_lock:
+        if len(_buffer) >= _setting("QUERY_LOG_MAX_BUFFER", 10000):
+            _buffer.popleft()  # database unreachable for a while: keep the newest rows
+        _buffer.append(entry)
+        pending = len(_buffer)
+    _ensure_flusher()
+    if pending >= _setting("QUERY_LOG_BATCH_SIZE", 200):
+        _wakeup.set()
+
+
+def flush():
+    """Write everything buffered so far; returns the number of rows written"""
+    with _buffer_lock:
+        batch = list(_buffer)
+        _buffer.clear()
+    if not batch:
+        return 0
+    try:
+        QueryLog.objects.bulk_create(batch, batch_size=500)
+    except Exception:
+        logger.exception("Could not write %d query log rows; keeping them for the next flush", len(batch))
+        with _buffer_lock:
+            _buffer.extendleft(reversed(batch))
+        return 0
+    return len(batch)
+
+
+def _run_flusher():
+    interval = _setting("QUERY_LOG_FLUSH_SECONDS", 5)
+    while True:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            flush()
+        finally:
+            # This thread's connection would otherwise stay open between flushes
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _buffer_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_run_flusher, name="query-log-flusher", daemon=True)
+            _flusher.start()
+
+
+atexit.register(flush)
+
+
+# ========================================
+# Rollups
+# ========================================
+
+def _aggregate(logs, granularity):
+    return (
+        logs.annotate(bucket=Trunc("created_at", granularity))
+        .values("bucket", "view", "answered_by")
+        .annotate(
+            queries=Count("id"),
+            teachers=Count("user", distinct=True),
+            latency_total_ms=Sum("latency_ms"),
+            latency_max_ms=Max("latency_ms"),
+        )
+    )
+
+
+def _start_of(moment, granularity):
+    moment = timezone.localtime(moment)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _roll_up(granularity, until):
+    """
+    (Re)build the rollups of every completed bucket since the last one written.
+    The last written bucket is rebuilt too, so late flushes are picked up.
+    """
+    last = QueryRollup.objects.filter(granularity=granularity).aggregate(last=Max("bucket_start"))["last"]
+    logs = QueryLog.objects.filter(created_at__lt=until)
+    if last is not None:
+        logs = logs.filter(created_at__gte=last)
+    rows = [
+        QueryRollup(granularity=granularity, bucket_start=row["bucket"], view=row["view"],
+                    answered_by=row["answered_by"], queries=row["queries"], teachers=row["teachers"],
+                    latency_total_ms=row["latency_total_ms"] or 0, latency_max_ms=row["latency_max_ms"] or 0)
+        for row in _aggregate(logs, granularity)
+    ]
+    with transaction.atomic():
+        stale = QueryRollup.objects.filter(granularity=granularity, bucket_start__lt=until)
+        if last is not None:
+            stale = stale.filter(bucket_start__gte=last)
+        stale.delete()
+        QueryRollup.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def _hot_queries(until):
+    last_day = HotQuery.objects.aggregate(last=Max("day"))["last"]
+    first_log = QueryLog.objects.filter(created_at__lt=until).order_by("created_at").values_list("created_at", flat=True).first()
+    if first_log is None:
+        return 0
+    day = last_day or timezone.localdate(first_log)
+    end_day = timezone.localdate(until)
+    written = 0
+    while day < end_day:
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+        top = (
+            QueryLog.objects.filter(created_at__gte=start, created_at__lt=start + datetime.timedelta(days=1))
+            .exclude(query="")
+            .values("query").annotate(count=Count("id")).order_by("-count")[:HOT_QUERIES_PER_DAY]
+        )
+        with transaction.atomic():
+            HotQuery.objects.filter(day=day).delete()
+            created = HotQuery.objects.bulk_create([HotQuery(day=day, query=row["query"], count=row["count"]) for row in top])
+        written += len(created)
+        day += datetime.timedelta(days=1)
+    return written
+
+
+def _delete_older(queryset, field, cutoff):
+    """Delete in primary-key batches so a large purge doesn't hold one huge transaction"""
+    deleted = 0
+    while True:
+        ids = list(queryset.filter(**{f"{field}__lt": cutoff}).values_list("pk", flat=True)[:DELETE_BATCH_SIZE])
+        if not ids:
+            return deleted
+        deleted += queryset.model.objects.filter(pk__in=ids).delete()[0]
+
+
+def apply_retention(now=None):
+    now = now or timezone.now()
+    raw_days = _setting("QUERY_LOG_RAW_RETENTION_DAYS", 7)
+    return {
+        "raw": _delete_older(QueryLog.objects.all(), "created_at", now - datetime.timedelta(days=raw_days)),
+        "hourly": _delete_older(
+            QueryRollup.objects.filter(granularity="hour"), "bucket_start",
+            now - datetime.timedelta(days=_setting("QUERY_ROLLUP_HOURLY_RETENTION_DAYS", 90)),
+        ),
+        "daily": _delete_older(
+            QueryRollup.objects.filter(granularity="day"), "bucket_start",
+            now - datetime.timedelta(days=_setting("QUERY_ROLLUP_DAILY_RETENTION_DAYS", 730)),
+        ),
+        "hot": _delete_older(
+            HotQuery.objects.all(), "day",
+            (now - datetime.timedelta(days=_setting("QUERY_ROLLUP_DAILY_RETENTION_DAYS", 730))).date(),
+        ),
+    }
+
+
+def run_rollups(now=None):
+    """Roll up completed hours and days, then purge by retention; returns counts"""
+    now = now or timezone.now()
+    flush()
+    result = {
+        "hourly": _roll_up("hour", _start_of(now, "hour")),
+        "daily": _roll_up("day", _start_of(now, "day")),
+        "hot_queries": _hot_queries(_start_of(now, "day")),
+    }
+    result["purged"] = apply_retention(now)
+    return result
+
+
+# ========================================
+# Chart data (rollups only)
+# ========================================
+
+def chart_series(hours=48, days=30):
+    """Per-path query counts for the last `hours` hours and `days` days, plus hot queries"""
+    now = timezone.now()
+
+    def series(granularity, since):
+        points = {}
+        rows = (
+            QueryRollup.objects.filter(granularity=granularity, bucket_start__gte=since)
+            .values("bucket_start", "answered_by")
+            .annotate(queries=Sum("queries"), latency_total_ms=Sum("latency_total_ms"))
+            .order_by("bucket_start")
+        )
+        for row in rows:
+            point = points.setdefault(row["bucket_start"].isoformat(), {"total": 0, "latency_total_ms": 0})
+            point[row["answered_by"]] = row["queries"]
+            point["total"] += row["queries"]
+            point["latency_total_ms"] += row["latency_total_ms"]
+        for point in points.values():
+            point["avg_latency_ms"] = round(point.pop("latency_total_ms") / point["total"], 1) if point["total"] else None
+        return [dict(bucket=bucket, **values) for bucket, values in points.items()]
+
+    hot = (
+        HotQuery.objects.filter(day__gte=timezone.localdate() - datetime.timedelta(days=7))
+        .values("query").annotate(count=Sum("count")).order_by("-count")[:HOT_QUERIES_PER_DAY]
+    )
+    return {
+        "hourly": series("hour", now - datetime.timedelta(hours=hours)),
+        "daily": series("day", now - datetime.timedelta(days=days)),
+        "hot_queries": list(hot),
+    }
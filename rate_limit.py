@@ -0,0 +1,171 @@
+"""
+Rate limiting and daily LLM token quotas for the assistant.
+
+Every assistant query takes one token from two token buckets kept in the
+shared cache: one per user and one per client IP. A bucket refills
+continuously at its per-minute rate up to its burst size. Bucket updates
+take a short cache lock. If the lock can't be had the request is let
+through, so a slow cache never blocks the assistant.
+
+LLM spending is metered from each completion's usage data into LLMUsage
+(one row per teacher and day), with a cached running total for the quota
+check. Once a bucket is empty or the day's quota is used up, the views
+answer locally from the timetable instead of calling the LLM.
+
+Buckets and running totals are only shared between workers through a shared
+cache backend. With the default per-process LocMemCache every worker keeps
+its own buckets, so N workers allow N times the configured rate.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LLMUsage
+
+BUCKET_KEY = "ratelimit:{}:{}"
+LOCK_KEY = "ratelimit:lock:{}:{}"
+USAGE_KEY = "llm_tokens:{}:{}"
+LOCK_TIMEOUT = 2
+LOCK_ATTEMPTS = 3
+
+
+def _limits(scope):
+    if scope == "user":
+        return getattr(settings, "RATE_LIMIT_USER_BURST", 10), getattr(settings, "RATE_LIMIT_USER_PER_MINUTE", 6)
+    return getattr(settings, "RATE_LIMIT_IP_BURST", 30), getattr(settings, "RATE_LIMIT_IP_PER_MINUTE", 30)
+
+
+def client_ip(request):
+    if getattr(settings, "RATE_LIMIT_TRUST_X_FORWARDED_FOR", False):
+        forwarded = request.headers.get("X-Forwarded-For", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+# ========================================
+# Token buckets
+# ========================================
+
+def take(scope, identity, cost=1, now=None):
+    """
+    Take `cost` tokens from the bucket of (scope, identity); a negative cost
+    gives tokens back (never above the burst size).
+    Returns (allowed, seconds until enough tokens are back).
+    """
+    burst, per_minute = _limits(scope)
+    if not burst or not per_minute:
+        return True, 0
+    rate = per_minute / 60.0
+    lock_key = LOCK_KEY.format(scope, identity)
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            break
+        time.sleep(0.01)
+    else:
+        return True, 0  # fail open
+
+    try:
+        now = now or time.time()
+        key = BUCKET_KEY.format(scope, identity)
+        tokens, updated = cache.get(key) or (float(burst), now)
+        tokens = min(float(burst), tokens + (now - updated) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens = min(float(burst), tokens - cost)
+        # Unused buckets refill completely after burst / rate seconds; no need to keep them longer
+        cache.set(key, (tokens, now), int(burst / rate) + 60)
+    finally:
+        cache.delete(lock_key)
+    return allowed, 0 if allowed else (cost - tokens) / rate
+
+
+def check_request(request):
+    """
+    Charge one assistant query to the user's and the IP's buckets.
+    Returns None if allowed, else the seconds to wait. Nothing stays charged
+    for a refused query: if the IP bucket refuses, the user's token is returned.
+    """
+    allowed, retry_after = take("user", request.user.pk)
+    if not allowed:
+        return retry_after
+    allowed, retry_after = take("ip", client_ip(request))
+    if not allowed:
+        take("user", request.user.pk, cost=-1)
+        return retry_after
+    return None
+
+
+# ========================================
+# Daily LLM token quotas
+# ========================================
+
+def daily_quota():
+    return getattr(settings, "LLM_DAILY_TOKEN_QUOTA", 50000)
+
+
+def tokens_used_today(user):
+    today = timezone.localdate()
+    key = USAGE_KEY.format(user.pk, today.isoformat())
+    used = cache.get(key)
+    if used is None:
+        used = LLMUsage.objects.filter(user=user, day=today).values_list("total_tokens", flat=True).first() or 0
+        cache.add(key, used, 60 * 60 * 24)
+    return used
+
+
+def quota_left(user):
+    quota = daily_quota()
+    if not quota:
+        return None  # unlimited
+    return max(quota - tokens_used_today(user), 0)
+
+
+def _counters(**fields):
+    return {name: F(name) + value for name, value in fields.items()}
+
+
+def record_usage(user, usage):
+    """Add one completion's usage (groq / OpenAI-style usage object) to the teacher's day"""
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    total = getattr(usage, "total_tokens", 0) or prompt_tokens + completion_tokens
+    today = timezone.localdate()
+    LLMUsage.objects.get_or_create(user=user, day=today)
+    LLMUsage.objects.filter(user=user, day=today).update(**_counters(
+        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=total, requests=1,
+    ))
+    key = USAGE_KEY.format(user.pk, today.isoformat())
+    try:
+        cache.incr(key, total)
+    except ValueError:
+        cache.delete(key)  # re-read from the database next time
+
+
+def record_limited(user, reason):
+    """Count a query answered locally because of a rate limit or exhausted quota"""
+    field = "rate_limited" if reason == "rate_limited" else "over_quota"
+    today = timezone.localdate()
+    LLMUsage.objects.get_or_create(user=user, day=today)
+    LLMUsage.objects.filter(user=user, day=today).update(**_counters(**{field: 1}))
+
+
+def usage_report(day=None):
+    """Per-teacher consumption of one day, highest first, with totals"""
+    day = day or timezone.localdate()
+    quota = daily_quota()
+    rows = []
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "requests": 0,
+              "rate_limited": 0, "over_quota": 0}
+    usages = LLMUsage.objects.filter(day=day).select_related("user").order_by("-total_tokens")
+    for usage in usages:
+        row = {"teacher": usage.user.username, "teacher_id": usage.user_id}
+        for name in totals:
+            row[name] = getattr(usage, name)
+            totals[name] += row[name]
+        row["quota_left"] = max(quota - usage.total_tokens, 0) if quota else None
+        rows.append(row)
+    return {"day": day.isoformat(), "daily_quota": quota or None, "teachers": rows, "totals": totals}
@@ -0,0 +1,149 @@
+"""
+Read-only batch schedule API for timetable-office tools and kiosk displays.
+
+All requested teachers are fetched with one query over the indexed
+(teacher, day, start_time) columns. Large batches are streamed teacher by
+teacher instead of being materialised as one big dict. orjson is used when
+installed, the stdlib json module otherwise.
+"""
+import json
+import re
+from itertools import groupby
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from .models import TimetableEntry
+from .timetable_parser import DAY_MAP
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+TIME_RE = re.compile(r"^\d{2}:\d{2}$")
+ENTRY_FIELDS = ("teacher_id", "day", "start_time", "end_time", "subject", "room")
+
+
+class BatchRequestError(ValueError):
+    pass
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def max_batch_size():
+    return getattr(settings, "SCHEDULE_BATCH_MAX_TEACHERS", 500)
+
+
+def stream_threshold():
+    return getattr(settings, "SCHEDULE_BATCH_STREAM_THRESHOLD", 50)
+
+
+def parse_teacher_ids(raw_ids):
+    """Accept a list or a comma-separated string of ids"""
+    if isinstance(raw_ids, str):
+        raw_ids = [part for part in raw_ids.split(",") if part.strip()]
+    try:
+        ids = list(dict.fromkeys(int(value) for value in raw_ids))
+    except (TypeError, ValueError):
+        raise BatchRequestError("teacher ids must be integers")
+    if not ids:
+        raise BatchRequestError("no teacher ids given")
+    if len(ids) > max_batch_size():
+        raise BatchRequestError(f"at most {max_batch_size()} teacher ids per request")
+    return ids
+
+
+def parse_days(raw_days):
+    """'Monday,Tu' -> ['Mo', 'Tu']"""
+    if not raw_days:
+        return None
+    if isinstance(raw_days, str):
+        raw_days = raw_days.split(",")
+    abbrs = set(DAY_MAP.values())
+    days = []
+    for value in raw_days:
+        value = value.strip()
+        day = DAY_MAP.get(value.capitalize(), value[:2].capitalize())
+        if day not in abbrs:
+            raise BatchRequestError(f"unknown day: {value}")
+        days.append(day)
+    return days
+
+
+def _parse_clock(value, name):
+    if not value:
+        return None
+    if not TIME_RE.match(str(value)):
+        raise BatchRequestError(f"{name} must be HH:MM (24-hour)")
+    return value
+
+
+def build_queryset(teacher_ids, days=None, time_from=None, time_to=None):
+    """One query, ordered for grouping; times are stored as zero-padded HH:MM so text compare works"""
+    entries = TimetableEntry.objects.filter(teacher_id__in=teacher_ids)
+    if days:
+        entries = entries.filter(day__in=days)
+    if time_from:
+        entries = entries.filter(end_time__gt=time_from)
+    if time_to:
+        entries = entries.filter(start_time__lt=time_to)
+    return entries.order_by("teacher_id", "day", "start_time").values_list(*ENTRY_FIELDS)
+
+
+def _slot(row):
+    _, day, start, end, subject, room = row
+    return {"day": day, "start": start or "", "end": end or "", "subject": subject or "Class", "room": room or ""}
+
+
+def parse_request(params):
+    return {
+        "teacher_ids": parse_teacher_ids(params.get("teacher_ids") or params.get("ids") or ""),
+        "days": parse_days(params.get("day") or params.get("days")),
+        "time_from": _parse_clock(params.get("from"), "from"),
+        "time_to": _parse_clock(params.get("to"), "to"),
+    }
+
+
+def teacher_names(teacher_ids):
+    return dict(User.objects.filter(id__in=teacher_ids).values_list("id", "username"))
+
+
+def _grouped(query):
+    rows = build_queryset(query["teacher_ids"], query["days"], query["time_from"], query["time_to"])
+    for teacher_id, group in groupby(rows.iterator(chunk_size=2000), key=lambda row: row[0]):
+        yield teacher_id, [_slot(row) for row in group]
+
+
+def build_payload(query):
+    names = teacher_names(query["teacher_ids"])
+    schedules = dict(_grouped(query))
+    return {
+        "teachers": [
+            {"id": tid, "username": names.get(tid), "slots": schedules.get(tid, [])}
+            for tid in query["teacher_ids"]
+        ],
+        "missing": [tid for tid in query["teacher_ids"] if tid not in names],
+    }
+
+
+def stream_payload(query):
+    """Same document as build_payload, yielded in chunks"""
+    names = teacher_names(query["teacher_ids"])
+    found = set()
+    yield b'{"teachers":['
+    first = True
+    for teacher_id, slots in _grouped(query):
+        found.add(teacher_id)
+        yield (b"" if first else b",") + dumps({"id": teacher_id, "username": names.get(teacher_id), "slots": slots})
+        first = False
+    # Teachers without matching slots still get an (empty) entry
+    for teacher_id in query["teacher_ids"]:
+        if teacher_id not in found:
+            yield (b"" if first else b",") + dumps({"id": teacher_id, "username": names.get(teacher_id), "slots": []})
+            first = False
+    yield b'],"missing":' + dumps([tid for tid in query["teacher_ids"] if tid not in names]) + b"}"
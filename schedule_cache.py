@@ -0,0 +1,78 @@
+"""
+Timetable versions used to key every per-teacher cache.
+
+A teacher's version is "<global generation>.<teacher generation>". Bumping
+the global generation invalidates everything at once; bumping a single
+teacher only invalidates that teacher's cached feeds and fragments. Cached
+values are keyed on the version, so nothing ever has to be deleted.
+
+Versions live in the default cache, so multi-worker deployments need a
+shared backend (see CACHES in settings).
+"""
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cache_utils import bump_generation, generation, increment, new_generation
+
+GLOBAL_KEY = "timetable_version:global"
+TEACHER_KEY = "timetable_version:teacher:{}"
+VERSION_TIMEOUT = None  # never expire on their own
+
+
+def timetable_version(username):
+    """Current timetable version for a teacher (username as used for matching)"""
+    return f"{generation(GLOBAL_KEY, VERSION_TIMEOUT)}.{generation(TEACHER_KEY.format(username.lower()), VERSION_TIMEOUT)}"
+
+
+def bump_timetable_version(usernames=None):
+    """Invalidate cached schedules for the given usernames, or for everyone if None"""
+    if usernames is None:
+        bump_generation(GLOBAL_KEY, VERSION_TIMEOUT)
+        return
+    value = new_generation()
+    cache.set_many({TEACHER_KEY.format(name.lower()): value for name in usernames}, VERSION_TIMEOUT)
+
+
+# ========================================
+# Per-teacher fragment cache
+# ========================================
+
+FRAGMENT_KEY = "fragment:{}:{}:{}:{}"
+FRAGMENT_STATS_KEY = "fragment_stats:{}:{}"
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+FRAGMENT_NAMES = ("dashboard", "schedule_grid", "notifications")
+
+
+def cached_fragment(name, user, builder, timeout=FRAGMENT_TIMEOUT):
+    """
+    Return builder()'s value for this teacher, cached per timetable version and
+    local date. Anything that depends on the current time must not go in here.
+    """
+    version = timetable_version(user.username)
+    key = FRAGMENT_KEY.format(name, user.pk, version, timezone.localdate().isoformat())
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+        increment(FRAGMENT_STATS_KEY.format(name, "miss"))
+    else:
+        increment(FRAGMENT_STATS_KEY.format(name, "hit"))
+    return value
+
+
+def fragment_stats():
+    """{name: {"hits", "misses", "hit_rate"}} since the counters were last reset"""
+    keys = [FRAGMENT_STATS_KEY.format(name, outcome) for name in FRAGMENT_NAMES for outcome in ("hit", "miss")]
+    counts = cache.get_many(keys)
+    stats = {}
+    for name in FRAGMENT_NAMES:
+        hits = counts.get(FRAGMENT_STATS_KEY.format(name, "hit"), 0)
+        misses = counts.get(FRAGMENT_STATS_KEY.format(name, "miss"), 0)
+        total = hits + misses
+        stats[name] = {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 4) if total else None}
+    return stats
+
+
+def reset_fragment_stats():
+    cache.delete_many([FRAGMENT_STATS_KEY.format(name, outcome)
+                       for name in FRAGMENT_NAMES for outcome in ("hit", "miss")])
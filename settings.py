@@ -45,7 +45,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.auth_cache.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -81,6 +81,29 @@ DATABASES = {
 }
 
 
+# Cache
+# Holds timetable versions, rendered calendar feeds and other per-teacher caches.
+# LocMemCache is per process: with more than one worker use a shared backend, e.g.
+# 'django.core.cache.backends.redis.RedisCache' with LOCATION 'redis://127.0.0.1:6379'.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'timetable-hub',
+        'TIMEOUT': 60 * 60 * 24,
+    }
+}
+
+
+# Sessions / authentication
+# cached_db serves session reads from CACHES and only writes through to the DB.
+# 'django.contrib.sessions.backends.signed_cookies' avoids server-side session storage entirely.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# How long the User / TeacherProfile of a session are cached (seconds)
+AUTH_USER_CACHE_TIMEOUT = 60 * 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -121,6 +144,86 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Department timetable PDF delivery
+# None = stream from Django, 'nginx' = X-Accel-Redirect, 'apache' = X-Sendfile
+PDF_SENDFILE_BACKEND = None
+# Internal nginx location that aliases MEDIA_ROOT (only used with 'nginx')
+PDF_SENDFILE_URL_PREFIX = '/protected-media/'
+
+# Resumable (chunked) timetable PDF uploads
+TIMETABLE_UPLOAD_MAX_BYTES = 50 * 1024 * 1024
+TIMETABLE_UPLOAD_CHUNK_BYTES = 2 * 1024 * 1024
+# Unfinished uploads older than this are discarded
+TIMETABLE_UPLOAD_EXPIRY_HOURS = 24
+
+# Timetable PDF parsing: abort an upload whose parse grows the worker by more than this (None = no limit)
+TIMETABLE_PARSE_MAX_MEMORY_MB = 512
+
+# Teacher calendar (.ics) feeds
+# Browser/calendar clients may reuse a feed for this long before revalidating
+TIMETABLE_CALENDAR_MAX_AGE = 60 * 60
+
+# Bulk teacher CSV import: password-hashing processes (None = CPU count)
+TEACHER_IMPORT_WORKERS = None
+
+# Batch timetable ingestion (manage.py ingest_timetables): parsing processes (None = CPU count)
+TIMETABLE_INGEST_WORKERS = None
+
+# Batch schedule API
+SCHEDULE_BATCH_MAX_TEACHERS = 500
+# Batches with at least this many teachers are streamed
+SCHEDULE_BATCH_STREAM_THRESHOLD = 50
+
+# Class reminders (manage.py run_reminder_scheduler)
+REMINDER_LEAD_MINUTES = 10
+REMINDER_SINKS = ['app.class_reminders.LogSink']
+# CacheInboxSink feeds /notifications/stream/ (SSE); it needs a cache shared by
+# the scheduler and the web workers, so it is only on with a shared backend
+if CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache',
+):
+    REMINDER_SINKS.insert(0, 'app.class_reminders.CacheInboxSink')
+# Without a shared cache to signal changes, the scheduler checks for queued reloads this often
+REMINDER_RELOAD_POLL_SECONDS = 300
+# Queued reloads no scheduler picked up within this time are dropped (a scheduler start reloads everyone)
+REMINDER_RELOAD_RETENTION_HOURS = 24
+# Each open stream holds a sync worker for this long; raise it only under ASGI or threaded workers
+REMINDER_SSE_MAX_SECONDS = 10
+REMINDER_SSE_POLL_SECONDS = 2
+
+# Assistant LLM calls: identical in-flight prompts share one completion.
+# Followers wait at most this long (seconds) before calling the LLM themselves.
+LLM_SINGLE_FLIGHT_TIMEOUT = 30
+# Also coalesce across worker processes through CACHES (needs a shared cache backend)
+LLM_SINGLE_FLIGHT_CROSS_PROCESS = False
+
+# Paraphrase-aware answer cache (app/query_cache.py): minimum cosine similarity
+# between a new query and a previously answered one to reuse its answer
+QUERY_CACHE_SIMILARITY = 0.85
+
+# Assistant query log (app/query_log.py): buffered writes, rolled up by manage.py rollup_query_log
+QUERY_LOG_FLUSH_SECONDS = 5
+QUERY_LOG_BATCH_SIZE = 200
+QUERY_LOG_RAW_RETENTION_DAYS = 7
+QUERY_ROLLUP_HOURLY_RETENTION_DAYS = 90
+QUERY_ROLLUP_DAILY_RETENTION_DAYS = 730
+
+# Assistant rate limits (token buckets in CACHES): burst size and refill per minute.
+# Per worker unless CACHES is shared: N LocMemCache workers allow N times these rates.
+# Over the limit, queries are answered from the timetable without the LLM.
+RATE_LIMIT_USER_BURST = 10
+RATE_LIMIT_USER_PER_MINUTE = 6
+RATE_LIMIT_IP_BURST = 30
+RATE_LIMIT_IP_PER_MINUTE = 30
+# Only behind a reverse proxy that sets X-Forwarded-For
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = False
+# LLM tokens per teacher per day (None = unlimited)
+LLM_DAILY_TOKEN_QUOTA = 50000
+
+# Teacher workload (app/workload.py): breaks up to this long neither end a
+# continuous teaching block nor count as a free gap
+WORKLOAD_BLOCK_BREAK_MINUTES = 10
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
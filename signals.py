@@ -0,0 +1,71 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Department, MasterGrid, Semester, TeacherProfile, TimetablePDF, TimetableUpload
+from . import pdf_search
+from .auth_cache import forget_profile, forget_user
+from .calendar_feed import TOKEN_CACHE_KEY
+from .department_tree import bump_tree_version
+from .class_reminders import mark_teachers_dirty
+from .schedule_cache import bump_timetable_version
+from .timetable_parser import link_entries_to_user
+from .workload import refresh_workloads
+
+
+@receiver(post_delete, sender=TimetablePDF)
+def remove_pdf_from_search_index(sender, instance, **kwargs):
+    """Keep the full-text index in step when a department PDF is deleted"""
+    pdf_search.remove_pdf(instance.pk)
+
+
+@receiver(post_delete, sender=TimetablePDF)
+@receiver(post_delete, sender=TimetableUpload)
+def invalidate_schedules_on_delete(sender, instance, **kwargs):
+    """Deleting an upload cascades to its entries, so cached schedules are stale"""
+    bump_timetable_version()
+    mark_teachers_dirty()
+
+
+@receiver(post_delete, sender=MasterGrid)
+def refresh_workloads_on_grid_delete(sender, instance, **kwargs):
+    """A deleted PDF's teachers may now teach less (or nothing) in the department"""
+    if Department.objects.filter(pk=instance.department_id).exists():
+        refresh_workloads(instance.department_id, set(instance.teachers))
+
+
+@receiver(post_save, sender=TeacherProfile)
+def forget_calendar_token(sender, instance, **kwargs):
+    """Deactivating a teacher must stop their feed even if the token is cached"""
+    if instance.calendar_token:
+        cache.delete(TOKEN_CACHE_KEY.format(instance.calendar_token))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def link_new_teacher_entries(sender, instance, created, **kwargs):
+    """Entries ingested before the teacher registered get linked to the new account"""
+    if created and not (instance.is_staff or instance.is_superuser):
+        link_entries_to_user(instance)
+
+
+@receiver(post_save, sender=TeacherProfile)
+@receiver(post_delete, sender=TeacherProfile)
+def forget_cached_profile(sender, instance, **kwargs):
+    forget_profile(instance.user_id)
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Semester)
+@receiver(post_delete, sender=Semester)
+@receiver(post_save, sender=TimetablePDF)
+@receiver(post_delete, sender=TimetablePDF)
+def invalidate_department_tree(sender, **kwargs):
+    bump_tree_version()
@@ -0,0 +1,260 @@
+"""
+Substitute finder: who can cover each period of an absent teacher.
+
+Occupancy is precomputed from the packed MasterGrids (see master_grid.py)
+plus the personal-upload TimetableEntry rows into one record per teacher: a
+bitmask of busy 5-minute slots per day, the number of periods taught per
+day, their subjects and departments. A personal-upload row belongs to the
+department it was tagged with, else to the one named on the teacher's
+profile; a teacher with neither can only be planned for, or offered as
+cover, with an explicit department. The record set is rebuilt in each worker
+only when a grid or an upload changes, so planning a whole day for several
+absent teachers is a handful of integer ANDs per candidate and period.
+
+Candidates for a period are the free teachers of the same department,
+ranked by subject overlap (same subject, then a shared subject word) and
+then by how many periods they already teach that day. plan() also assigns
+one substitute per period, counting each assignment towards the
+substitute's load so cover is spread across the department.
+"""
+import datetime
+import re
+import threading
+
+from django.db.models import Count, Max
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .master_grid import DAY_INDEX, DAYS, iter_cells
+from .models import Department, MasterGrid, TimetableChangeLog, TimetableEntry
+from .timetable_parser import DAY_MAP, to_time
+
+SLOT_MINUTES = 5
+DEFAULT_PERIOD_MINUTES = 50
+DEFAULT_LIMIT = 5
+MAX_LIMIT = 50
+SUBJECT_WORD_RE = re.compile(r"[a-z0-9]+")
+GENERIC_SUBJECT_WORDS = {"lab", "tutorial", "tut", "practical", "theory"}
+
+
+class SubstituteError(ValueError):
+    pass
+
+
+def _minutes(value):
+    parsed = to_time(value)
+    return parsed.hour * 60 + parsed.minute if parsed else None
+
+
+def slot_mask(start, end):
+    """Bitmask of the SLOT_MINUTES slots covered by [start, end) minutes of the day"""
+    first, last = start // SLOT_MINUTES, -(-end // SLOT_MINUTES)
+    return ((1 << max(last - first, 1)) - 1) << first
+
+
+def subject_words(subject):
+    return set(SUBJECT_WORD_RE.findall((subject or "").lower())) - GENERIC_SUBJECT_WORDS
+
+
+class Occupancy:
+    """What one teacher teaches, per day, across every grid they appear in"""
+    __slots__ = ("name", "masks", "periods", "subjects", "words", "departments", "classes")
+
+    def __init__(self, name):
+        self.name = name
+        self.masks = [0] * len(DAYS)
+        self.periods = [0] * len(DAYS)
+        self.subjects = set()
+        self.words = set()
+        self.departments = set()
+        self.classes = [[] for _ in DAYS]   # (start, end, subject, semester, mask)
+
+    def add(self, day, start, end, subject, semester, department_id):
+        mask = slot_mask(start, end)
+        self.masks[day] |= mask
+        self.periods[day] += 1
+        self.subjects.add(subject.lower())
+        self.words |= subject_words(subject)
+        if department_id is not None:
+            self.departments.add(department_id)
+        self.classes[day].append((start, end, subject, semester, mask))
+
+    def has_class(self, day, start, end):
+        return any(item[:2] == (start, end) for item in self.classes[day])
+
+
+def _personal_entries():
+    return TimetableEntry.objects.filter(timetable_pdf__isnull=True)
+
+
+def _grid_version():
+    grids = MasterGrid.objects.aggregate(count=Count("id"), latest=Max("updated_at"))
+    # Every personal upload writes a change log; deleting one drops its entries
+    uploads = TimetableChangeLog.objects.filter(upload__isnull=False).aggregate(latest=Max("id"))
+    return grids["count"], grids["latest"], uploads["latest"], _personal_entries().count()
+
+
+def build_occupancy():
+    """{teacher name: Occupancy} over every MasterGrid and personal-upload entry"""
+    teachers = {}
+
+    def occupancy_of(name):
+        occupancy = teachers.get(name)
+        if occupancy is None:
+            occupancy = teachers[name] = Occupancy(name)
+        return occupancy
+
+    for grid in MasterGrid.objects.select_related("semester"):
+        for name, day, (start_time, end_time), subject in iter_cells(grid):
+            start = _minutes(start_time)
+            if start is None:
+                continue
+            end = _minutes(end_time) or start + DEFAULT_PERIOD_MINUTES
+            occupancy_of(name).add(day, start, end, subject, grid.semester.number, grid.department_id)
+
+    departments = dict(Department.objects.values_list(Lower("name"), "id"))
+    entries = _personal_entries().values_list(
+        "teacher_name", "day", "start_time", "end_time", "subject", "department_id",
+        "teacher__teacher_profile__department",
+    )
+    for name, day, start_time, end_time, subject, department_id, profile_department in entries.iterator():
+        start = _minutes(start_time)
+        if day not in DAY_INDEX or start is None:
+            continue
+        end = _minutes(end_time) or start + DEFAULT_PERIOD_MINUTES
+        occupancy = occupancy_of(name)
+        if occupancy.has_class(DAY_INDEX[day], start, end):
+            continue  # the same class is already in a department grid
+        if department_id is None and profile_department:
+            department_id = departments.get(profile_department.strip().lower())
+        occupancy.add(DAY_INDEX[day], start, end, subject or "", None, department_id)
+
+    for occupancy in teachers.values():
+        for classes in occupancy.classes:
+            classes.sort(key=lambda item: item[:3])
+    return teachers
+
+
+_cached = None     # (grid version, occupancy) of this worker
+_cached_lock = threading.Lock()
+
+
+def occupancy():
+    global _cached
+    version = _grid_version()
+    cached = _cached
+    if cached is None or cached[0] != version:
+        with _cached_lock:
+            if _cached is None or _cached[0] != version:
+                _cached = (version, build_occupancy())
+            cached = _cached
+    return cached[1]
+
+
+# ========================================
+# Ranking and planning
+# ========================================
+
+def subject_match(candidate, subject):
+    """2: teaches this subject, 1: shares a subject word with it, 0: neither"""
+    if subject.lower() in candidate.subjects:
+        return 2
+    return 1 if subject_words(subject) & candidate.words else 0
+
+
+def _day_index(params):
+    if params.get("date"):
+        try:
+            date = datetime.date.fromisoformat(params["date"])
+        except ValueError:
+            raise SubstituteError("date must be YYYY-MM-DD")
+    elif params.get("day"):
+        day = params["day"].strip()
+        abbr = DAY_MAP.get(day.capitalize(), day[:2].capitalize())
+        if abbr not in DAYS:
+            raise SubstituteError(f"day must be one of {', '.join(DAYS)}")
+        return DAYS.index(abbr), None
+    else:
+        date = timezone.localdate()
+    abbr = DAY_MAP.get(date.strftime("%A"))
+    if abbr is None:
+        raise SubstituteError(f"No classes on {date:%A}")
+    return DAYS.index(abbr), date
+
+
+def plan(absent, params):
+    """
+    Substitutes for every period of the `absent` teachers (names) on one day.
+    params: date (YYYY-MM-DD) or day (Mo / Monday), department (id; defaults
+    to the absent teachers' departments), limit (candidates per period).
+    """
+    day, date = _day_index(params)
+    try:
+        limit = min(int(params.get("limit") or DEFAULT_LIMIT), MAX_LIMIT)
+        department = int(params["department"]) if params.get("department") else None
+    except ValueError:
+        raise SubstituteError("limit and department must be integers")
+    if limit < 1:
+        raise SubstituteError("limit must be positive")
+
+    teachers = occupancy()
+    unknown = [name for name in absent if name not in teachers]
+    if unknown:
+        raise SubstituteError(f"Not in any timetable: {', '.join(unknown)}")
+    if department is None:
+        homeless = [name for name in absent if not teachers[name].departments]
+        if homeless:
+            raise SubstituteError(
+                f"No department known for {', '.join(homeless)} (personal upload without a profile "
+                f"department); pass department"
+            )
+    departments = {department} if department is not None else set().union(*(teachers[name].departments for name in absent))
+    pool = [
+        teacher for name, teacher in teachers.items()
+        if name not in absent and teacher.departments & departments
+    ]
+    # Cover assigned in this plan, on top of each candidate's own classes
+    extra_masks = {teacher.name: 0 for teacher in pool}
+    extra_periods = {teacher.name: 0 for teacher in pool}
+
+    periods = sorted(
+        ((start, end, subject, semester, mask, name)
+         for name in absent
+         for start, end, subject, semester, mask in teachers[name].classes[day]),
+        key=lambda period: (period[0], period[1], period[2], period[5]),
+    )
+    result = []
+    for start, end, subject, semester, mask, name in periods:
+        free = [
+            teacher for teacher in pool
+            if not (teacher.masks[day] | extra_masks[teacher.name]) & mask
+        ]
+        ranked = sorted(
+            ((subject_match(teacher, subject), teacher.periods[day] + extra_periods[teacher.name], teacher.name)
+             for teacher in free),
+            key=lambda item: (-item[0], item[1], item[2].lower()),
+        )
+        assigned = ranked[0][2] if ranked else None
+        if assigned:
+            extra_masks[assigned] |= mask
+            extra_periods[assigned] += 1
+        result.append({
+            "teacher": name,
+            "start": f"{start // 60:02d}:{start % 60:02d}",
+            "end": f"{end // 60:02d}:{end % 60:02d}",
+            "subject": subject,
+            "semester": semester,
+            "assigned": assigned,
+            "candidates": [
+                {"teacher": candidate, "subject_match": match, "periods_today": load}
+                for match, load, candidate in ranked[:limit]
+            ],
+        })
+    return {
+        "day": DAYS[day],
+        "date": date.isoformat() if date else None,
+        "departments": sorted(departments),
+        "absent": list(absent),
+        "periods": result,
+        "uncovered": sum(1 for period in result if period["assigned"] is None),
+    }
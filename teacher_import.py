@@ -0,0 +1,156 @@
+"""
+Bulk teacher onboarding from CSV.
+
+Password hashing (PBKDF2, deliberately slow) is spread over a process pool,
+then all User and TeacherProfile rows are inserted with two bulk inserts in
+one transaction. Every CSV row gets a status in the returned report.
+
+Expected columns: username, email, password, contact, department
+(only username and password are required).
+"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from .models import TeacherProfile
+from .timetable_parser import link_unassigned_entries
+
+REQUIRED_COLUMNS = ("username", "password")
+# Below this many rows a pool costs more to start than it saves
+PARALLEL_THRESHOLD = 32
+
+
+def _init_worker(settings_module):
+    # Needed when workers are spawned rather than forked (macOS / Windows)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    import django
+    django.setup()
+
+
+def _hash_password(raw_password):
+    return make_password(raw_password)
+
+
+def hash_passwords(raw_passwords, workers=None):
+    """make_password() for every password, in parallel for large batches"""
+    if len(raw_passwords) < PARALLEL_THRESHOLD or workers == 1:
+        return [make_password(p) for p in raw_passwords]
+
+    workers = workers or getattr(settings, "TEACHER_IMPORT_WORKERS", None) or os.cpu_count() or 1
+    chunksize = max(len(raw_passwords) // (workers * 4), 1)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(os.environ.get("DJANGO_SETTINGS_MODULE", "chatbot.settings"),),
+    ) as pool:
+        return list(pool.map(_hash_password, raw_passwords, chunksize=chunksize))
+
+
+def read_rows(csv_file):
+    """Decode an uploaded / opened CSV file into dict rows with normalised headers"""
+    if hasattr(csv_file, "read"):
+        data = csv_file.read()
+    else:
+        data = csv_file
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    reader = csv.DictReader(io.StringIO(data))
+    reader.fieldnames = [(name or "").strip().lower() for name in (reader.fieldnames or [])]
+    return reader.fieldnames, list(reader)
+
+
+def validate_rows(fieldnames, rows):
+    """Return (valid_rows, report). Row numbers match the CSV (header is row 1)."""
+    report = []
+    missing = [col for col in REQUIRED_COLUMNS if col not in fieldnames]
+    if missing:
+        report.append({"row": 1, "username": "", "status": "error",
+                       "errors": [f"Missing column(s): {', '.join(missing)}"]})
+        return [], report
+
+    usernames = {(row.get("username") or "").strip() for row in rows}
+    existing = set(User.objects.filter(username__in=usernames).values_list("username", flat=True))
+
+    seen = set()
+    valid = []
+    for number, row in enumerate(rows, start=2):
+        username = (row.get("username") or "").strip()
+        email = (row.get("email") or "").strip()
+        password = row.get("password") or ""
+        errors = []
+
+        if not username:
+            errors.append("username is required")
+        elif len(username) > 150:
+            errors.append("username is longer than 150 characters")
+        elif username in existing:
+            errors.append("username already exists")
+        elif username in seen:
+            errors.append("duplicate username in file")
+        if not password:
+            errors.append("password is required")
+        if email:
+            try:
+                validate_email(email)
+            except ValidationError:
+                errors.append("invalid email")
+
+        if errors:
+            report.append({"row": number, "username": username, "status": "error", "errors": errors})
+            continue
+
+        seen.add(username)
+        valid.append({
+            "row": number,
+            "username": username,
+            "email": email,
+            "password": password,
+            "contact": (row.get("contact") or "").strip() or None,
+            "department": (row.get("department") or "").strip() or None,
+        })
+    return valid, report
+
+
+def import_teachers(csv_file, workers=None, dry_run=False):
+    """
+    Create teachers from a CSV. Returns
+    {"created": n, "failed": n, "rows": [{"row", "username", "status", "errors"}, ...]}
+    """
+    fieldnames, rows = read_rows(csv_file)
+    valid, report = validate_rows(fieldnames, rows)
+
+    if valid and not dry_run:
+        hashes = hash_passwords([item["password"] for item in valid], workers=workers)
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=item["username"], email=item["email"], password=hashed)
+                for item, hashed in zip(valid, hashes)
+            ], batch_size=500)
+            # Fetch ids back by username: bulk_create only sets pks on some backends
+            ids = dict(User.objects.filter(username__in=[item["username"] for item in valid])
+                       .values_list("username", "id"))
+            TeacherProfile.objects.bulk_create([
+                TeacherProfile(user_id=ids[item["username"]], contact=item["contact"],
+                               department=item["department"], is_active=True)
+                for item in valid
+            ], batch_size=500)
+        # bulk_create skips post_save, so link existing timetable rows here
+        link_unassigned_entries()
+
+    status = "valid" if dry_run else "created"
+    report.extend({"row": item["row"], "username": item["username"], "status": status, "errors": []}
+                  for item in valid)
+    report.sort(key=lambda entry: entry["row"])
+    return {
+        "created": 0 if dry_run else len(valid),
+        "failed": sum(1 for entry in report if entry["status"] == "error"),
+        "rows": report,
+    }
@@ -0,0 +1,239 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import batch_ingest, chunked_upload, class_reminders, rate_limit
+from .models import ChunkedUpload, LLMUsage, ReminderReload, TimetableEntry, TimetableUpload
+from .timetable_parser import apply_upload_rows
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user("teacher", password="pw")
+        self.upload = ChunkedUpload.objects.create(
+            user=self.user, kind="personal", filename="t.pdf", total_size=32, offset=8,
+        )
+        self.partial = chunked_upload.partial_path(self.upload)
+        os.makedirs(os.path.dirname(self.partial), exist_ok=True)
+        with open(self.partial, "wb") as fh:
+            fh.write(b"%PDF-1.4")
+        self.url = reverse("chunked_upload", args=[self.upload.pk])
+
+    def _post_chunk(self, client, offset, data=b"XXXXXXXX", **headers):
+        return client.post(self.url, {"chunk": SimpleUploadedFile("chunk", data)},
+                           HTTP_UPLOAD_OFFSET=str(offset), **headers)
+
+    def _partial_bytes(self):
+        with open(self.partial, "rb") as fh:
+            return fh.read()
+
+    def test_stale_offset_chunk_leaves_partial_file_unchanged(self):
+        client = Client()
+        client.force_login(self.user)
+        response = self._post_chunk(client, offset=0)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self._partial_bytes(), b"%PDF-1.4")
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.offset, 8)
+
+    def test_chunk_without_csrf_header_is_rejected_before_the_body_is_read(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = self._post_chunk(client, offset=8)
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self._partial_bytes(), b"%PDF-1.4")
+
+    def test_chunk_at_the_stored_offset_is_appended(self):
+        client = Client()
+        client.force_login(self.user)
+        response = self._post_chunk(client, offset=8)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._partial_bytes(), b"%PDF-1.4XXXXXXXX")
+        self.upload.refresh_from_db()
+        self.assertEqual(self.upload.offset, 16)
+
+
+class ReuploadTests(TestCase):
+    ROWS = [
+        {"teacher_name": "Dr. Rao", "day": "Mo", "start_time": "09:00", "end_time": "09:50",
+         "subject": "Maths", "room": "101"},
+        {"teacher_name": "Dr. Rao", "day": "Tu", "start_time": "10:00", "end_time": "10:50",
+         "subject": "Physics", "room": "102"},
+    ]
+
+    def setUp(self):
+        self.admin = User.objects.create_user("admin", password="pw", is_staff=True)
+
+    def test_deleting_an_older_upload_keeps_the_entries_of_a_reupload(self):
+        first = TimetableUpload.objects.create(uploader=self.admin, uploaded_file="timetables/a.pdf")
+        apply_upload_rows([dict(row) for row in self.ROWS], first)
+        second = TimetableUpload.objects.create(uploader=self.admin, uploaded_file="timetables/a.pdf")
+        log = apply_upload_rows([dict(row) for row in self.ROWS], second)
+
+        self.assertEqual((log.inserted, log.updated, log.deleted, log.unchanged), (0, 0, 0, 2))
+        first.delete()
+
+        entries = TimetableEntry.objects.filter(teacher_name="Dr. Rao")
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(set(entries.values_list("upload_id", flat=True)), {second.pk})
+
+
+@override_settings(RATE_LIMIT_USER_BURST=2, RATE_LIMIT_USER_PER_MINUTE=1,
+                   RATE_LIMIT_IP_BURST=5, RATE_LIMIT_IP_PER_MINUTE=1, LLM_DAILY_TOKEN_QUOTA=1000)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = User.objects.create_user("teacher", password="pw")
+        self.request = RequestFactory().post("/chatbot/")
+        self.request.user = self.user
+
+    def test_user_bucket_refuses_once_the_burst_is_used(self):
+        self.assertIsNone(rate_limit.check_request(self.request))
+        self.assertIsNone(rate_limit.check_request(self.request))
+
+        retry_after = rate_limit.check_request(self.request)
+        self.assertIsNotNone(retry_after)
+        self.assertGreater(retry_after, 0)
+
+    @override_settings(RATE_LIMIT_IP_BURST=1)
+    def test_ip_refusal_gives_the_user_token_back(self):
+        self.assertIsNone(rate_limit.check_request(self.request))
+        self.assertIsNotNone(rate_limit.check_request(self.request))  # IP bucket empty
+
+        allowed, _ = rate_limit.take("user", self.user.pk)
+        self.assertTrue(allowed)
+
+    def test_quota_left_falls_back_to_the_database_without_a_cached_total(self):
+        LLMUsage.objects.create(user=self.user, day=timezone.localdate(), total_tokens=400)
+        self.assertEqual(rate_limit.quota_left(self.user), 600)
+
+        LLMUsage.objects.filter(user=self.user).update(total_tokens=1200)
+        cache.clear()
+        self.assertEqual(rate_limit.quota_left(self.user), 0)
+
+    @override_settings(LLM_DAILY_TOKEN_QUOTA=None)
+    def test_quota_left_is_none_without_a_quota(self):
+        LLMUsage.objects.create(user=self.user, day=timezone.localdate(), total_tokens=10 ** 6)
+        self.assertIsNone(rate_limit.quota_left(self.user))
+
+
+class BatchIngestTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.source = tempfile.mkdtemp()
+        for path in (self.media_root, self.source):
+            self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin = User.objects.create_user("admin", password="pw", is_staff=True)
+        for name in ("a.pdf", "b.pdf"):
+            with open(os.path.join(self.source, name), "wb") as fh:
+                fh.write(b"%PDF-1.4 " + name.encode())
+        self.checkpoint = os.path.join(self.source, "run.ckpt.json")
+        self.parsed = []
+
+    def _parse(self, path, fail=()):
+        name = os.path.basename(path)
+        self.parsed.append(name)
+        if name in fail:
+            raise ValueError("unreadable table")
+        row = {"teacher_name": f"Dr. {name[0].upper()}", "day": "Mo", "start_time": "09:00",
+               "end_time": "09:50", "subject": "Maths", "room": "101"}
+        return [row], None
+
+    def _ingest(self, fail=(), **options):
+        with mock.patch.object(batch_ingest, "parse_pdf_rows", lambda path: self._parse(path, fail)):
+            return batch_ingest.ingest(self.source, self.admin, workers=1, checkpoint_path=self.checkpoint, **options)
+
+    def test_second_run_skips_files_already_ingested(self):
+        totals = self._ingest()
+        self.assertEqual((totals["ingested"], totals["skipped"]), (2, 0))
+
+        self.parsed = []
+        totals = self._ingest()
+        self.assertEqual((totals["ingested"], totals["skipped"]), (0, 2))
+        self.assertEqual(self.parsed, [])
+        self.assertEqual(TimetableUpload.objects.count(), 2)
+
+    def test_rerun_with_the_checkpoint_retries_only_failed_files(self):
+        totals = self._ingest(fail={"b.pdf"})
+        self.assertEqual((totals["ingested"], totals["failed"]), (1, 1))
+        self.assertEqual(len(batch_ingest.Checkpoint(self.checkpoint).failed), 1)
+
+        self.parsed = []
+        totals = self._ingest()
+        self.assertEqual((totals["ingested"], totals["skipped"], totals["failed"]), (1, 1, 0))
+        self.assertEqual(self.parsed, ["b.pdf"])
+        checkpoint = batch_ingest.Checkpoint(self.checkpoint)
+        self.assertEqual((len(checkpoint.done), len(checkpoint.failed)), (2, 0))
+
+    def test_dry_run_writes_nothing(self):
+        older = TimetableUpload.objects.create(uploader=self.admin, uploaded_file=SimpleUploadedFile("old.pdf", b"%PDF old"))
+
+        totals = self._ingest(dry_run=True)
+        self.assertEqual((totals["new"], totals["backfilled"]), (2, 1))
+        self.assertEqual(self.parsed, [])
+        self.assertEqual(TimetableUpload.objects.count(), 1)
+        older.refresh_from_db()
+        self.assertEqual(older.file_hash, "")
+
+
+class ReminderSchedulerTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user("rao", password="pw")
+        self.other = User.objects.create_user("iyer", password="pw")
+        for user in (self.teacher, self.other):
+            self._entry(user, "Mo", "09:00")
+        self.scheduler = class_reminders.ReminderScheduler(sinks=[], lead=10)
+        self.scheduler.rebuild()
+
+    def _entry(self, user, day, start):
+        TimetableEntry.objects.create(teacher=user, teacher_name=user.username, day=day,
+                                      start_time=start, end_time="", subject="Maths")
+
+    def _live_slots(self, user):
+        return sorted((e.slot["day"], e.slot["start"]) for e in self.scheduler._live() if e.teacher_id == user.pk)
+
+    def test_marked_teacher_is_reloaded_and_others_keep_their_events(self):
+        self._entry(self.teacher, "Tu", "10:00")
+        class_reminders.mark_teachers_dirty([self.teacher.pk])
+
+        self.assertEqual(self.scheduler.apply_dirty(), {self.teacher.pk})
+        self.assertEqual(self._live_slots(self.teacher), [("Mo", "09:00"), ("Tu", "10:00")])
+        self.assertEqual(self.scheduler.generations[self.other.pk], 1)
+        self.assertFalse(ReminderReload.objects.exists())
+        self.assertEqual(self.scheduler.apply_dirty(), set())
+
+    def test_marking_twice_keeps_one_queued_row(self):
+        class_reminders.mark_teachers_dirty([self.teacher.pk])
+        class_reminders.mark_teachers_dirty([self.teacher.pk])
+
+        self.assertEqual(ReminderReload.objects.count(), 1)
+
+    def test_marking_everyone_rebuilds(self):
+        TimetableEntry.objects.filter(teacher=self.other).delete()
+        class_reminders.mark_teachers_dirty()
+
+        self.assertEqual(self.scheduler.apply_dirty(), {class_reminders.DIRTY_ALL})
+        self.assertEqual(self._live_slots(self.other), [])
+        self.assertEqual(self._live_slots(self.teacher), [("Mo", "09:00")])
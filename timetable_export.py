@@ -0,0 +1,197 @@
+"""
+Streaming bulk export of TimetableEntry rows (CSV, JSON Lines, Parquet).
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` and written
+out chunk by chunk, so memory stays flat however many rows are exported; the
+HTTP views wrap the same generators in a StreamingHttpResponse and the
+``export_timetable_entries`` command writes them to a file.
+
+Parquet needs pyarrow, imported only when a Parquet export starts; each chunk
+becomes one row group and is handed out as soon as it is written.
+"""
+import csv
+import datetime
+import io
+
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+
+from .models import TimetableEntry
+from .schedule_api import dumps
+
+DEFAULT_CHUNK_SIZE = 2000
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+COLUMNS = (
+    ("id", "id"),
+    ("teacher_name", "teacher_name"),
+    ("teacher_id", "teacher_id"),
+    ("teacher_username", "teacher__username"),
+    ("day", "day"),
+    ("start_time", "start_time"),
+    ("end_time", "end_time"),
+    ("subject", "subject"),
+    ("room", "room"),
+    ("upload_id", "upload_id"),
+    ("timetable_pdf_id", "timetable_pdf_id"),
+    ("department", "department__name"),
+    ("semester", "semester__number"),
+    ("uploaded_at", "source_uploaded_at"),
+)
+HEADER = [name for name, _ in COLUMNS]
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _int_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ExportError(f"{name} must be an integer")
+
+
+def _date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"{name} must be YYYY-MM-DD")
+
+
+def build_queryset(params):
+    """
+    Entries filtered by upload, timetable_pdf, department, semester and/or the
+    date their source file was uploaded (from / to, inclusive).
+    """
+    entries = TimetableEntry.objects.annotate(
+        source_uploaded_at=Coalesce("upload__uploaded_at", "timetable_pdf__uploaded_at")
+    )
+    for name in ("upload", "timetable_pdf", "department", "semester"):
+        value = _int_param(params, name)
+        if value is not None:
+            entries = entries.filter(**{f"{name}_id": value})
+    date_from, date_to = _date_param(params, "from"), _date_param(params, "to")
+    if date_from:
+        entries = entries.filter(Q(upload__uploaded_at__date__gte=date_from) | Q(timetable_pdf__uploaded_at__date__gte=date_from))
+    if date_to:
+        entries = entries.filter(Q(upload__uploaded_at__date__lte=date_to) | Q(timetable_pdf__uploaded_at__date__lte=date_to))
+    return entries.order_by("pk").values_list(*(field for _, field in COLUMNS))
+
+
+def _rows(queryset, chunk_size):
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield [value.isoformat() if isinstance(value, datetime.datetime) else value for value in row]
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    for chunk in _chunks(_rows(queryset, chunk_size), chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def iter_jsonl(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    for chunk in _chunks(_rows(queryset, chunk_size), chunk_size):
+        yield b"".join(dumps(dict(zip(HEADER, row))) + b"\n" for row in chunk)
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose written bytes are taken out after every row group"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _pyarrow():
+    """pyarrow with its parquet module, imported on first use (optional: only needed for Parquet)"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def _parquet_schema(pyarrow):
+    string, integer = pyarrow.string(), pyarrow.int64()
+    types = {"id": integer, "teacher_id": integer, "upload_id": integer, "timetable_pdf_id": integer, "semester": integer}
+    return pyarrow.schema([(name, types.get(name, string)) for name in HEADER])
+
+
+def iter_parquet(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    pyarrow = _pyarrow()
+    schema = _parquet_schema(pyarrow)
+    sink = _DrainableSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for chunk in _chunks(_rows(queryset, chunk_size), chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export(params, fmt, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Byte-chunk generator of the filtered entries in `fmt` (csv, jsonl, parquet)"""
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        _pyarrow()   # fail before the response starts streaming
+    queryset = build_queryset(params)
+    return {"csv": iter_csv, "jsonl": iter_jsonl, "parquet": iter_parquet}[fmt](queryset, chunk_size)
+
+
+def filename(fmt):
+    return f"timetable_entries_{datetime.date.today():%Y%m%d}.{FORMATS[fmt][1]}"
@@ -0,0 +1,218 @@
+"""
+Delivery of department timetable PDFs and their cached first-page previews.
+
+The content hash and preview are computed once at upload time, so serving
+and browsing never has to reopen the PDF.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date
+
+PREVIEW_SIZE = (320, 453)      # roughly A4 portrait
+PREVIEW_RESOLUTION = 60
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+logger = logging.getLogger(__name__)
+
+
+def compute_file_hash(field_file):
+    """SHA-256 of a stored file, read in chunks"""
+    digest = hashlib.sha256()
+    field_file.open("rb")
+    try:
+        for chunk in field_file.chunks(STREAM_CHUNK_SIZE):
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def compute_upload_hash(uploaded_file):
+    """SHA-256 of a file still being uploaded (before it is stored)"""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks(STREAM_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def generate_preview(pdf):
+    """Render the first page of a TimetablePDF to a small PNG and store it"""
+    import pdfplumber
+
+    with pdfplumber.open(pdf.pdf_file.path) as doc:
+        if not doc.pages:
+            return None
+        thumb = doc.pages[0].to_image(resolution=PREVIEW_RESOLUTION).original.copy()
+
+    thumb.thumbnail(PREVIEW_SIZE)
+    buffer = io.BytesIO()
+    thumb.save(buffer, format="PNG", optimize=True)
+
+    if pdf.preview_image:
+        pdf.preview_image.delete(save=False)
+    pdf.preview_image.save(f"{pdf.pk}.png", ContentFile(buffer.getvalue()), save=False)
+    return pdf.preview_image
+
+
+def _build_preview(pdf):
+    """
+    generate_preview(), recording the outcome in preview_failed (not saved).
+    A broken preview must not fail an upload or a page; the list just shows no thumbnail.
+    """
+    try:
+        built = generate_preview(pdf) is not None
+    except Exception:
+        logger.exception("Could not render a preview of timetable PDF %s", pdf.pk)
+        built = False
+    pdf.preview_failed = not built
+    return built
+
+
+def process_uploaded_pdf(pdf, file_hash=None):
+    """
+    Hash the file and build its preview. Called once after each upload;
+    pass file_hash when it was already computed while receiving the file.
+    """
+    pdf.file_hash = file_hash or compute_file_hash(pdf.pdf_file)
+    _build_preview(pdf)
+    pdf.save(update_fields=["file_hash", "preview_image", "preview_failed", "updated_at"])
+
+
+def pdf_etag(pdf):
+    """ETag from content hash + modification time"""
+    if not pdf.file_hash:
+        pdf.file_hash = compute_file_hash(pdf.pdf_file)
+        pdf.save(update_fields=["file_hash"])
+    mtime = int(os.path.getmtime(pdf.pdf_file.path))
+    return f'"{pdf.file_hash[:20]}-{mtime:x}"'
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def _parse_range(header, size):
+    """
+    Parse a single "bytes=start-end" range.
+    Returns (start, end) inclusive, None to ignore the header, or False if unsatisfiable.
+    Multi-range requests are ignored and answered with the full file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if first == "":
+        if last == "":
+            return None
+        suffix = int(last)
+        if suffix == 0:
+            return False
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _iter_file_range(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = fh.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def _sendfile_response(field_file, content_type):
+    backend = getattr(settings, "PDF_SENDFILE_BACKEND", None)
+    if backend == "nginx":
+        prefix = getattr(settings, "PDF_SENDFILE_URL_PREFIX", "/protected-media/")
+        response = HttpResponse(content_type=content_type)
+        # nginx decodes the URI, so spaces and non-ASCII in stored names must be escaped
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + quote(field_file.name)
+        return response
+    if backend == "apache":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = field_file.path
+        return response
+    return None
+
+
+def serve_file(request, field_file, etag, content_type, filename=None):
+    """
+    Serve a stored file with ETag / If-None-Match, single Range requests and
+    optional web-server offload.
+    """
+    if _etag_matches(request.headers.get("If-None-Match"), etag):
+        response = HttpResponseNotModified()
+        response["ETag"] = etag
+        return response
+
+    response = _sendfile_response(field_file, content_type)
+    if response is not None:
+        # The web server handles ranges itself
+        response["ETag"] = etag
+        return response
+
+    path = field_file.path
+    size = os.path.getsize(path)
+    byte_range = None
+    range_header = request.headers.get("Range")
+    if range_header and request.method == "GET":
+        if_range = request.headers.get("If-Range")
+        if not if_range or if_range.strip() == etag:
+            byte_range = _parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+    elif byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_iter_file_range(path, start, length), status=206, content_type=content_type)
+        response["Content-Length"] = str(length)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type, filename=filename)
+
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(os.path.getmtime(path))
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def serve_timetable_pdf(request, pdf):
+    filename = os.path.basename(pdf.pdf_file.name)
+    return serve_file(request, pdf.pdf_file, pdf_etag(pdf), "application/pdf", filename=filename)
+
+
+def serve_timetable_preview(request, pdf):
+    if pdf.preview_failed:
+        raise Http404("No preview available")
+    if not pdf.preview_image:
+        # Older uploads: try once, then the preview (or the failure) is remembered
+        built = _build_preview(pdf)
+        pdf.save(update_fields=["preview_image", "preview_failed"])
+        if not built:
+            raise Http404("No preview available")
+    etag = f'"p{pdf_etag(pdf)[1:-1]}"'
+    return serve_file(request, pdf.preview_image, etag, "image/png")
@@ -0,0 +1,485 @@
+"""
+Timetable PDF parsing and ingestion into TimetableEntry.
+
+Both personal uploads (TimetableUpload) and department PDFs (TimetablePDF)
+go through the same parser; rows are written with one bulk insert per upload.
+"""
+import datetime
+import gc
+import logging
+import os
+import re
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import MasterGrid, TimetableChangeLog, TimetableEntry
+from .schedule_cache import bump_timetable_version
+
+#  Day mapping
+DAY_MAP = {
+    "Monday": "Mo",
+    "Tuesday": "Tu",
+    "Wednesday": "We",
+    "Thursday": "Th",
+    "Friday": "Fr",
+    "Saturday": "Sa",
+}
+
+PERIOD_RE = re.compile(r"(\d{1,2}:\d{2}\s*-\s*\d{1,2}:\d{2})")
+BULK_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+class ParseMemoryExceeded(Exception):
+    """Parsing a PDF grew the worker past TIMETABLE_PARSE_MAX_MEMORY_MB"""
+
+
+#  Helper: Convert time string to HH:MM (24-hour)
+def parse_time(time_str):
+    time_str = time_str.strip()
+    try:
+        t = datetime.datetime.strptime(time_str, "%H:%M").time()
+    except:
+        hour, minute = map(int, time_str.split(":"))
+        if hour < 8:  # convert to PM if needed
+            hour += 12
+        t = datetime.time(hour, minute)
+    return t.strftime("%H:%M")
+
+
+def to_time(value):
+    """Parse a stored "HH:MM" / "HH:MM AM" string to a time, or None"""
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value.strip(), "%H:%M").time()
+    except ValueError:
+        try:
+            return datetime.datetime.strptime(value.strip(), "%I:%M %p").time()
+        except ValueError:
+            return None
+
+
+def parse_table(table):
+    """Yield one row dict per (teacher, slot) from a single extracted table"""
+    if not table:
+        return
+
+    header_row = table[0]
+    period_times = []
+
+    # Extract timings from header row
+    for col in header_row[1:]:
+        if col:
+            clean_col = col.replace("\n", " ").strip()
+            match = PERIOD_RE.search(clean_col)
+            if match:
+                start, end = match.group(1).split("-")
+                period_times.append((parse_time(start), parse_time(end)))
+            else:
+                period_times.append(("", ""))
+        else:
+            period_times.append(("", ""))
+
+    # Process each day row
+    for row in table[1:]:
+        if not row or not row[0]:
+            continue
+
+        day = row[0].strip()
+        day = DAY_MAP.get(day, day)
+
+        for idx, cell in enumerate(row[1:]):
+            if not cell or not cell.strip():
+                continue
+
+            start_time, end_time = period_times[idx]
+
+            lines = [l.strip() for l in cell.split("\n") if l.strip()]
+            if not lines:
+                continue
+
+            if len(lines) == 1:
+                # only subject, no teacher
+                subject = lines[0]
+                teacher_line = "Unknown"
+            else:
+                teacher_line = lines[-1]  # last line is teacher
+                subject = " ".join(lines[:-1])  # join all lines except last
+
+            teacher_list = [t.strip() for t in teacher_line.split("/") if t.strip()]
+            if "LAB" in subject.upper() or "_LAB" in subject.upper():
+                if idx + 1 < len(period_times):
+                    _, next_end = period_times[idx + 1]
+                    end_time = next_end
+
+            for teacher in teacher_list:
+                yield {
+                    "teacher_name": teacher,
+                    "day": day,
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "subject": subject,
+                    "room": "",
+                }
+
+
+def current_rss_kb():
+    """Resident memory of this process in KB, or None where it can't be read"""
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return psutil.Process().memory_info().rss // 1024
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _memory_ceiling_kb():
+    limit_mb = getattr(settings, "TIMETABLE_PARSE_MAX_MEMORY_MB", None)
+    return limit_mb * 1024 if limit_mb else None
+
+
+def _check_memory(stats, baseline_kb, ceiling_kb, page_number):
+    rss = current_rss_kb()
+    if rss is None or baseline_kb is None:
+        return
+    if ceiling_kb and rss - baseline_kb > ceiling_kb:
+        # pdfminer layout objects can sit in reference cycles; collect before giving up
+        gc.collect()
+        rss = current_rss_kb()
+        if rss is None:
+            return
+        if rss - baseline_kb > ceiling_kb:
+            raise ParseMemoryExceeded(
+                f"Parsing used {(rss - baseline_kb) // 1024} MB by page {page_number} "
+                f"(limit {ceiling_kb // 1024} MB)"
+            )
+    stats.peak_memory_kb = max(stats.peak_memory_kb, rss - baseline_kb)
+
+
+def parse_timetable_rows(pdf_path, template=None, stats=None, use_template=True):
+    """
+    Yield parsed row dicts for every table on every page.
+
+    Pages are processed one at a time and closed as soon as their rows are
+    out, so pdfplumber's cached layout objects never pile up across a large
+    document. Memory growth is checked after every page against
+    TIMETABLE_PARSE_MAX_MEMORY_MB (ParseMemoryExceeded); the peak is left
+    in stats.peak_memory_kb together with stats.pages.
+
+    Tables are read through the layout-template fast path (see layout_template)
+    unless use_template is False; pass a saved LayoutTemplate to skip learning,
+    and an ExtractionStats to find out which path each page took.
+    """
+    # pdfplumber is heavy (pdfminer, PIL) - only the upload paths need it
+    import pdfplumber
+    from .layout_template import ExtractionStats, extract_tables
+
+    if stats is None:
+        stats = ExtractionStats()
+    if template is not None:
+        stats.template = template
+        stats.learn_attempted = True
+
+    baseline_kb = current_rss_kb()
+    ceiling_kb = _memory_ceiling_kb()
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            try:
+                rows = [row for table in extract_tables(page, stats, template_enabled=use_template)
+                        for row in parse_table(table)]
+            finally:
+                page.close()
+            stats.pages += 1
+            _check_memory(stats, baseline_kb, ceiling_kb, page.page_number)
+            yield from rows
+
+
+def _log_parse(pdf_path, stats):
+    logger.info(
+        "Parsed %s: %d pages, peak memory +%d KB (%d template / %d fallback pages)",
+        os.path.basename(pdf_path), stats.pages, stats.peak_memory_kb,
+        stats.template_pages, stats.fallback_pages,
+    )
+    return {"pages": stats.pages, "peak_memory_kb": stats.peak_memory_kb}
+
+
+def _teacher_users():
+    from django.contrib.auth.models import User
+
+    users = list(
+        User.objects.filter(is_staff=False, is_superuser=False).values_list("id", "username")
+    )
+    # Longest (most specific) username first
+    users.sort(key=lambda item: len(item[1]), reverse=True)
+    return users
+
+
+def resolve_teacher_ids(teacher_names, users=None):
+    """
+    Map timetable teacher names to teacher User ids, using the same rule as the
+    views (username contained in the name, case-insensitive). When several
+    usernames match, the longest (most specific) one wins.
+    """
+    users = _teacher_users() if users is None else users
+    resolved = {}
+    for name in set(teacher_names):
+        lowered = name.lower()
+        resolved[name] = next((uid for uid, username in users if username and username.lower() in lowered), None)
+    return resolved
+
+
+def usernames_matching(teacher_names, users=None):
+    """Every username whose schedule (teacher_name__icontains=username) includes one of these names"""
+    users = _teacher_users() if users is None else users
+    lowered = [name.lower() for name in set(teacher_names)]
+    return {username for _, username in users if username and any(username.lower() in name for name in lowered)}
+
+
+def link_entries_to_user(user):
+    """Attach not-yet-linked entries to a newly created teacher account"""
+    from .class_reminders import mark_teachers_dirty
+
+    if not user.username:
+        return 0
+    linked = TimetableEntry.objects.filter(
+        teacher__isnull=True, teacher_name__icontains=user.username
+    ).update(teacher=user)
+    if linked:
+        mark_teachers_dirty([user.pk])
+    return linked
+
+
+def link_unassigned_entries():
+    """Resolve teacher for every unlinked entry (e.g. after a bulk teacher import)"""
+    from .class_reminders import mark_teachers_dirty
+
+    names = TimetableEntry.objects.filter(teacher__isnull=True).values_list("teacher_name", flat=True).distinct()
+    linked, teacher_ids = 0, set()
+    for name, teacher_id in resolve_teacher_ids(list(names)).items():
+        if teacher_id:
+            count = TimetableEntry.objects.filter(teacher__isnull=True, teacher_name=name).update(teacher_id=teacher_id)
+            if count:
+                linked += count
+                teacher_ids.add(teacher_id)
+    if teacher_ids:
+        mark_teachers_dirty(teacher_ids)
+    return linked
+
+
+# ========================================
+# Diff-based ingestion
+# ========================================
+
+KEY_FIELDS = ("teacher_name", "day", "start_time", "subject")
+VALUE_FIELDS = ("end_time", "room")
+MAX_LOGGED_CHANGES = 500
+
+
+def _row_key(row):
+    return tuple(row.get(f) or "" for f in KEY_FIELDS)
+
+
+def _entry_key(entry):
+    return tuple(getattr(entry, f) or "" for f in KEY_FIELDS)
+
+
+def _describe(entry_or_row):
+    get = entry_or_row.get if isinstance(entry_or_row, dict) else lambda f: getattr(entry_or_row, f)
+    return {f: get(f) or "" for f in KEY_FIELDS + VALUE_FIELDS}
+
+
+def _on_timetable_changed(teacher_names, teacher_ids, users):
+    """
+    Queue the affected teachers' reminders for reloading (in the transaction)
+    and invalidate their cached schedules only, once it commits
+    """
+    from .class_reminders import mark_teachers_dirty
+
+    if teacher_ids:
+        mark_teachers_dirty(teacher_ids)
+    usernames = usernames_matching(teacher_names, users)
+    if usernames:
+        transaction.on_commit(lambda: bump_timetable_version(usernames))
+
+
+def _tag_differs(entry, name, value):
+    attname = name if name.endswith("_id") else f"{name}_id"
+    return getattr(entry, attname) != getattr(value, "pk", value)
+
+
+def apply_rows(rows, scope, source, log_fields=None, **tags):
+    """
+    Make the entries in `scope` (a TimetableEntry queryset) match `rows`.
+
+    Rows are matched on (teacher, day, start, subject); only inserts, updates
+    of end time / room, and deletes are written. `tags` (upload, timetable_pdf,
+    department_id, semester) are set on inserted and updated rows, and on
+    unchanged rows still tagged with an older source, so every current row
+    belongs to the latest upload (deleting an older one cascades to nothing
+    still current). Returns the TimetableChangeLog recorded for `source`
+    ({"upload": ...} or {"timetable_pdf": ...}); `log_fields` (pages,
+    peak_memory_kb) are stored on it as well.
+    """
+    users = _teacher_users()
+    teacher_ids = resolve_teacher_ids((row["teacher_name"] for row in rows), users)
+    tag_fields = [name[:-3] if name.endswith("_id") else name for name in tags]
+
+    with transaction.atomic():
+        existing = {}
+        for entry in scope.order_by("pk"):
+            existing.setdefault(_entry_key(entry), []).append(entry)
+
+        inserts, updates, retagged, changes = [], [], [], []
+        for row in rows:
+            bucket = existing.get(_row_key(row))
+            teacher_id = teacher_ids[row["teacher_name"]]
+            if not bucket:
+                inserts.append(TimetableEntry(**row, **tags, teacher_id=teacher_id))
+                changes.append({"op": "insert", "new": _describe(row)})
+                continue
+            entry = bucket.pop(0)
+            changed = [f for f in VALUE_FIELDS if (getattr(entry, f) or "") != (row.get(f) or "")]
+            if teacher_id and entry.teacher_id != teacher_id:
+                changed.append("teacher")
+            if changed:
+                old = _describe(entry)
+                for f in VALUE_FIELDS:
+                    setattr(entry, f, row.get(f))
+                entry.teacher_id = teacher_id or entry.teacher_id
+                for name, value in tags.items():
+                    setattr(entry, name, value)
+                updates.append(entry)
+                changes.append({"op": "update", "old": old, "new": _describe(row)})
+            elif any(_tag_differs(entry, name, value) for name, value in tags.items()):
+                for name, value in tags.items():
+                    setattr(entry, name, value)
+                retagged.append(entry)
+        deletes = [entry for bucket in existing.values() for entry in bucket]
+        changes.extend({"op": "delete", "old": _describe(entry)} for entry in deletes)
+
+        delete_ids = [entry.pk for entry in deletes]
+        for start in range(0, len(delete_ids), BULK_BATCH_SIZE):
+            TimetableEntry.objects.filter(pk__in=delete_ids[start:start + BULK_BATCH_SIZE]).delete()
+        if updates or retagged:
+            TimetableEntry.objects.bulk_update(
+                updates + retagged, list(VALUE_FIELDS) + ["teacher"] + tag_fields, batch_size=BULK_BATCH_SIZE
+            )
+        TimetableEntry.objects.bulk_create(inserts, batch_size=BULK_BATCH_SIZE)
+
+        log = TimetableChangeLog.objects.create(
+            inserted=len(inserts),
+            updated=len(updates),
+            deleted=len(deletes),
+            unchanged=len(rows) - len(inserts) - len(updates),
+            changes=changes[:MAX_LOGGED_CHANGES],
+            **source,
+            **(log_fields or {}),
+        )
+
+        affected = inserts + updates + deletes
+        if affected:
+            _on_timetable_changed(
+                {entry.teacher_name for entry in affected},
+                {entry.teacher_id for entry in affected if entry.teacher_id},
+                users,
+            )
+    return log
+
+
+def parse_and_save_timetable(pdf_path, upload_obj, teacher_username=None):
+    """
+    Parse a personal timetable upload and diff it into TimetableEntry.
+
+    With teacher_username (a teacher uploading their own timetable) only that
+    teacher's personal-upload rows are touched; otherwise (admin upload) the
+    personal-upload rows of every teacher named in the PDF are revised.
+
+    If parsing hits the memory ceiling, upload_obj and its file are deleted
+    (nothing was written for it) before ParseMemoryExceeded propagates.
+    """
+    from .layout_template import ExtractionStats
+
+    stats = ExtractionStats()
+    rows = parse_timetable_rows(pdf_path, stats=stats)
+    try:
+        if teacher_username:
+            # Filter while streaming so other teachers' rows are never held
+            needle = teacher_username.lower()
+            rows = [row for row in rows if needle in row["teacher_name"].lower()]
+        else:
+            rows = list(rows)
+    except ParseMemoryExceeded:
+        upload_obj.uploaded_file.delete(save=False)
+        upload_obj.delete()
+        raise
+    if not teacher_username:
+        return apply_upload_rows(rows, upload_obj, _log_parse(pdf_path, stats))
+    scope = TimetableEntry.objects.filter(timetable_pdf__isnull=True, teacher_name__icontains=teacher_username)
+    return apply_rows(rows, scope, {"upload": upload_obj}, _log_parse(pdf_path, stats), upload=upload_obj)
+
+
+def parse_pdf_rows(pdf_path):
+    """
+    (rows, log fields) of a whole timetable PDF. Picklable in and out, so
+    batch ingestion runs it in worker processes and applies the rows itself.
+    """
+    from .layout_template import ExtractionStats
+
+    stats = ExtractionStats()
+    rows = list(parse_timetable_rows(pdf_path, stats=stats))
+    return rows, _log_parse(pdf_path, stats)
+
+
+def apply_upload_rows(rows, upload_obj, log_fields=None):
+    """Diff an admin upload's rows into the personal-upload rows of every teacher it names"""
+    scope = TimetableEntry.objects.filter(
+        timetable_pdf__isnull=True, teacher_name__in={row["teacher_name"] for row in rows}
+    )
+    return apply_rows(rows, scope, {"upload": upload_obj}, log_fields, upload=upload_obj)
+
+
+def ingest_department_pdf(timetable_pdf):
+    """
+    Parse a department TimetablePDF into TimetableEntry rows tagged with its
+    Department and Semester, pack the same rows into its MasterGrid and
+    refresh the workload of every teacher the file adds or drops.
+    Idempotent: re-ingesting the same (or a revised) file only writes the
+    rows that differ.
+    """
+    from .layout_template import ExtractionStats, LayoutTemplate
+    from .master_grid import save_grid
+    from .workload import refresh_workloads
+
+    semester = timetable_pdf.semester
+    department = semester.department
+    stats = ExtractionStats()
+    saved = LayoutTemplate.from_dict(department.layout_template)
+    rows = list(parse_timetable_rows(timetable_pdf.pdf_file.path, template=saved, stats=stats))
+    if saved is None and stats.learned:
+        department.layout_template = stats.template.to_dict()
+        department.save(update_fields=["layout_template"])
+    elif saved is not None and stats.failures and not stats.template_pages:
+        # The department's layout changed: forget the template so the next upload relearns it
+        department.layout_template = None
+        department.save(update_fields=["layout_template"])
+    change_log = apply_rows(
+        rows,
+        TimetableEntry.objects.filter(timetable_pdf=timetable_pdf),
+        {"timetable_pdf": timetable_pdf},
+        _log_parse(timetable_pdf.pdf_file.path, stats),
+        timetable_pdf=timetable_pdf,
+        department_id=semester.department_id,
+        semester=semester,
+    )
+    previous = MasterGrid.objects.filter(timetable_pdf=timetable_pdf).values_list("teachers", flat=True).first() or []
+    grid = save_grid(timetable_pdf, rows)
+    refresh_workloads(semester.department_id, set(previous) | set(grid.teachers))
+    return change_log
@@ -25,11 +25,15 @@ urlpatterns = [
     path('admin-dashboard/', views.admin_dashboard_view, name='admin_dashboard'),
     path('admin/teachers/', views.admin_teachers_view, name='admin_teachers'),
     path('admin/teachers/add/', views.admin_add_teacher_view, name='admin_add_teacher'),
+    path('admin/teachers/import/', views.admin_import_teachers_view, name='admin_import_teachers'),
     path('admin/teachers/<int:user_id>/toggle/', views.admin_toggle_teacher_status, name='admin_toggle_teacher'),
     path('admin/teachers/<int:user_id>/delete/', views.admin_delete_teacher, name='admin_delete_teacher'),
     path('admin/timetables/', views.admin_timetables_view, name='admin_timetables'),
     path('admin/timetables/upload/', views.admin_upload_timetable_view, name='admin_upload_timetable'),
     path('admin/chart-data/', views.admin_chart_data, name='admin_chart_data'),
+    path('admin/cache-stats/', views.admin_cache_stats, name='admin_cache_stats'),
+    path('admin/llm-usage/', views.admin_llm_usage_view, name='admin_llm_usage'),
+    path('admin/export/entries.<str:fmt>', views.admin_export_entries_view, name='admin_export_entries'),
     # Django Admin (must be after custom admin routes)
     # ========================================
     # NEW MODULE: Department Timetable PDFs URLs
@@ -37,6 +41,8 @@ urlpatterns = [
     path('departments/', views.departments_list_view, name='departments_list'),
     path('departments/<int:dept_id>/', views.semesters_list_view, name='semesters_list'),
     path('departments/<int:dept_id>/<int:semester_id>/', views.timetable_pdfs_list_view, name='timetable_pdfs_list'),
+    path('timetable-pdfs/<int:pdf_id>/file/', views.timetable_pdf_file_view, name='timetable_pdf_file'),
+    path('timetable-pdfs/<int:pdf_id>/preview/', views.timetable_pdf_preview_view, name='timetable_pdf_preview'),
     
     # Admin department timetable upload - MUST be before admin.site.urls
     path('admin/departments/upload/', views.admin_upload_department_timetable_view, name='admin_upload_department_timetable'),
@@ -50,15 +56,26 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('upload/', views.upload_view, name='upload'),
+    path('uploads/', views.chunked_upload_start_view, name='chunked_upload_start'),
+    path('uploads/<uuid:upload_id>/', views.chunked_upload_view, name='chunked_upload'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('assistant/', views.chatbot_view, name='chatbot'),
     path('schedule/', views.schedule_lookup_view, name='schedule_lookup'),
     path('profile/', views.profile_view, name='profile'),
     path('notifications/', views.notification_center_view, name='notifications'),
+    path('notifications/stream/', views.reminder_stream_view, name='reminder_stream'),
+    path('profile/calendar/reset/', views.calendar_feed_rotate_view, name='calendar_feed_rotate'),
+    path('calendar/<str:token>.ics', views.calendar_feed_view, name='calendar_feed'),
 
     
     # AJAX API endpoints
     path('api/get-semesters/', views.get_semesters_ajax, name='get_semesters_ajax'),
+    path('api/department-tree/', views.department_tree_api, name='department_tree_api'),
+    path('api/schedules/batch/', views.schedule_batch_api, name='schedule_batch_api'),
+    path('api/master-grid/', views.master_grid_api, name='master_grid_api'),
+    path('api/substitutes/', views.substitutes_api, name='substitutes_api'),
+    path('api/workload/', views.workload_report_api, name='workload_report_api'),
+    path('api/timetable-search/', views.timetable_search_api, name='timetable_search_api'),
 ]
 
 # Serve media files in development
@@ -3,35 +3,38 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from collections import OrderedDict
-import pdfplumber
-import re
+from collections import OrderedDict, namedtuple
 import datetime
-from .models import TimetableUpload, TimetableEntry, TeacherProfile
+from .models import TimetableUpload, TimetableEntry, TeacherProfile, ChunkedUpload
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.urls import reverse
+from django.conf import settings
+from django.views.decorators.http import condition, require_POST, require_http_methods
+from django.views.decorators.csrf import csrf_exempt
+from django.middleware.csrf import CsrfViewMiddleware
+import copy
+import json
+from . import llm
+from . import calendar_feed
+from .schedule_cache import timetable_version, cached_fragment, fragment_stats
+from .teacher_import import import_teachers
+from .auth_cache import get_teacher_profile
+from . import schedule_api
+from . import class_reminders
+from . import chunked_upload
+from . import query_cache
+from . import query_log
+from . import rate_limit
+from . import timetable_export
+import time
+from .timetable_parser import (
+    DAY_MAP, ParseMemoryExceeded, parse_and_save_timetable, ingest_department_pdf, to_time as _to_time,
+)
 
 
-
-from dotenv import load_dotenv
-from groq import Groq
-import os
-load_dotenv()
-
-# Groq client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-
-#  Day mapping
-DAY_MAP = {
-    "Monday": "Mo",
-    "Tuesday": "Tu",
-    "Wednesday": "We",
-    "Thursday": "Th",
-    "Friday": "Fr",
-    "Saturday": "Sa",
-}
 DAY_LABELS = {abbr: day for day, abbr in DAY_MAP.items()}
 FULL_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
 
@@ -69,18 +72,6 @@ def _build_schedule_data(entries):
     return {day: slots for day, slots in schedule.items() if slots}
 
 
-def _to_time(value):
-    if not value:
-        return None
-    try:
-        return datetime.datetime.strptime(value.strip(), "%H:%M").time()
-    except ValueError:
-        try:
-            return datetime.datetime.strptime(value.strip(), "%I:%M %p").time()
-        except ValueError:
-            return None
-
-
 def _combine_with_date(date_obj, time_obj):
     if not (date_obj and time_obj):
         return None
@@ -162,89 +153,46 @@ def _weekly_plan(entries):
     return {"days": plan, "total": total}
 
 
-#  Helper: Convert time string to HH:MM (24-hour)
-def parse_time(time_str):
-    time_str = time_str.strip()
-    try:
-        t = datetime.datetime.strptime(time_str, "%H:%M").time()
-    except:
-        hour, minute = map(int, time_str.split(":"))
-        if hour < 8:  # convert to PM if needed
-            hour += 12
-        t = datetime.time(hour, minute)
-    return t.strftime("%H:%M")
-
-
-
-def parse_and_save_timetable(pdf_path, upload_obj):
-    # import pdfplumber, re
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            for table in tables:
-                if not table:
-                    continue
-
-                header_row = table[0]
-                period_times = []
-
-                # Extract timings from header row
-                for col in header_row[1:]:
-                    if col:
-                        clean_col = col.replace("\n", " ").strip()
-                        match = re.search(r"(\d{1,2}:\d{2}\s*-\s*\d{1,2}:\d{2})", clean_col)
-                        if match:
-                            start, end = match.group(1).split("-")
-                            period_times.append((parse_time(start), parse_time(end)))
-                        else:
-                            period_times.append(("", ""))
-                    else:
-                        period_times.append(("", ""))
-
-                # Process each day row
-                for row in table[1:]:
-                    if not row or not row[0]:
-                        continue
-
-                    day = row[0].strip()
-                    day = DAY_MAP.get(day, day)
-
-                    for idx, cell in enumerate(row[1:]):
-                        if not cell or not cell.strip():
-                            continue
-
-                        start_time, end_time = period_times[idx]
-
-                        lines = [l.strip() for l in cell.split("\n") if l.strip()]
-                        if not lines:
-                            continue
-
-                        if len(lines) == 1:
-                            # only subject, no teacher
-                            subject = lines[0]
-                            teacher_line = "Unknown"
-                        else:
-                            teacher_line = lines[-1]  # last line is teacher
-                            subject = " ".join(lines[:-1])  # join all lines except last
-
-                        teacher_list = [t.strip() for t in teacher_line.split("/") if t.strip()]
-                        if "LAB" in subject.upper() or "_LAB" in subject.upper():
-                            if idx + 1 < len(period_times):
-                                _, next_end = period_times[idx + 1]
-                                end_time = next_end 
-
-                        for teacher in teacher_list:
-                            TimetableEntry.objects.create(
-                                upload=upload_obj,
-                                teacher_name=teacher,
-                                day=day,
-                                start_time=start_time,
-                                end_time=end_time,
-                                subject=subject,
-                                room=""
-                            )
+# Picklable stand-in for TimetableEntry, enough for _next_class_summary
+_Slot = namedtuple("_Slot", "day start_time end_time subject room")
 
 
+def _dashboard_fragment(user):
+    teacher_entries = list(_get_teacher_entries(user))
+    schedule_data = _build_schedule_data(teacher_entries)
+    return {
+        "total_slots": len(teacher_entries),
+        "teaching_days": len(schedule_data),
+        "has_timetable": bool(teacher_entries),
+    }
+
+
+def _schedule_grid_fragment(user):
+    schedule_data = _build_schedule_data(_get_teacher_entries(user))
+    return {"schedule_data": schedule_data, "has_timetable": bool(schedule_data)}
+
+
+def _notifications_fragment(user):
+    """Everything on the notification page that only changes with the timetable or the date"""
+    teacher_entries = list(_get_teacher_entries(user))
+    if not teacher_entries:
+        return {"has_timetable": False, "today_slots": [], "today_classes": [], "tomorrow_classes": [],
+                "today_free_slots": [], "weekly_plan": None}
+    today = timezone.localdate()
+    tomorrow = today + datetime.timedelta(days=1)
+    today_abbr = DAY_MAP.get(today.strftime("%A"), today.strftime("%A"))
+    return {
+        "has_timetable": True,
+        "today_slots": [
+            _Slot(e.day, e.start_time, e.end_time, e.subject, e.room)
+            for e in teacher_entries if e.day == today_abbr
+        ],
+        "today_classes": _classes_for_day(teacher_entries, today.strftime("%A")),
+        "tomorrow_classes": _classes_for_day(teacher_entries, tomorrow.strftime("%A")),
+        "today_free_slots": _free_slots_for_day(teacher_entries, today.strftime("%A")),
+        "weekly_plan": _weekly_plan(teacher_entries),
+    }
+
 
 #  Welcome page
 def welcome_view(request):
@@ -316,13 +264,18 @@ def upload_view(request):
 
             timetable_upload = TimetableUpload.objects.create(
                 uploader=request.user,
-                uploaded_file=uploaded_file
+                uploaded_file=uploaded_file,
+                file_hash=timetable_files.compute_upload_hash(uploaded_file),
             )
 
-            # Delete old entries for this teacher
-            TimetableEntry.objects.filter(teacher_name__icontains=request.user.username).delete()
-
-            parse_and_save_timetable(timetable_upload.uploaded_file.path, timetable_upload)
+            # Only this teacher's rows that actually changed are written
+            try:
+                parse_and_save_timetable(
+                    timetable_upload.uploaded_file.path, timetable_upload, teacher_username=request.user.username
+                )
+            except ParseMemoryExceeded:
+                messages.error(request, "This PDF is too large to process. Please upload only your own timetable pages.")
+                return redirect("upload")
             messages.success(request, "Timetable uploaded & parsed successfully!")
             return redirect("chatbot")
 
@@ -333,19 +286,126 @@ def upload_view(request):
 
 
 @login_required
-def dashboard_view(request):
-    teacher_entries_qs = _get_teacher_entries(request.user)
-    teacher_entries = list(teacher_entries_qs)
-    schedule_data = _build_schedule_data(teacher_entries)
+@require_POST
+def chunked_upload_start_view(request):
+    """
+    Announce a resumable PDF upload.
+    POST {"filename", "size", "sha256"?, "kind": "personal"|"admin"|"department", "department"?, "semester"?, "title"?}
+    """
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"error": "Body must be JSON."}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "Body must be a JSON object."}, status=400)
 
-    context = {
-        "total_slots": len(teacher_entries),
-        "teaching_days": len(schedule_data),
-        "has_timetable": bool(teacher_entries),
-    }
+    try:
+        upload = chunked_upload.start_upload(request.user, data)
+    except chunked_upload.UploadError as exc:
+        return JsonResponse({"error": str(exc)}, status=exc.status)
+    payload = chunked_upload.status_payload(upload)
+    payload["upload_url"] = reverse("chunked_upload", args=[upload.pk])
+    return JsonResponse(payload, status=201)
+
+
+def _csrf_header_failure(request):
+    """
+    CSRF check of an unsafe request against the X-CSRFToken header only.
+    CsrfViewMiddleware reads request.POST for a POST, which would stream the
+    body into the upload handler; a copy presented as PUT is checked the same
+    way (cookie, Origin / Referer, header token) without touching the body.
+    """
+    probe = copy.copy(request)
+    probe.method = "PUT"
+    return CsrfViewMiddleware(lambda request: None).process_view(probe, None, (), {})
+
+
+@csrf_exempt  # checked from the header in the view: the body must not be read before the guards
+@login_required
+@require_http_methods(["GET", "HEAD", "POST", "DELETE"])
+def chunked_upload_view(request, upload_id):
+    """
+    GET: offset to resume from. DELETE: cancel.
+    POST: one chunk as multipart field "chunk", with Upload-Offset and X-CSRFToken headers.
+    """
+    try:
+        upload = ChunkedUpload.objects.get(pk=upload_id, user=request.user)
+    except ChunkedUpload.DoesNotExist:
+        raise Http404("No such upload")
+    if request.method in ("GET", "HEAD"):
+        response = JsonResponse(chunked_upload.status_payload(upload))
+        response["Upload-Offset"] = str(upload.offset)
+        response["Cache-Control"] = "no-store"
+        return response
+
+    rejected = _csrf_header_failure(request)
+    if rejected is not None:
+        return rejected
+    if request.method == "DELETE":
+        chunked_upload.discard(upload)
+        return HttpResponse(status=204)
+
+    # Offset, size and lock are settled from the headers; only then is the
+    # handler installed and the body streamed into the partial file
+    try:
+        chunked_upload.check_offset(upload, request.headers.get("Upload-Offset"))
+        chunked_upload.check_content_length(upload, request.META.get("CONTENT_LENGTH"))
+        with chunked_upload.chunk_lock(upload):
+            upload.refresh_from_db()  # a chunk may have landed while we waited for the lock
+            chunked_upload.check_offset(upload, request.headers.get("Upload-Offset"))
+            handler = chunked_upload.ChunkAppendHandler(upload, request)
+            request.upload_handlers = [handler]
+            request.FILES  # streams the chunk through ChunkAppendHandler
+            upload = chunked_upload.commit_chunk(upload, handler)
+    except chunked_upload.UploadError as exc:
+        response = JsonResponse({"error": str(exc), "offset": upload.offset}, status=exc.status)
+        response["Upload-Offset"] = str(upload.offset)
+        return response
+
+    response = JsonResponse(chunked_upload.status_payload(upload))
+    response["Upload-Offset"] = str(upload.offset)
+    return response
+
+
+@login_required
+def dashboard_view(request):
+    context = dict(cached_fragment("dashboard", request.user, lambda: _dashboard_fragment(request.user)))
+    context["timetable_version"] = timetable_version(request.user.username)
     return render(request, "dashboard.html", _with_theme(context))
 
 
+def _assistant_limit(request):
+    """'rate_limited' / 'over_quota' if this query must not reach the LLM, else None"""
+    if rate_limit.check_request(request) is not None:
+        return "rate_limited"
+    left = rate_limit.quota_left(request.user)
+    if left is not None and left <= 0:
+        return "over_quota"
+    return None
+
+
+def _local_answer(entries, day_name=None):
+    """Plain answer straight from the timetable, used when the LLM is off limits"""
+    note = "(Quick answer from your timetable - the AI assistant is limited for your account right now.)"
+    ordered = sorted(entries, key=lambda e: _to_time(e.start_time) or datetime.time.max)
+    if day_name:
+        if not ordered:
+            return f"No classes scheduled for {day_name}.\n\n{note}"
+        lines = [f"Your classes on {day_name}:"]
+        lines += [f"- {e.start_time}-{e.end_time}: {e.subject or 'Class'} ({e.room or 'Room not specified'})" for e in ordered]
+        return "\n".join(lines) + f"\n\n{note}"
+
+    by_day = OrderedDict((DAY_MAP[day], []) for day in FULL_DAYS)
+    for e in ordered:
+        by_day.setdefault(e.day, []).append(e)
+    lines = [f"You have {len(ordered)} classes this week:"]
+    for abbr, day_entries in by_day.items():
+        if day_entries:
+            slots = ", ".join(f"{e.start_time} {e.subject or 'Class'}" for e in day_entries)
+            lines.append(f"- {DAY_LABELS.get(abbr, abbr)} ({len(day_entries)}): {slots}")
+    return "\n".join(lines) + f"\n\n{note}"
+
+
 #ye groq ka hai
 
 @login_required
@@ -353,8 +413,11 @@ def chatbot_view(request):
     answer = None
     teacher_entries_qs = _get_teacher_entries(request.user)
 
+    started = time.perf_counter()
+    answered_by = "local"
     if not teacher_entries_qs.exists():
         answer = "No timetable data found. Please upload your timetable first."
+        answered_by = "no_data"
     elif request.method == "POST":
         teacher_entries = list(teacher_entries_qs)
         query = request.POST.get("query")
@@ -373,16 +436,19 @@ def chatbot_view(request):
         # Smart filtering: If query is about a specific day, filter timetable accordingly
         query_lower = query.lower()
         filtered_entries = teacher_entries
+        target_day = None
         
         # Check for specific day queries and filter timetable
         if any(word in query_lower for word in ["today", "aaj", "आज"]):
             # Filter for today only
             today_abbr = DAY_MAP.get(current_day_name, current_day_name)
             filtered_entries = [e for e in teacher_entries if e.day == today_abbr]
+            target_day = current_day_name
         elif any(word in query_lower for word in ["yesterday", "parson", "परसों"]):
             # Filter for yesterday only
             yesterday_abbr = DAY_MAP.get(yesterday_day_name, yesterday_day_name)
             filtered_entries = [e for e in teacher_entries if e.day == yesterday_abbr]
+            target_day = yesterday_day_name
         elif "kal" in query_lower or "कल" in query_lower:
             # "kal" is ambiguous - check context
             # If query has past tense words or "yesterday", it's yesterday
@@ -390,14 +456,17 @@ def chatbot_view(request):
             if any(word in query_lower for word in ["yesterday", "was", "thi", "थी", "the"]):
                 yesterday_abbr = DAY_MAP.get(yesterday_day_name, yesterday_day_name)
                 filtered_entries = [e for e in teacher_entries if e.day == yesterday_abbr]
+                target_day = yesterday_day_name
             else:
                 # Default: "kal" means tomorrow in schedule context
                 tomorrow_abbr = DAY_MAP.get(tomorrow_day_name, tomorrow_day_name)
                 filtered_entries = [e for e in teacher_entries if e.day == tomorrow_abbr]
+                target_day = tomorrow_day_name
         elif "tomorrow" in query_lower:
             # Filter for tomorrow only
             tomorrow_abbr = DAY_MAP.get(tomorrow_day_name, tomorrow_day_name)
             filtered_entries = [e for e in teacher_entries if e.day == tomorrow_abbr]
+            target_day = tomorrow_day_name
 
         # Fast lookup: If filtered entries are empty, return directly without LLM call
         if not filtered_entries and any(word in query_lower for word in ["today", "tomorrow", "yesterday", "kal", "aaj", "कल", "आज"]):
@@ -458,20 +527,29 @@ def chatbot_view(request):
             Provide a clear, accurate answer based on the timetable data above.
             """
 
-            # Groq LLaMA call (only if answer not already set)
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",   # ✅ fast model
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            answer = response.choices[0].message.content
+            # Groq LLaMA call (only if answer not already set), unless this or a
+            # paraphrase of it was already answered today for this timetable
+            answer = query_cache.lookup("chatbot", request.user, query)
+            answered_by = "query_cache"
+            # Only queries about to reach the LLM are charged to the rate limits
+            limited = _assistant_limit(request) if answer is None else None
+            if limited:
+                answer = _local_answer(filtered_entries, target_day)
+                answered_by = limited
+                rate_limit.record_limited(request.user, limited)
+            elif answer is None:
+                answer = llm.ask(prompt, on_usage=lambda usage: rate_limit.record_usage(request.user, usage))
+                answered_by = "llm"
+                query_cache.store("chatbot", request.user, query, answer)
             
             # Track teacher activity
-            if not request.user.is_staff and not request.user.is_superuser:
-                profile, created = TeacherProfile.objects.get_or_create(user=request.user)
+            profile = _get_teacher_profile_safe(request.user)
+            if profile:
                 profile.update_activity()
 
     query = request.POST.get("query", "") if request.method == "POST" else ""
+    if request.method == "POST":
+        query_log.record(request.user, "chatbot", answered_by, query, (time.perf_counter() - started) * 1000)
     
     context = {
         "answer": answer,
@@ -483,8 +561,8 @@ def chatbot_view(request):
 
 @login_required
 def schedule_lookup_view(request):
-    teacher_entries = list(_get_teacher_entries(request.user))
-    schedule_data = _build_schedule_data(teacher_entries)
+    grid = cached_fragment("schedule_grid", request.user, lambda: _schedule_grid_fragment(request.user))
+    schedule_data = grid["schedule_data"]
 
     # Prepare days list for dropdown
     days = [(DAY_MAP.get(day, day), day) for day in FULL_DAYS]
@@ -500,7 +578,8 @@ def schedule_lookup_view(request):
 
     context = {
         "schedule_data": schedule_data,
-        "has_timetable": bool(teacher_entries),
+        "has_timetable": grid["has_timetable"],
+        "timetable_version": timetable_version(request.user.username),
         "days": days,
         "selected_day": selected_day,
         "selected_day_name": selected_day_name,
@@ -512,20 +591,58 @@ def schedule_lookup_view(request):
 @login_required
 def profile_view(request):
     context = {"user": request.user}
+    profile = _get_teacher_profile_safe(request.user)
+    if profile:
+        token = calendar_feed.get_or_create_token(profile)
+        context["calendar_feed_url"] = request.build_absolute_uri(reverse("calendar_feed", args=[token]))
     return render(request, "profile.html", _with_theme(context))
 
 
+@login_required
+@require_POST
+def calendar_feed_rotate_view(request):
+    """Issue a new calendar feed URL (e.g. after it was shared by mistake)"""
+    profile = _get_teacher_profile_safe(request.user)
+    if profile:
+        calendar_feed.rotate_token(profile)
+        messages.success(request, "Calendar link reset. Re-subscribe with the new link.")
+    return redirect("profile")
+
+
+def _calendar_feed_etag(request, token):
+    owner = calendar_feed.resolve_token(token)
+    if owner is None:
+        return None
+    user_id, username = owner
+    return calendar_feed.feed_etag(user_id, timetable_version(username))
+
+
+@condition(etag_func=_calendar_feed_etag)
+def calendar_feed_view(request, token):
+    """Tokenized .ics subscription feed (no login: calendar apps can't log in)"""
+    owner = calendar_feed.resolve_token(token)
+    if owner is None:
+        raise Http404("Unknown calendar feed")
+    etag, body = calendar_feed.get_feed(*owner)
+    response = HttpResponse(body, content_type="text/calendar; charset=utf-8")
+    response["ETag"] = etag
+    response["Cache-Control"] = f"private, max-age={settings.TIMETABLE_CALENDAR_MAX_AGE}"
+    response["Content-Disposition"] = 'inline; filename="timetable.ics"'
+    return response
+
+
 @login_required
 def notification_center_view(request):
-    teacher_entries_qs = _get_teacher_entries(request.user)
-    teacher_entries = list(teacher_entries_qs)
-    has_timetable = bool(teacher_entries)
+    fragment = cached_fragment("notifications", request.user, lambda: _notifications_fragment(request.user))
+    has_timetable = fragment["has_timetable"]
     today = timezone.localdate()
     tomorrow = today + datetime.timedelta(days=1)
     tomorrow_day_name = tomorrow.strftime("%A")  # Define outside POST block for GET requests
 
     answer = None
     if request.method == "POST":
+        started = time.perf_counter()
+        teacher_entries = list(_get_teacher_entries(request.user))
         query = request.POST.get("query")
         # Reuse logic from chatbot_view for generating answer
         # Ideally this logic should be in a helper function, but for now we duplicate to ensure same-page response
@@ -543,16 +660,20 @@ def notification_center_view(request):
         # For now, let's use the full logic to ensure quality
         query_lower = query.lower()
         filtered_entries = teacher_entries
+        target_day = None
         
         if any(word in query_lower for word in ["today", "aaj", "आज"]):
             today_abbr = DAY_MAP.get(current_day_name, current_day_name)
             filtered_entries = [e for e in teacher_entries if e.day == today_abbr]
+            target_day = current_day_name
         elif any(word in query_lower for word in ["yesterday", "parson", "परसों"]):
             yesterday_abbr = DAY_MAP.get(yesterday_day_name, yesterday_day_name)
             filtered_entries = [e for e in teacher_entries if e.day == yesterday_abbr]
+            target_day = yesterday_day_name
         elif "tomorrow" in query_lower or ("kal" in query_lower and not any(w in query_lower for w in ["yesterday", "was"])):
              tomorrow_abbr = DAY_MAP.get(tomorrow_day_name, tomorrow_day_name)
              filtered_entries = [e for e in teacher_entries if e.day == tomorrow_abbr]
+             target_day = tomorrow_day_name
 
         # Build complete timetable for better context
         complete_timetable_text = "\n".join([
@@ -592,19 +713,29 @@ def notification_center_view(request):
         """
         
         try:
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=[{"role": "user", "content": prompt}]
-            )
-            answer = response.choices[0].message.content
+            answer = query_cache.lookup("notifications", request.user, query)
+            answered_by = "query_cache"
+            # Only queries about to reach the LLM are charged to the rate limits
+            limited = _assistant_limit(request) if answer is None else None
+            if limited:
+                answer = _local_answer(filtered_entries, target_day)
+                answered_by = limited
+                rate_limit.record_limited(request.user, limited)
+            elif answer is None:
+                answer = llm.ask(prompt, on_usage=lambda usage: rate_limit.record_usage(request.user, usage))
+                answered_by = "llm"
+                query_cache.store("notifications", request.user, query, answer)
         except Exception as e:
             answer = "Sorry, I couldn't process that right now."
+            answered_by = "error"
+        query_log.record(request.user, "notifications", answered_by, query, (time.perf_counter() - started) * 1000)
 
-    next_class = _next_class_summary(teacher_entries) if has_timetable else None
-    today_classes = _classes_for_day(teacher_entries, today.strftime("%A")) if has_timetable else []
-    tomorrow_classes = _classes_for_day(teacher_entries, tomorrow.strftime("%A")) if has_timetable else []
-    today_free_slots = _free_slots_for_day(teacher_entries, today.strftime("%A")) if has_timetable else []
-    weekly_plan = _weekly_plan(teacher_entries) if has_timetable else None
+    # Only the countdown is time-dependent; everything else comes from the cached fragment
+    next_class = _next_class_summary(fragment["today_slots"]) if has_timetable else None
+    today_classes = fragment["today_classes"]
+    tomorrow_classes = fragment["tomorrow_classes"]
+    today_free_slots = fragment["today_free_slots"]
+    weekly_plan = fragment["weekly_plan"]
 
     shortcut_queries = [
         {"label": "Today’s Timetable", "description": "Get a quick list of all classes today.", "query": "Show me today's full timetable."},
@@ -636,6 +767,7 @@ def notification_center_view(request):
         "ai_prompts": ai_prompts,
         "answer": answer,
         "tomorrow_abbr": tomorrow_abbr,
+        "timetable_version": timetable_version(request.user.username),
     }
     return render(request, "notifications.html", _with_theme(context))
 
@@ -643,6 +775,40 @@ def notification_center_view(request):
 
 
 
+@login_required
+def reminder_stream_view(request):
+    """
+    Server-sent events: "class in N minutes" reminders pushed by the reminder scheduler.
+    Under WSGI each open stream holds a worker, so streams end after
+    REMINDER_SSE_MAX_SECONDS (EventSource reconnects); run ASGI or threaded
+    workers before raising it.
+    """
+    user_id = request.user.id
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.GET.get("last_id") or 0)
+    except ValueError:
+        last_id = 0
+    max_seconds = getattr(settings, "REMINDER_SSE_MAX_SECONDS", 10)
+    poll_seconds = getattr(settings, "REMINDER_SSE_POLL_SECONDS", 2)
+
+    def stream():
+        seen = last_id
+        # Short-lived stream so sync workers aren't pinned; EventSource reconnects with Last-Event-ID
+        yield f"retry: {poll_seconds * 1000}\n\n"
+        deadline = time.monotonic() + max_seconds
+        while time.monotonic() < deadline:
+            for message in class_reminders.inbox_since(user_id, seen):
+                seen = message["id"]
+                yield f"id: {seen}\nevent: class-reminder\ndata: {json.dumps(message)}\n\n"
+            yield ": ping\n\n"
+            time.sleep(poll_seconds)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 # Logout
 def logout_view(request):
     logout(request)
@@ -659,11 +825,8 @@ from django.contrib.admin.views.decorators import staff_member_required
 
 # Helper function to safely get/create TeacherProfile (only for non-admin users)
 def _get_teacher_profile_safe(user):
-    """Get or create TeacherProfile only for non-admin users"""
-    if user.is_staff or user.is_superuser:
-        return None
-    profile, created = TeacherProfile.objects.get_or_create(user=user)
-    return profile
+    """Get or create TeacherProfile only for non-admin users (cached per request and across requests)"""
+    return get_teacher_profile(user)
 
 # Admin Dashboard Views
 @staff_member_required
@@ -790,19 +953,38 @@ def admin_add_teacher_view(request):
     return render(request, "admin_add_teacher.html", _with_theme())
 
 
+@staff_member_required
+def admin_import_teachers_view(request):
+    """Bulk-create teachers from an uploaded CSV; returns a per-row JSON report"""
+    if request.method != "POST":
+        return JsonResponse({"error": "POST a CSV file as 'csv_file'."}, status=405)
+
+    csv_file = request.FILES.get("csv_file")
+    if not csv_file:
+        return JsonResponse({"error": "No CSV file uploaded."}, status=400)
+    if not csv_file.name.lower().endswith(".csv"):
+        return JsonResponse({"error": "Only CSV files are allowed."}, status=400)
+
+    dry_run = request.POST.get("dry_run") in ("1", "true", "on")
+    try:
+        result = import_teachers(csv_file, dry_run=dry_run)
+    except UnicodeDecodeError:
+        return JsonResponse({"error": "CSV must be UTF-8 encoded."}, status=400)
+    return JsonResponse(result, status=200 if not result["failed"] else 207)
+
+
 @staff_member_required
 def admin_toggle_teacher_status(request, user_id):
     """Toggle teacher active/inactive status"""
     try:
         user = User.objects.get(id=user_id, is_staff=False, is_superuser=False)
-        profile = _get_teacher_profile_safe(user)
-        if profile:
+        # Writes go to a fresh, locked row; the cached profile is for reads only
+        with transaction.atomic():
+            profile, created = TeacherProfile.objects.select_for_update().get_or_create(user=user)
             profile.is_active = not profile.is_active
-            profile.save()
-            status = "activated" if profile.is_active else "deactivated"
-            messages.success(request, f"Teacher {user.username} {status} successfully!")
-        else:
-            messages.error(request, "Teacher profile not found!")
+            profile.save(update_fields=["is_active"])
+        status = "activated" if profile.is_active else "deactivated"
+        messages.success(request, f"Teacher {user.username} {status} successfully!")
     except User.DoesNotExist:
         messages.error(request, "Teacher not found!")
     
@@ -867,11 +1049,16 @@ def admin_upload_timetable_view(request):
             
             timetable_upload = TimetableUpload.objects.create(
                 uploader=request.user,
-                uploaded_file=uploaded_file
+                uploaded_file=uploaded_file,
+                file_hash=timetable_files.compute_upload_hash(uploaded_file),
             )
             
             # Parse timetable
-            parse_and_save_timetable(timetable_upload.uploaded_file.path, timetable_upload)
+            try:
+                parse_and_save_timetable(timetable_upload.uploaded_file.path, timetable_upload)
+            except ParseMemoryExceeded as exc:
+                messages.error(request, f"Timetable not parsed: {exc}.")
+                return redirect("admin_upload_timetable")
             messages.success(request, "Timetable uploaded & parsed successfully!")
             return redirect("admin_timetables")
     
@@ -895,15 +1082,60 @@ def admin_chart_data(request):
     return JsonResponse({
         'active': active_count,
         'inactive': inactive_count,
+        # Assistant load per hour / day, read from the rollup tables only
+        'queries': query_log.chart_series(),
+    })
+
+
+@staff_member_required
+def admin_cache_stats(request):
+    """API endpoint for per-teacher fragment cache hit rates and coalesced / cached LLM calls"""
+    return JsonResponse({
+        "fragments": fragment_stats(),
+        "llm": llm.flight_stats(),
+        "queries": query_cache.query_cache_stats(),
     })
 
 
+@staff_member_required
+def admin_export_entries_view(request, fmt):
+    """
+    Stream every matching TimetableEntry as CSV / JSON Lines / Parquet.
+    GET ?upload=&timetable_pdf=&department=&semester=&from=YYYY-MM-DD&to=YYYY-MM-DD
+    """
+    try:
+        chunks = timetable_export.export(request.GET, fmt)
+    except timetable_export.ExportError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    response = StreamingHttpResponse(chunks, content_type=timetable_export.FORMATS[fmt][0])
+    response["Content-Disposition"] = f'attachment; filename="{timetable_export.filename(fmt)}"'
+    return response
+
+
+@staff_member_required
+def admin_llm_usage_view(request):
+    """API endpoint for per-teacher LLM token consumption of one day (?day=YYYY-MM-DD)"""
+    day = None
+    if request.GET.get('day'):
+        try:
+            day = datetime.date.fromisoformat(request.GET['day'])
+        except ValueError:
+            return JsonResponse({"error": "day must be YYYY-MM-DD."}, status=400)
+    return JsonResponse(rate_limit.usage_report(day))
+
+
 # ========================================
 # NEW MODULE: Department Timetable PDFs Views
 # ========================================
 
 from .models import Department, Semester, TimetablePDF
 from django.shortcuts import get_object_or_404
+from . import timetable_files
+from . import pdf_search
+from . import department_tree
+from . import master_grid
+from . import substitutes
+from . import workload
 
 @login_required
 def departments_list_view(request):
@@ -944,6 +1176,38 @@ def timetable_pdfs_list_view(request, dept_id, semester_id):
     return render(request, "timetable_pdfs.html", _with_theme(context))
 
 
+@login_required
+def timetable_pdf_file_view(request, pdf_id):
+    """Stream a department timetable PDF (Range + ETag aware)"""
+    pdf = get_object_or_404(TimetablePDF, id=pdf_id)
+    return timetable_files.serve_timetable_pdf(request, pdf)
+
+
+@login_required
+def timetable_pdf_preview_view(request, pdf_id):
+    """Serve the cached first-page thumbnail of a department timetable PDF"""
+    pdf = get_object_or_404(TimetablePDF, id=pdf_id)
+    return timetable_files.serve_timetable_preview(request, pdf)
+
+
+@login_required
+def timetable_search_api(request):
+    """Full-text search across all department timetable PDFs"""
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        limit = 20
+
+    results, took_ms = pdf_search.timed_search(query, limit)
+    return JsonResponse({
+        "query": query,
+        "count": len(results),
+        "took_ms": round(took_ms, 2),
+        "results": results,
+    })
+
+
 @staff_member_required
 def admin_upload_department_timetable_view(request):
     """Admin view to upload department timetables with branch and semester selection"""
@@ -965,12 +1229,23 @@ def admin_upload_department_timetable_view(request):
             department = Department.objects.get(id=department_id)
             semester = Semester.objects.get(id=semester_id, department=department)
             
-            TimetablePDF.objects.create(
+            timetable_pdf = TimetablePDF.objects.create(
                 semester=semester,
                 title=title,
                 pdf_file=pdf_file,
                 uploaded_by=request.user
             )
+            timetable_files.process_uploaded_pdf(timetable_pdf)
+            pdf_search.index_uploaded_pdf(timetable_pdf)
+
+            try:
+                change_log = ingest_department_pdf(timetable_pdf)
+            except ParseMemoryExceeded as exc:
+                messages.warning(request, f"PDF saved, but not parsed into schedules: {exc}.")
+            except Exception:
+                messages.warning(request, "PDF saved, but its timetable table could not be parsed into schedules.")
+            else:
+                messages.info(request, f"{change_log.inserted} timetable slots added to teacher schedules.")
             
             messages.success(request, f"Timetable uploaded successfully for {department.name} - Semester {semester.number}!")
             return redirect("admin_upload_department_timetable")
@@ -993,8 +1268,86 @@ def get_semesters_ajax(request):
     """AJAX endpoint to get semesters for a selected department"""
     department_id = request.GET.get('department_id')
     if department_id:
-        semesters = Semester.objects.filter(department_id=department_id).order_by('number')
-        semester_list = [{"id": sem.id, "number": sem.number} for sem in semesters]
-        return JsonResponse({"semesters": semester_list})
+        return JsonResponse({"semesters": department_tree.semesters_for(department_id)})
     return JsonResponse({"semesters": []})
 
+
+@login_required
+@condition(etag_func=lambda request: department_tree.tree_etag())
+def department_tree_api(request):
+    """Whole department / semester / PDF tree in one cached, ETag-validated response"""
+    version, tree = department_tree.get_tree()
+    response = JsonResponse({"version": version, "departments": tree})
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@staff_member_required
+def master_grid_api(request):
+    """
+    Department master grid (teachers x days x periods) from the packed per-PDF grids.
+    GET ?department=&semester=&subject=&teacher=&page=&page_size=
+    """
+    try:
+        payload = master_grid.grid_page(request.GET)
+    except master_grid.GridError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(payload)
+
+
+@staff_member_required
+def substitutes_api(request):
+    """
+    Free teachers for every period of the absent teacher(s), ranked by subject overlap and load.
+    GET ?teacher=<name>&teacher=<name>&date=YYYY-MM-DD (or day=Mo)&department=&limit=
+    """
+    absent = list(dict.fromkeys(name.strip() for name in request.GET.getlist("teacher") if name.strip()))
+    if not absent:
+        return JsonResponse({"error": "Pass at least one teacher."}, status=400)
+    try:
+        payload = substitutes.plan(absent, request.GET)
+    except substitutes.SubstituteError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(payload)
+
+
+@staff_member_required
+def workload_report_api(request):
+    """
+    Stored weekly workload of every teacher in a department (all departments without ?department=).
+    GET ?department=&order=weekly_minutes|lab_minutes|longest_block_minutes|free_gaps|periods|teacher_name
+    """
+    try:
+        department = int(request.GET['department']) if request.GET.get('department') else None
+        payload = workload.department_report(department, request.GET.get('order') or "weekly_minutes")
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(payload)
+
+
+@csrf_exempt  # read-only: POST only carries long id lists that don't fit a URL
+@require_http_methods(["GET", "POST"])
+@staff_member_required
+def schedule_batch_api(request):
+    """
+    Schedules of many teachers in one response.
+    GET ?ids=1,2,3&day=Mo,Tu&from=09:00&to=13:00  or  POST {"teacher_ids": [...], "days": [...], "from", "to"}
+    """
+    if request.method == "POST":
+        try:
+            params = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"error": "Body must be JSON."}, status=400)
+        if not isinstance(params, dict):
+            return JsonResponse({"error": "Body must be a JSON object."}, status=400)
+    else:
+        params = request.GET
+
+    try:
+        query = schedule_api.parse_request(params)
+    except schedule_api.BatchRequestError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+
+    if len(query["teacher_ids"]) >= schedule_api.stream_threshold():
+        return StreamingHttpResponse(schedule_api.stream_payload(query), content_type="application/json")
+    return HttpResponse(schedule_api.dumps(schedule_api.build_payload(query)), content_type="application/json")
@@ -0,0 +1,234 @@
+"""
+Teaching workload per teacher and department, computed at ingest.
+
+Whenever a department PDF is ingested (or its grid removed) the workload of
+every teacher it touches is recomputed from the department's packed
+MasterGrids and stored in TeacherWorkload, one row per department and
+teacher: periods and teaching days per week, weekly teaching and lab
+minutes, the busiest day, the longest continuous block and the number of
+free gaps between classes. Department reports read that table in one query.
+
+With numpy the interval arithmetic runs over every class at once: each
+(teacher, day) group gets its own stretch of one time axis, so merging
+overlapping or back-to-back periods is a sort, a running maximum and a
+cumulative sum, and the per-teacher totals are bincounts. numpy is imported
+by the first computation rather than at startup (signals import this module
+from AppConfig.ready); without it the same merge runs as a loop.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .master_grid import DAYS, iter_cells
+from .models import MasterGrid, TeacherWorkload
+from .timetable_parser import to_time
+
+DEFAULT_PERIOD_MINUTES = 50
+GROUP_SPAN = 2 * 24 * 60    # minutes between two (teacher, day) groups on the merged axis
+REPORT_FIELDS = (
+    "department_id", "department__name", "teacher_name", "periods", "teaching_days", "weekly_minutes",
+    "lab_minutes", "busiest_day_minutes", "longest_block_minutes", "free_gaps",
+)
+REPORT_ORDERS = {"weekly_minutes", "lab_minutes", "longest_block_minutes", "free_gaps", "periods", "teacher_name"}
+
+
+class WorkloadError(ValueError):
+    pass
+
+
+def _break_minutes():
+    return getattr(settings, "WORKLOAD_BLOCK_BREAK_MINUTES", 10)
+
+
+def _minutes(value):
+    parsed = to_time(value)
+    return parsed.hour * 60 + parsed.minute if parsed else None
+
+
+def _intervals(department_id, teachers):
+    """
+    Distinct class intervals of `teachers` over the department's grids:
+    (teacher names, groups, starts, ends, lab flags), group = teacher * len(DAYS) + day
+    """
+    names = sorted(teachers)
+    index = {name: position for position, name in enumerate(names)}
+    seen = {}
+    for grid in MasterGrid.objects.filter(department_id=department_id):
+        for name, day, (start_time, end_time), subject in iter_cells(grid):
+            position = index.get(name)
+            start = _minutes(start_time)
+            if position is None or start is None:
+                continue
+            end = _minutes(end_time) or start + DEFAULT_PERIOD_MINUTES
+            key = (position * len(DAYS) + day, start, end)
+            # The same slot in two semesters' grids is one combined class
+            seen[key] = seen.get(key, False) or "LAB" in subject.upper()
+    groups, starts, ends, labs = [], [], [], []
+    for (group, start, end), lab in seen.items():
+        groups.append(group)
+        starts.append(start)
+        ends.append(end)
+        labs.append(lab)
+    return names, groups, starts, ends, labs
+
+
+# ========================================
+# Interval merging
+# ========================================
+
+_numpy_module = None   # numpy once imported, False when it isn't installed
+
+
+def _numpy():
+    """numpy, imported on first use (optional speed-up), or None"""
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy_module = numpy
+    return _numpy_module or None
+
+
+def _merge_numpy(numpy, groups, starts, ends, gap):
+    """(group, length) of every merged block: intervals at most `gap` minutes apart are one block"""
+    if not len(groups):
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    order = numpy.lexsort((starts, groups))
+    groups = groups[order]
+    starts = starts[order] + groups * GROUP_SPAN
+    ends = ends[order] + groups * GROUP_SPAN
+    reach = numpy.maximum.accumulate(ends)
+    new_block = numpy.empty(len(starts), dtype=bool)
+    new_block[0] = True
+    new_block[1:] = starts[1:] > reach[:-1] + gap
+    first = numpy.flatnonzero(new_block)
+    return groups[first], numpy.maximum.reduceat(ends, first) - starts[first]
+
+
+def _merge_python(groups, starts, ends, gap):
+    blocks = []
+    for group, start, end in sorted(zip(groups, starts, ends)):
+        if blocks and blocks[-1][0] == group and start <= blocks[-1][2] + gap:
+            blocks[-1][2] = max(blocks[-1][2], end)
+        else:
+            blocks.append([group, start, end])
+    return [group for group, _, _ in blocks], [end - start for _, start, end in blocks]
+
+
+def compute(names, groups, starts, ends, labs, gap):
+    """Workload fields of each teacher in `names`, from their class intervals"""
+    days = len(DAYS)
+    count = len(names)
+    numpy = _numpy()
+    if numpy is not None:
+        groups, starts, ends = (numpy.asarray(values, dtype=numpy.int64) for values in (groups, starts, ends))
+        labs = numpy.asarray(labs, dtype=bool)
+        size = count * days
+        periods = numpy.bincount(groups // days, minlength=count)
+        union_groups, union_lengths = _merge_numpy(numpy, groups, starts, ends, 0)
+        day_minutes = numpy.bincount(union_groups, weights=union_lengths, minlength=size).reshape(count, days)
+        lab_groups, lab_lengths = _merge_numpy(numpy, groups[labs], starts[labs], ends[labs], 0)
+        lab_minutes = numpy.bincount(lab_groups // days, weights=lab_lengths, minlength=count)
+        block_groups, block_lengths = _merge_numpy(numpy, groups, starts, ends, gap)
+        longest = numpy.zeros(count, dtype=numpy.int64)
+        numpy.maximum.at(longest, block_groups // days, block_lengths)
+        blocks_per_day = numpy.bincount(block_groups, minlength=size).reshape(count, days)
+        gaps = numpy.maximum(blocks_per_day - 1, 0).sum(axis=1)
+        return [
+            {
+                "periods": int(periods[i]),
+                "teaching_days": int((day_minutes[i] > 0).sum()),
+                "weekly_minutes": int(day_minutes[i].sum()),
+                "lab_minutes": int(lab_minutes[i]),
+                "busiest_day_minutes": int(day_minutes[i].max()) if days else 0,
+                "longest_block_minutes": int(longest[i]),
+                "free_gaps": int(gaps[i]),
+            }
+            for i in range(count)
+        ]
+
+    metrics = [
+        {"periods": 0, "teaching_days": 0, "weekly_minutes": 0, "lab_minutes": 0, "busiest_day_minutes": 0,
+         "longest_block_minutes": 0, "free_gaps": 0}
+        for _ in range(count)
+    ]
+    for group in groups:
+        metrics[group // days]["periods"] += 1
+    day_minutes = {}
+    for group, length in zip(*_merge_python(groups, starts, ends, 0)):
+        day_minutes[group] = day_minutes.get(group, 0) + length
+    for group, minutes in day_minutes.items():
+        row = metrics[group // days]
+        row["teaching_days"] += 1
+        row["weekly_minutes"] += minutes
+        row["busiest_day_minutes"] = max(row["busiest_day_minutes"], minutes)
+    lab = [(group, start, end) for group, start, end, is_lab in zip(groups, starts, ends, labs) if is_lab]
+    if lab:
+        for group, length in zip(*_merge_python(*zip(*lab), 0)):
+            metrics[group // days]["lab_minutes"] += length
+    blocks_per_day = {}
+    for group, length in zip(*_merge_python(groups, starts, ends, gap)):
+        row = metrics[group // days]
+        row["longest_block_minutes"] = max(row["longest_block_minutes"], length)
+        blocks_per_day[group] = blocks_per_day.get(group, 0) + 1
+    for group, blocks in blocks_per_day.items():
+        metrics[group // days]["free_gaps"] += blocks - 1
+    return metrics
+
+
+# ========================================
+# Stored summaries and reports
+# ========================================
+
+def refresh_workloads(department_id, teachers=None):
+    """
+    Recompute the stored workload of `teachers` (names; all of the
+    department's when None). Teachers left in none of its grids lose their row.
+    """
+    if teachers is None:
+        teachers = {name for grid in MasterGrid.objects.filter(department_id=department_id).only("teachers")
+                    for name in grid.teachers}
+    names, groups, starts, ends, labs = _intervals(department_id, teachers)
+    rows = [
+        TeacherWorkload(department_id=department_id, teacher_name=name, **fields)
+        for name, fields in zip(names, compute(names, groups, starts, ends, labs, _break_minutes()))
+        if fields["periods"]
+    ]
+    with transaction.atomic():
+        TeacherWorkload.objects.filter(department_id=department_id, teacher_name__in=names).delete()
+        TeacherWorkload.objects.bulk_create(rows, batch_size=500)
+    return len(rows)
+
+
+def department_report(department_id=None, order="weekly_minutes"):
+    """
+    Stored workloads of one department (every department when None), highest
+    `order` first, with department totals; one query.
+    """
+    if order not in REPORT_ORDERS:
+        raise WorkloadError(f"order must be one of {', '.join(sorted(REPORT_ORDERS))}")
+    ordering = order if order == "teacher_name" else f"-{order}"
+    workloads = TeacherWorkload.objects.order_by(ordering, "teacher_name")
+    if department_id is not None:
+        workloads = workloads.filter(department_id=department_id)
+    teachers = []
+    for row in workloads.values_list(*REPORT_FIELDS):
+        row = dict(zip(REPORT_FIELDS, row))
+        row["department"] = row.pop("department__name")
+        row["weekly_hours"] = round(row["weekly_minutes"] / 60, 2)
+        row["lab_hours"] = round(row["lab_minutes"] / 60, 2)
+        teachers.append(row)
+    total_minutes = sum(row["weekly_minutes"] for row in teachers)
+    return {
+        "department_id": department_id,
+        "order": order,
+        "teachers": teachers,
+        "totals": {
+            "teachers": len(teachers),
+            "weekly_hours": round(total_minutes / 60, 2),
+            "lab_hours": round(sum(row["lab_minutes"] for row in teachers) / 60, 2),
+            "average_weekly_hours": round(total_minutes / 60 / len(teachers), 2) if teachers else None,
+            "free_gaps": sum(row["free_gaps"] for row in teachers),
+        },
+    }